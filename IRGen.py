@@ -2,7 +2,9 @@
 from threeac import *
 import minic_ast
 
-class IRGen(object):
+class IRGen(minic_ast.Visitor):
+    prefix = 'gen_'
+
     def __init__(self):
         self.threeACobj = ThreeACList()
         self.label_count = 0
@@ -27,8 +29,7 @@ class IRGen(object):
         self.threeACobj.addObj(obj)
 
     def generate(self, node):
-        method = 'gen_' + node.__class__.__name__
-        return getattr(self, method)(node)
+        return minic_ast.walk(self.dispatch, node)
 
     def add_label(self, label_name=None, auto_add=True, preexisting=False):
         if label_name is None:
@@ -72,7 +73,7 @@ class IRGen(object):
 
     def gen_Program(self, node):
         for (child_name, child) in node.children():
-            self.generate(child)
+            yield child
 
     # def gen_AssignmentStmnt(self, node):
     # 	expr = self.expr_generator(node.expr, node.name)
@@ -80,26 +81,26 @@ class IRGen(object):
     # 	self.add_code(Assignment(node.name, expr, node.op, node.number_of_dereferences, node.is_ptr))
 
     def gen_DeclStmt(self, node):
-        expr = self.generate(node.expr)
+        expr = yield node.expr
         self.add_code(Assignment(node.name, expr, num_of_dereferences=node.num_dereferences, is_ptr=node.is_ptr))
 
     def gen_Constant(self, node):
         return node.value
 
     def gen_IfStmt(self, node):
-        cond = self.generate(node.cond)
+        cond = yield node.cond
 
         tbranch_label = self.inc_label()
         fbranch_label = self.inc_label()
 
         cond_go_to = ConditionalGoTo(cond, tbranch_label)
         self.add_code(cond_go_to)
-        self.generate(node.false_body)
+        yield node.false_body
 
         self.add_code(GoTo(fbranch_label))
 
         self.add_label(tbranch_label)
-        self.generate(node.true_body)
+        yield node.true_body
         self.add_label(fbranch_label)
 
     def expr_generator(self, node, name, nested=0):
@@ -107,7 +108,7 @@ class IRGen(object):
         if (type(node)== minic_ast.Constant):
             self.add_code(Assignment(name, node.value))
         elif (type(node)== minic_ast.BinOp):
-            bname = self.gen_BinOp(node, nested)
+            bname = yield self.gen_BinOp(node, nested)
             self.add_code(Assignment(name, bname))
         else:
             print(type(node))
@@ -118,8 +119,8 @@ class IRGen(object):
         valname = self.get_name() 
         lname = self.get_name() 
         rname = self.get_name() 
-        self.expr_generator(node.left, lname, nested)
-        self.expr_generator(node.right, rname, nested)
+        yield self.expr_generator(node.left, lname, nested)
+        yield self.expr_generator(node.right, rname, nested)
         self.add_code(BinOp(valname, lname, rname, node.op))
         return valname
 
@@ -127,14 +128,14 @@ class IRGen(object):
     def gen_UnaryOp(self, node, nested=0):
         vname = self.get_name() 
         ename = self.get_name() 
-        self.expr_generator(node.expr, ename, nested)
+        yield self.expr_generator(node.expr, ename, nested)
         self.add_code(UnaryOp(vname, ename, node.op))
         return vname
 
     # For loop incomplete
     def gen_ForStmt(self, node):
         # Initializer statement
-        self.generate(node.expr1)
+        yield node.expr1
         # Since we need to keep track of where this goes first
 
         cond_label = self.add_label()
@@ -144,7 +145,7 @@ class IRGen(object):
         self.track_loop_labels(cond_label, exit_label)
         self.track_loop_expr(node.expr3)
         # Conditional Statement
-        cond = self.generate(node.expr2)
+        cond = yield node.expr2
         cond_go_to = ConditionalGoTo(cond, str(body_label[2:]))
         self.add_code(cond_go_to)
         self.add_code(GoTo(str(exit_label[2:])))
@@ -153,9 +154,9 @@ class IRGen(object):
         # self.add_code(Label(body_label))
         self.add_label(body_label)
 
-        self.generate(node.body)
+        yield node.body
         # Incrementer
-        self.generate(node.expr3)
+        yield node.expr3
         self.add_code(GoTo(str(cond_label[2:])))
 
         # self.add_code(Label(exit_label))
@@ -166,14 +167,14 @@ class IRGen(object):
 
     def gen_StmtList(self, node):
         for stmt in node.stmt_lst:
-            self.generate(stmt)
+            yield stmt
 
     def gen_FuncDec(self, node):
 
         self.add_label(node.name)
         self.add_code(FuncStart(node.name))
 
-        self.generate(node.body)
+        yield node.body
 
         self.add_code(FuncEnd(node.name))
 
@@ -181,7 +182,7 @@ class IRGen(object):
         pass
 
     def gen_WhileStmt(self, node):
-        cond = self.generate(node.cond)
+        cond = yield node.cond
 
         cond_label = self.add_label(auto_add=False)
         body_label = self.add_label(auto_add=False)
@@ -195,7 +196,7 @@ class IRGen(object):
         self.add_code(cond_go_to)
         self.add_code(GoTo(int(exit_label[2:])))
         self.add_label(body_label)
-        self.generate(node.body)
+        yield node.body
 
         self.add_code(GoTo(int(cond_label[2:])))
         self.add_label(exit_label)
@@ -216,11 +217,11 @@ class IRGen(object):
     def gen_AssignmentStmt(self, node):
         # not sure what t is 
         # addVariable(Type(node.type), node.name)
-        expr = self.generate(node.expr)
+        expr = yield node.expr
         self.add_code(Assignment(node.name, expr, node.op, node.number_of_dereferences, node.is_ptr))
 
     def gen_RetStmt(self, node):
-        expr = self.generate(node.expr)
+        expr = yield node.expr
         self.add_code(Return(expr))
 
     def gen_ContinueStmt(self, node):
@@ -229,7 +230,7 @@ class IRGen(object):
         if len(self.start_labels) > 0:
             go_to_label = self.start_labels[-1]
             if len(self.loop_exprs) > 0:	
-                self.generate(self.loop_exprs[-1])
+                yield self.loop_exprs[-1]
             self.add_code(GoTo(go_to_label))
 
     def gen_BreakStmt(self, node):
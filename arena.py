@@ -0,0 +1,215 @@
+# Flat, struct of arrays form of the AST. Nodes are numbered in preorder and
+# every per node property lives in an array indexed by that number: the kind of
+# node, its line number, the range of its children and the range of its fields.
+# Identifiers, operators and constants are kept once each in a side table.
+# Passes scanning the arrays skip the pointer chasing and per object overhead
+# of minic_ast trees, and the arrays hash and serialize as a few byte strings.
+
+import hashlib
+import json
+import struct
+from array import array
+
+import minic_ast as ast
+
+# Kinds of node, the position in this tuple is what the kind array holds. New
+# classes go at the end so serialized arenas keep their meaning
+KINDS = (ast.Program, ast.FuncDec, ast.ParamList, ast.Formal, ast.Type, ast.StmtList, ast.DeclStmt,
+         ast.ArrayExpr, ast.AssignmentStmt, ast.IfStmt, ast.WhileStmt, ast.ForStmt, ast.RetStmt,
+         ast.BreakStmt, ast.ContinueStmt, ast.FuncCall, ast.UnaryOp, ast.BinOp, ast.Constant, ast.PointerLst)
+KIND = {cls: i for i, cls in enumerate(KINDS)}
+# Fields of each kind, in the order they are stored
+FIELDS = tuple(cls.__slots__ for cls in KINDS)
+FIELD_POS = tuple({name: pos for pos, name in enumerate(fields)} for fields in FIELDS)
+
+# A field is stored as an int, its low two bits telling what the rest is
+NODE = 0    # index of a node
+CONST = 1   # index in the constant table
+LIST = 2    # index of a list of nodes
+UNSET = 3   # attribute never set
+NO_LINE = -1
+
+MAGIC = b'WATCARENA1\n'
+
+
+class Arena(object):
+    """
+    An AST as arrays. Node 0 is the root, and a node comes before its children.
+    Children and fields are stored CSR style: the ones of node i are
+    children[child_start[i]:child_start[i + 1]] and fields[field_start[i]:field_start[i + 1]]
+    """
+    ARRAYS = ('kind', 'line', 'child_start', 'children', 'field_start', 'fields', 'list_start', 'list_items')
+
+    def __init__(self):
+        self.kind = array('B')
+        self.line = array('i')
+        self.child_start = array('i', [0])
+        self.children = array('i')
+        self.field_start = array('i', [0])
+        self.fields = array('i')
+        self.list_start = array('i', [0])
+        self.list_items = array('i')
+        self.constants = []
+
+    def __len__(self):
+        return len(self.kind)
+
+    #
+    #	Conversion from and to minic_ast
+    #
+    @classmethod
+    def from_tree(cls, root) -> 'Arena':
+        arena = cls()
+        with ast.paused_gc():
+            # Preorder numbering along children(), a node shared by several parents
+            # (interned types) is stored once. Nodes only reachable through a field,
+            # such as the expr of an ArrayExpr, come after the children
+            index = {}
+            nodes = []
+            node_children = []
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if id(node) in index:
+                    continue
+                index[id(node)] = len(nodes)
+                nodes.append(node)
+                refs = [child for _, child in node.children()]
+                node_children.append(refs[:])
+                for name in FIELDS[KIND[type(node)]]:
+                    value = getattr(node, name, None)
+                    if isinstance(value, ast.Node):
+                        refs.append(value)
+                    elif isinstance(value, list):
+                        refs += value
+                stack += reversed(refs)
+
+            constant_index = {}
+            constants = arena.constants
+            kind, line, children, fields = arena.kind, arena.line, arena.children, arena.fields
+            child_start, field_start = arena.child_start, arena.field_start
+            list_start, list_items = arena.list_start, arena.list_items
+            for node, refs in zip(nodes, node_children):
+                k = KIND[type(node)]
+                kind.append(k)
+                line.append(getattr(node, 'line_number', NO_LINE))
+                children.extend([index[id(child)] for child in refs])
+                child_start.append(len(children))
+                for name in FIELDS[k]:
+                    value = getattr(node, name, arena)
+                    if value is arena:
+                        fields.append(UNSET)
+                    elif isinstance(value, ast.Node):
+                        fields.append(index[id(value)] << 2 | NODE)
+                    elif isinstance(value, list):
+                        fields.append((len(list_start) - 1) << 2 | LIST)
+                        list_items.extend([index[id(v)] for v in value])
+                        list_start.append(len(list_items))
+                    else:
+                        # 1, True and '1' are different constants
+                        key = (type(value), value)
+                        if key not in constant_index:
+                            constant_index[key] = len(constants)
+                            constants.append(value)
+                        fields.append(constant_index[key] << 2 | CONST)
+                field_start.append(len(fields))
+        return arena
+
+    def to_tree(self):
+        """ The minic_ast tree, equal to the one the arena was made from """
+        n = len(self)
+        nodes = [None] * n
+        with ast.paused_gc():
+            # Objects first, then their fields, as a shared node can come before a
+            # parent referring to it
+            for i in range(n):
+                cls = KINDS[self.kind[i]]
+                if cls is ast.Type:
+                    nodes[i] = ast.Type(*[self.field(i, name) for name in FIELDS[self.kind[i]]])
+                else:
+                    nodes[i] = object.__new__(cls)
+            for i in range(n):
+                node = nodes[i]
+                k = self.kind[i]
+                if KINDS[k] is ast.Type:
+                    continue
+                for name, code in zip(FIELDS[k], self.fields[self.field_start[i]:self.field_start[i + 1]]):
+                    if code & 3 != UNSET:
+                        setattr(node, name, self.decode(code, nodes))
+                if self.line[i] != NO_LINE:
+                    node.line_number = self.line[i]
+        return nodes[0]
+
+    #
+    #	Access
+    #
+    def decode(self, code: int, nodes=None):
+        """ Value of a stored field, nodes given as their index unless the node objects are given """
+        tag = code & 3
+        value = code >> 2
+        if tag == CONST:
+            return self.constants[value]
+        if tag == NODE:
+            return value if nodes is None else nodes[value]
+        if tag == LIST:
+            items = self.list_items[self.list_start[value]:self.list_start[value + 1]]
+            return list(items) if nodes is None else [nodes[j] for j in items]
+        raise AttributeError("Field is not set")
+
+    def field(self, i: int, name: str):
+        """ Field name of node i, the way the node object has it but with nodes as indices """
+        pos = FIELD_POS[self.kind[i]].get(name)
+        if pos is None:
+            raise AttributeError(f"{KINDS[self.kind[i]].__name__} has no field {name}")
+        return self.decode(self.fields[self.field_start[i] + pos])
+
+    def child_nodes(self, i: int) -> array:
+        return self.children[self.child_start[i]:self.child_start[i + 1]]
+
+    def count(self) -> dict:
+        """ Number of nodes of each kind, a single pass over one array """
+        counts = [0] * len(KINDS)
+        for k in self.kind:
+            counts[k] += 1
+        return {cls.__name__: c for cls, c in zip(KINDS, counts) if c}
+
+    #
+    #	Hashing and serialization
+    #
+    def digest(self) -> str:
+        """ Hash of the whole structure, equal arenas give the same hash """
+        h = hashlib.sha256()
+        for name in self.ARRAYS:
+            data = getattr(self, name).tobytes()
+            h.update(struct.pack('<Q', len(data)))
+            h.update(data)
+        h.update(self.constant_bytes())
+        return h.hexdigest()
+
+    def constant_bytes(self) -> bytes:
+        # JSON keeps str, int, bool and None apart, which is all constants are
+        return json.dumps(self.constants, separators=(',', ':')).encode()
+
+    def dumps(self) -> bytes:
+        """ Header, then every array as raw machine ints, then the constant table """
+        blobs = [getattr(self, name).tobytes() for name in self.ARRAYS] + [self.constant_bytes()]
+        header = struct.pack(f'<{len(blobs)}Q', *map(len, blobs))
+        return MAGIC + header + b''.join(blobs)
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'Arena':
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a serialized arena")
+        n = len(cls.ARRAYS) + 1
+        pos = len(MAGIC) + 8 * n
+        sizes = struct.unpack(f'<{n}Q', data[len(MAGIC):pos])
+        arena = cls()
+        view = memoryview(data)
+        for name, size in zip(cls.ARRAYS, sizes):
+            buffer = array(getattr(arena, name).typecode)
+            buffer.frombytes(view[pos:pos + size])
+            setattr(arena, name, buffer)
+            pos += size
+        arena.constants = json.loads(bytes(view[pos:pos + sizes[-1]]))
+        return arena
+
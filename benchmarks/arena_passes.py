@@ -0,0 +1,67 @@
+# The passes over a program of about a million nodes, on the minic_ast tree
+# against the flat arena of arena.py. The arena is first checked to convert
+# back to the same tree.
+import argparse
+import hashlib
+import sys
+
+from common import timed, gen_program
+import minic_ast as ast
+from arena import Arena
+from parse_engines import build, dump
+from scanner import minic_scanner
+
+
+def count_tree(root) -> dict:
+    counts = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        name = type(node).__name__
+        counts[name] = counts.get(name, 0) + 1
+        stack += [child for _, child in node.children()]
+    return counts
+
+
+def report(name: str, t_tree: float, t_arena: float):
+    print(f'{name:>14}: {t_tree:7.3f} s tree  {t_arena:7.3f} s arena  ({t_tree / t_arena:5.1f}x)')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark passes over the arena AST')
+    arg_parser.add_argument('--funcs', type=int, default=870)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    data = gen_program(args.funcs, args.stmts)
+    root = build(minic_scanner, 'descent').parse(data)
+    t_from, arena = timed(Arena.from_tree, root)
+    t_to, tree = timed(arena.to_tree)
+    if dump(tree) != dump(root):
+        print('The arena does not convert back to the same tree')
+        sys.exit(1)
+    print(f'{len(arena)} nodes, {len(arena.constants)} constants')
+    print(f'{"tree -> arena":>14}: {t_from:7.3f} s')
+    print(f'{"arena -> tree":>14}: {t_to:7.3f} s')
+
+    t_tree, counts = timed(count_tree, root)
+    t_arena, arena_counts = timed(arena.count)
+    # The tree walk meets an interned type once per use, the arena stores it once
+    if counts.pop('Type') < arena_counts.pop('Type') or counts != arena_counts:
+        print('The arena has different nodes')
+        sys.exit(1)
+    report('count kinds', t_tree, t_arena)
+    t_tree, _ = timed(lambda: hashlib.sha256(ast.dumps(root)).hexdigest())
+    t_arena, _ = timed(arena.digest)
+    report('hash', t_tree, t_arena)
+    t_tree, blob = timed(ast.dumps, root)
+    t_arena, arena_blob = timed(arena.dumps)
+    report('serialize', t_tree, t_arena)
+    print(f'{"":>16}{len(blob) / 1e6:7.1f} MB tree  {len(arena_blob) / 1e6:7.1f} MB arena')
+    t_tree, _ = timed(ast.loads, blob)
+    t_arena, _ = timed(Arena.loads, arena_blob)
+    report('deserialize', t_tree, t_arena)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# Loading a serialized AST against parsing the source again. The loaded tree
+# is first checked to be identical to the parsed one, line numbers and XML
+# (i.e. attr_names) included.
+import argparse
+
+from common import timed, gen_program
+import minic_ast as ast
+from lexer import minic_lexer
+from parse_engines import build, dump
+from scanner import minic_scanner
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the AST cache')
+    arg_parser.add_argument('--funcs', type=int, default=100)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    data = gen_program(args.funcs, args.stmts)
+    yacc = build(minic_lexer, 'yacc')
+    descent = build(minic_scanner, 'descent')
+
+    t_yacc, root = timed(yacc.parse, data, repeat=3)
+    t_descent, _ = timed(descent.parse, data, repeat=3)
+    t_dump, blob = timed(ast.dumps, root, repeat=3)
+    t_load, loaded = timed(ast.loads, blob, repeat=3)
+    if dump(loaded) != dump(root) or ast.ET.tostring(loaded.generate_xml()) != ast.ET.tostring(root.generate_xml()):
+        print('The loaded tree differs from the parsed one')
+        raise SystemExit(1)
+
+    print(f'{len(data) / 1e6:.1f} MB source, {len(blob) / 1e6:.1f} MB serialized')
+    print(f'  parse (yacc + ply lexer): {t_yacc:7.3f} s')
+    print(f' parse (descent + scanner): {t_descent:7.3f} s')
+    print(f'                      dump: {t_dump:7.3f} s')
+    print(f'                      load: {t_load:7.3f} s  ({t_yacc / t_load:.0f}x / {t_descent / t_load:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
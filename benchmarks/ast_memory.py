@@ -0,0 +1,76 @@
+# Bytes per AST node of a large generated program, with the nodes as they are
+# now (slots, interned types) against the same tree made of plain objects with
+# a __dict__ each and a new Type per declaration, the way the nodes used to be.
+# Both trees are copies of the parsed one sharing its strings, so only the
+# nodes, their lists and their types are measured.
+import argparse
+import tracemalloc
+
+from common import gen_program
+import minic_ast as ast
+from parse_engines import build
+from scanner import minic_scanner
+
+# Stand in class with a __dict__ for every node class
+plain_classes = {}
+
+
+def copy_tree(value, slotted: bool):
+    if isinstance(value, list):
+        return [copy_tree(v, slotted) for v in value]
+    if not isinstance(value, ast.Node):
+        return value
+    cls = type(value)
+    if slotted and cls is ast.Type:
+        return ast.Type(value.name, value.number_of_pointers)
+    if not slotted and cls not in plain_classes:
+        plain_classes[cls] = type(cls.__name__, (object,), {})
+    node = object.__new__(cls if slotted else plain_classes[cls])
+    for name, field in ast.node_fields(value):
+        object.__setattr__(node, name, copy_tree(field, slotted))
+    if not slotted and cls is ast.Type:
+        node.coord = None
+    return node
+
+
+def count_nodes(root) -> tuple[int, int, int]:
+    """ Nodes of the tree, how many are types and how many distinct Type objects there are """
+    nodes = 0
+    types = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        if isinstance(node, ast.Type):
+            types.append(id(node))
+        stack += [child for _, child in node.children()]
+    return nodes, len(types), len(set(types))
+
+
+def measure(root, slotted: bool) -> tuple[int, object]:
+    with ast.paused_gc():
+        tracemalloc.start()
+        tree = copy_tree(root, slotted)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return size, tree
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the memory taken by AST nodes')
+    arg_parser.add_argument('--funcs', type=int, default=200)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    root = build(minic_scanner, 'descent').parse(gen_program(args.funcs, args.stmts))
+    nodes, types, distinct = count_nodes(root)
+    print(f'{nodes} nodes, {types} of them types sharing {distinct} Type objects')
+    plain, _ = measure(root, slotted=False)
+    slotted, _ = measure(root, slotted=True)
+    print(f'  __dict__ nodes, a Type each: {plain / nodes:6.1f} bytes/node  ({plain / 1e6:6.1f} MB)')
+    print(f'slotted nodes, interned types: {slotted / nodes:6.1f} bytes/node  ({slotted / 1e6:6.1f} MB, '
+          f'{plain / slotted:.1f}x smaller)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# A type checked build against an unchecked one, from the parsed tree to the
+# WAT. The checker is timed with its expressions typed the way they used to
+# be, a generator handler per operator walked node by node, and as now, each
+# expression typed as a whole off an explicit stack. Both are first checked to
+# give the same type errors.
+import argparse
+import contextlib
+import io
+
+from common import timed, gen_program
+from parse_engines import build
+from scanner import minic_scanner
+from typeChecker import TypeChecker
+from wat import Wat
+
+
+class GeneratorTypeChecker(TypeChecker):
+    def str_to_type(self, txt):
+        return self.parse_type(txt)
+
+    def check_BinOp(self, node):
+        left_type = yield node.left
+        right_type = yield node.right
+        return self.binop_type(node, left_type, right_type)
+
+    def check_AssignmentStmt(self, node):
+        left_type = self.assigned_type(node)
+        right_type = yield node.expr
+        return self.assignment_type(node, left_type, right_type)
+
+    def check_UnaryOp(self, node):
+        t = yield node.expr
+        return self.unary_type(node, t)
+
+
+def check(checker_class, data, root):
+    checker = checker_class(data)
+    with contextlib.redirect_stdout(io.StringIO()):
+        checker.check(root)
+    return checker.type_errors
+
+
+def unchecked(data, root):
+    Wat(False).generate(root)
+
+
+def checked(checker_class, data, root):
+    check(checker_class, data, root)
+    Wat(False).generate(root)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark a type checked build against an unchecked one')
+    # Few large functions, the time the WAT generator takes grows with the
+    # square of the number of functions
+    arg_parser.add_argument('--funcs', type=int, default=4)
+    arg_parser.add_argument('--stmts', type=int, default=5000)
+    args = arg_parser.parse_args()
+
+    data = gen_program(args.funcs, args.stmts)
+    # Every other function returns a char, one type error each
+    data = data.replace('int f', 'char f', args.funcs // 2)
+    data = data.replace('return x;', "x = 'c';\n    return x;", args.funcs // 2)
+    root = build(minic_scanner, 'descent').parse(data)
+
+    errors = check(TypeChecker, data, root)
+    assert check(GeneratorTypeChecker, data, root) == errors
+    print(f'{len(errors)} type errors')
+
+    print('type check alone')
+    for name, checker_class in (('generators', GeneratorTypeChecker), ('expr_type', TypeChecker)):
+        t, _ = timed(check, checker_class, data, root, repeat=5)
+        print(f'  {name:>10}: {t:6.3f} s')
+
+    print('build')
+    t_unchecked, _ = timed(unchecked, data, root, repeat=3)
+    print(f'   unchecked: {t_unchecked:6.3f} s')
+    for name, checker_class in (('generators', GeneratorTypeChecker), ('expr_type', TypeChecker)):
+        t, _ = timed(checked, checker_class, data, root, repeat=3)
+        print(f'  {name:>10}: {t:6.3f} s  (+{(t / t_unchecked - 1) * 100:.0f}% over unchecked)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Shared helpers for the benchmark scripts. Run them from the src folder, e.g.
+#   python3 benchmarks/startup.py
+import os
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    """ Best wall clock time out of `repeat` runs, along with the last result """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def gen_function(name: str, n_stmts: int) -> str:
+    """ A function with n_stmts simple statements in its body """
+    lines = [f'int {name}(int a) {{', '    int x = 1;']
+    for i in range(n_stmts - 2):
+        match i % 4:
+            case 0:
+                lines.append(f'    x = x + {i};')
+            case 1:
+                lines.append(f'    x += a * {i % 7 + 1};')
+            case 2:
+                lines.append(f'    if (x > {i}) {{ x = x - 1; }}')
+            case 3:
+                lines.append(f'    x = (x - {i}) * 2;')
+    lines.append('    return x;')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+def gen_program(n_funcs: int = 1, n_stmts: int = 10) -> str:
+    """ A MiniC program made of n_funcs functions plus main """
+    funcs = [gen_function(f'f{i}', n_stmts) for i in range(n_funcs)]
+    funcs.append('int main() {\n    int r = 0;\n    return r;\n}')
+    return '\n'.join(funcs)
@@ -0,0 +1,47 @@
+# End to end compile time of a generated program to WAT with an empty compile
+# cache, then with the entry the first compile left behind. A hit only costs
+# preprocessing and hashing the source.
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+
+from common import timed, gen_program
+from cache import CompileCache
+from watc import watc
+
+
+def compile_program(path: str, cache: str, output: str, lexer: str):
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        watc([path], run_type='wat', output=output, cache=cache, compile_cache='True', lexer_backend=lexer)
+    with open(output) as f:
+        return f.read()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the compile cache')
+    arg_parser.add_argument('--funcs', type=int, default=50)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    arg_parser.add_argument('-l', '--lexer', choices=('ply', 'scanner'), default='ply')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'main.c')
+        output = os.path.join(tmp, 'main.wat')
+        with open(path, 'w') as f:
+            f.write(gen_program(args.funcs, args.stmts))
+        cache = os.path.join(tmp, 'cache')
+
+        miss, wat = timed(compile_program, path, cache, output, args.lexer)
+        hit, cached = timed(compile_program, path, cache, output, args.lexer, repeat=3)
+        assert wat == cached
+        stats = CompileCache(cache).stats()
+        print(f'{os.path.getsize(path) / 1e6:.2f} MB source, {len(wat) / 1e6:.2f} MB of WAT')
+        print(f'miss: {miss:7.3f} s')
+        print(f' hit: {hit:7.3f} s  ({miss / hit:.0f}x)')
+        print(f"{stats['hits']} hits, {stats['misses']} misses")
+
+
+if __name__ == '__main__':
+    main()
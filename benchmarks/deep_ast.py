@@ -0,0 +1,59 @@
+# Runs every AST pass over very deep trees with a small recursion limit, to show
+# the traversal does not depend on Python's stack:
+#   - a left leaning `a + a + ... + a` chain, depth --depth
+#   - `if` statements nested --nesting levels deep
+import argparse
+import contextlib
+import io
+import sys
+
+from common import timed
+import minic_ast as ast
+from typeChecker import TypeChecker
+from wat import Wat
+
+
+def deep_program(depth: int, nesting: int):
+    expr = ast.Constant('id', 'a')
+    for _ in range(depth):
+        expr = ast.BinOp('+', expr, ast.Constant('id', 'a'))
+        expr.setLineNumber(3)
+    body = ast.StmtList([ast.AssignmentStmt('a', '=', ast.Constant('int', 2))])
+    body.stmt_lst[0].setLineNumber(4)
+    for _ in range(nesting):
+        cond = ast.BinOp('>', ast.Constant('id', 'a'), ast.Constant('int', 0))
+        cond.setLineNumber(4)
+        body = ast.StmtList([ast.IfStmt(cond, body)])
+    stmts = [ast.DeclStmt('a', ast.Type('int'), ast.Constant('int', 1)),
+             ast.DeclStmt('b', ast.Type('int'), expr)] + body.stmt_lst + \
+            [ast.RetStmt(ast.Constant('id', 'b'))]
+    main = ast.FuncDec(ast.Type('int'), 'main', ast.ParamList([]), ast.StmtList(stmts))
+    return ast.Program([main])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark passes over deep ASTs')
+    arg_parser.add_argument('--depth', type=int, default=300_000)
+    arg_parser.add_argument('--nesting', type=int, default=20_000)
+    args = arg_parser.parse_args()
+
+    root = deep_program(args.depth, args.nesting)
+    sys.setrecursionlimit(200)
+
+    t, _ = timed(lambda: TypeChecker('').check(root))
+    print(f'type check: {t:8.3f} s')
+    t, _ = timed(lambda: Wat().generate(root))
+    print(f'wat:        {t:8.3f} s')
+    t, _ = timed(root.generate_xml)
+    print(f'xml:        {t:8.3f} s')
+
+    # NodeVisitor prints one line indented by depth per node, so keep its tree
+    # small enough for the output to fit in memory (still far past the limit)
+    shallow = deep_program(min(args.depth, 5000), 0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        t, _ = timed(ast.NodeVisitor().visit, shallow)
+    print(f'visitor:    {t:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
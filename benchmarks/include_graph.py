@@ -0,0 +1,45 @@
+# Preprocessing a program whose files all include the same large header. The
+# header is expanded once per compile rather than once per includer, and a
+# second compile of unchanged files is served from the expanded file cache.
+import argparse
+
+from common import timed, gen_function
+import preprocessor
+
+
+def gen_files(n_files: int, header_defines: int, header_funcs: int) -> dict:
+    header = [f'#define H{i} {i}' for i in range(header_defines)]
+    for i in range(header_funcs):
+        header += gen_function(f'h{i}', 20).replace('x + 1;', f'x + H{i % header_defines};').split('\n')
+    files = {'header.c': header}
+    main = []
+    for i in range(n_files):
+        files[f'f{i}.c'] = ['#include "header.c"'] + gen_function(f'f{i}', 20).split('\n')
+        main.append(f'#include "f{i}.c"')
+    files['main.c'] = main + ['int main() {', '    return 0;', '}']
+    return files
+
+
+def run(files):
+    return list(preprocessor.preprocessor(files))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the include graph')
+    arg_parser.add_argument('--files', type=int, default=200)
+    arg_parser.add_argument('--defines', type=int, default=2000)
+    arg_parser.add_argument('--funcs', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    files = gen_files(args.files, args.defines, args.funcs)
+    preprocessor.expanded_cache.clear()
+    cold, lines = timed(run, files)
+    warm, again = timed(run, files, repeat=3)
+    assert lines == again
+    print(f'{args.files} files including a {len(files["header.c"])} line header, {len(lines)} lines out')
+    print(f'first compile: {cold:.3f} s')
+    print(f' next compile: {warm:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
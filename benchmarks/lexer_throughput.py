@@ -0,0 +1,66 @@
+# Token throughput of the PLY lexer against the hand written scanner. Before
+# timing anything the two token streams are checked to be identical (type,
+# value, line number and position) on a generated program plus some edge cases.
+import argparse
+import contextlib
+import io
+import sys
+
+from common import timed, gen_program
+from lexer import minic_lexer
+from scanner import minic_scanner
+
+EDGE_CASES = '''
+int main() {
+    int x = 1; char c = 'a'; x += 2; x -= 1; x *= 3; x /= 2; x %= 5;
+    if (x >= 1 && x <= 9 || !x != 0 == 1) { x++; x--; }
+    int *p = &x; int y = **p; int a[3]; char s = "hello";
+    return TRUE_x + true + false + TRUE + FALSE + null; $ @
+}
+''' + 'int f() { return 0; }  \t'
+
+
+def token_stream(lexer, data):
+    lexer.lexer.lineno = 1
+    lexer.lexer.input(data)
+    return [(t.type, t.value, t.lineno, t.lexpos) for t in iter(lexer.lexer.token, None)]
+
+
+def count_tokens(lexer, data):
+    lexer.lexer.lineno = 1
+    lexer.lexer.input(data)
+    n = 0
+    for _ in iter(lexer.lexer.token, None):
+        n += 1
+    return n
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark lexer throughput')
+    arg_parser.add_argument('--funcs', type=int, default=200)
+    arg_parser.add_argument('--stmts', type=int, default=500)
+    args = arg_parser.parse_args()
+
+    ply = minic_lexer()
+    ply.build()
+    fast = minic_scanner()
+    fast.build()
+
+    data = gen_program(args.funcs, args.stmts)
+    for source in (EDGE_CASES, data):
+        with contextlib.redirect_stdout(io.StringIO()) as ply_out:
+            expected = token_stream(ply, source)
+        with contextlib.redirect_stdout(io.StringIO()) as fast_out:
+            got = token_stream(fast, source)
+        if expected != got or ply_out.getvalue() != fast_out.getvalue():
+            print('Token streams differ')
+            sys.exit(1)
+    print(f'token streams identical ({len(expected)} tokens, {len(data) / 1e6:.1f} MB)')
+
+    for name, lexer in (('ply', ply), ('scanner', fast)):
+        t, n = timed(count_tokens, lexer, data, repeat=3)
+        print(f'{name:>8}: {n / t:12,.0f} tokens/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# Preprocessing time of the same program under a growing number of #defines.
+# Expansion is a dict lookup per word, so the time per line should stay flat
+# however many macros the headers carry.
+import argparse
+
+from common import timed, gen_program
+import preprocessor
+
+
+def run(files):
+    preprocessor.expanded_cache.clear()
+    return list(preprocessor.preprocessor(files))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark macro expansion')
+    arg_parser.add_argument('--funcs', type=int, default=50)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    program = gen_program(args.funcs, args.stmts).split('\n')
+    for n_defines in (0, 10, 100, 1000, 10000):
+        # A quarter of the statements use one of the macros
+        header = [f'#define M{i} {i}' for i in range(n_defines)]
+        body = [line.replace('x = x +', f'x = x + M{i % n_defines} +') if n_defines else line
+                for i, line in enumerate(program)]
+        files = {'main.c': header + body}
+        t, lines = timed(run, files, repeat=3)
+        print(f'{n_defines:>6} defines: {t:6.3f} s  ({t / len(lines) * 1e6:5.2f} us/line)')
+
+
+if __name__ == '__main__':
+    main()
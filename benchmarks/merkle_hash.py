@@ -0,0 +1,79 @@
+# Structural hashing throughput on a large generated program: hashing the tree
+# the first time, asking again once every hash is kept, and after a pickle round
+# trip. Then what the hashes are for, finding the functions with the same body,
+# against comparing the bodies themselves.
+import argparse
+import sys
+
+from common import timed, gen_function
+import minic_ast as ast
+from parse_engines import build
+from scanner import minic_scanner
+
+
+def count_nodes(root) -> int:
+    n = 0
+    stack = [root]
+    while stack:
+        n += 1
+        stack += [child for _, child in stack.pop().children()]
+    return n
+
+
+def shape(node):
+    """ Nested tuples of the subtree without line numbers, what the hashes stand for """
+    if isinstance(node, list):
+        return tuple(map(shape, node))
+    if not isinstance(node, ast.Node):
+        return node
+    return (type(node).__name__,) + tuple(shape(value) for name, value in ast.node_fields(node)
+                                          if name not in ('line_number', 'coord'))
+
+
+def group(funcs, key) -> int:
+    """ Number of distinct function bodies according to key """
+    groups = {}
+    for f in funcs:
+        groups.setdefault(key(f.body), []).append(f)
+    return len(groups)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark structural hashing of the AST')
+    arg_parser.add_argument('--funcs', type=int, default=400)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    parser = build(minic_scanner, 'descent')
+    # Half the functions are copies of each other, the rest differ by a constant
+    funcs = [gen_function(f'f{i}', args.stmts) for i in range(args.funcs)]
+    funcs = [f.replace('x = x + 0;', f'x = x + {i};') if i % 2 else f for i, f in enumerate(funcs)]
+    data = '\n'.join(funcs + ['int main() {\n    int r = 0;\n    return r;\n}'])
+    root = parser.parse(data)
+    n = count_nodes(root)
+
+    t_cold, digest = timed(root.structural_hash)
+    t_warm, again = timed(root.structural_hash, repeat=5)
+    loaded = ast.loads(ast.dumps(root))
+    t_loaded, loaded_digest = timed(loaded.structural_hash)
+    if again != digest or loaded_digest != digest or parser.parse(data).structural_hash() != digest:
+        print('Hashing the same tree gives different hashes')
+        sys.exit(1)
+    print(f'{n} nodes')
+    print(f'      first hash: {t_cold:8.3f} s  ({n / t_cold / 1e6:.2f} M nodes/s)')
+    print(f'     hash kept:   {t_warm * 1e6:8.1f} us')
+    print(f' after unpickle:  {t_loaded * 1e6:8.1f} us')
+
+    funcs = root.funcs
+    t_hash, distinct = timed(group, funcs, lambda body: body.structural_hash())
+    t_dump, expected = timed(group, funcs, shape)
+    if distinct != expected:
+        print('Hashes and shapes find different duplicates')
+        sys.exit(1)
+    print(f'{len(funcs)} functions, {distinct} distinct bodies')
+    print(f'  by hash: {t_hash * 1000:8.2f} ms')
+    print(f' by shape: {t_dump * 1000:8.2f} ms  ({t_dump / t_hash:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# The preprocessed text, tokens, XML, type report and WAT of one program, written
+# by one watc process per output against a single process asking for all of
+# them with -e. The compile cache is off so every run does the whole work.
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from common import SRC_DIR, timed, gen_program
+
+SEPARATE = [['-t', 'preprocessor', '-o', '{tmp}/p.c'], ['-t', 'lexer', '-v', 'lexer'],
+            ['-t', 'parser', '-o', '{tmp}/a.xml'], ['-tco', 'True'], ['-t', 'wat', '-o', '{tmp}/w.wat']]
+TOGETHER = ['-e', 'preprocessed={tmp}/p.c', '-e', 'tokens', '-e', 'ast={tmp}/a.xml', '-e', 'types',
+            '-e', 'wat={tmp}/w.wat']
+
+
+def watc(path: str, flags: list, tmp: str):
+    cmd = [sys.executable, 'watc.py', path, '-cc', 'False'] + [f.format(tmp=tmp) for f in flags]
+    subprocess.run(cmd, cwd=SRC_DIR, capture_output=True, check=True)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark several outputs in one watc process')
+    arg_parser.add_argument('--funcs', type=int, default=50)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    arg_parser.add_argument('-n', '--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'main.c')
+        with open(path, 'w') as f:
+            f.write(gen_program(args.funcs, args.stmts))
+        print(f'{os.path.getsize(path) / 1e6:.2f} MB source, {len(SEPARATE)} outputs')
+        t_separate, _ = timed(lambda: [watc(path, flags, tmp) for flags in SEPARATE], repeat=args.repeat)
+        t_together, _ = timed(watc, path, TOGETHER, tmp, repeat=args.repeat)
+    print(f'one process per output: {t_separate:7.3f} s')
+    print(f'  one process, with -e: {t_together:7.3f} s  ({t_separate / t_together:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# Wall clock parse time of one large program with an increasing number of worker
+# processes. Every parallel parse is first checked to give the same tree, line
+# numbers included, as parsing the program in one go.
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+from common import timed, gen_program
+from cache import cache_dir
+from parallel import parse_parallel
+from parse_engines import build, dump
+from lexer import minic_lexer
+from scanner import minic_scanner
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark parsing in worker processes')
+    arg_parser.add_argument('--funcs', type=int, default=400)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    arg_parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    arg_parser.add_argument('-l', '--lexer', choices=('ply', 'scanner'), default='ply')
+    arg_parser.add_argument('-p', '--parser', choices=('yacc', 'descent'), default='yacc')
+    args = arg_parser.parse_args()
+
+    parser = build(minic_scanner if args.lexer == 'scanner' else minic_lexer, args.parser)
+    data = gen_program(args.funcs, args.stmts)
+    print(f'{args.funcs + 1} functions, {len(data) / 1e6:.1f} MB, {os.cpu_count()} cores')
+
+    t, expected = timed(parser.parse, data)
+    expected = dump(expected)
+    print(f'{"serial":>8}: {t:7.3f} s')
+    jobs = 2
+    while jobs <= max(args.jobs, 2):
+        with contextlib.redirect_stderr(io.StringIO()):
+            t, root = timed(parse_parallel, data, jobs, args.lexer, args.parser, cache_dir())
+        if dump(root) != expected:
+            print(f'Parsing in {jobs} processes gives a different tree')
+            sys.exit(1)
+        print(f'{jobs:>3} jobs: {t:7.3f} s')
+        jobs *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Parse time of the PLY grammar against the recursive descent parser. Before
+# timing anything both engines are checked to build the same tree (every node
+# attribute and line number) and to report the same first syntax error.
+import argparse
+import contextlib
+import io
+import sys
+
+from common import timed, gen_program
+import minic_ast as ast
+from cache import cache_dir
+from lexer import minic_lexer
+from parser import minic_parser, TokenReplay
+from scanner import minic_scanner, scan
+
+EDGE_CASES = '''
+int main(int a, char *b, int **c) {
+    int x = 1; char c = 'a'; int *p = &x; int **q = x; int *r = *p; int a[3];
+    x %= *p; x = **p = 3; *p = 4; x[2] += 1; y = - -a++ * 2;
+    a || b || c && d; ++a + b; -a++; x = a + b = c * d; f(g(1, a - b), "hi");
+    if (a < b <= c) { return; } else { while (!a) { break; continue; } }
+    for (i = 0; i < 10; i++) { int z; }
+    return null;
+}
+int *f() {}
+'''
+
+ERROR_CASES = ['int main() { *p + 1; }', 'int main() { x = ; }', 'int main() { int *** p; }',
+               'int main() { if (a) b; }', 'int main() {', 'main() {}']
+
+
+def dump(node):
+    """ Every attribute of every node, line numbers included """
+    if isinstance(node, list):
+        return [dump(n) for n in node]
+    if not isinstance(node, ast.Node):
+        return node
+    return type(node).__name__, [(k, dump(v)) for k, v in ast.node_fields(node)]
+
+
+def parse(parser, data):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        tree = parser.parse(data)
+    return out.getvalue().split('\n')[0], tree
+
+
+def build(lexer_class, engine):
+    lexer = lexer_class()
+    lexer.build_cached(cache_dir=cache_dir())
+    parser = minic_parser()
+    with contextlib.redirect_stderr(io.StringIO()):
+        parser.build(lexer=lexer, cache_dir=cache_dir(), engine=engine)
+    return parser
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the parser engines')
+    arg_parser.add_argument('--funcs', type=int, default=100)
+    arg_parser.add_argument('--stmts', type=int, default=500)
+    args = arg_parser.parse_args()
+
+    engines = (('yacc + ply lexer', build(minic_lexer, 'yacc')),
+               ('descent + ply lexer', build(minic_lexer, 'descent')),
+               ('descent + scanner', build(minic_scanner, 'descent')))
+    yacc = engines[0][1]
+
+    data = gen_program(args.funcs, args.stmts)
+    for source in [EDGE_CASES, data] + ERROR_CASES:
+        error, tree = parse(yacc, source)
+        for name, parser in engines[1:]:
+            got_error, got_tree = parse(parser, source)
+            # After a syntax error PLY's recovery returns whatever it salvaged,
+            # only the reported error has to match then
+            if got_error != error or not error and dump(got_tree) != dump(tree):
+                print(f'{name} differs from yacc on:\n{source}')
+                sys.exit(1)
+    print(f'trees identical ({len(data) / 1e6:.1f} MB program)')
+
+    print('lexing and parsing')
+    base = None
+    for name, parser in engines:
+        t, _ = timed(parser.parse, data, repeat=3)
+        base = base or t
+        print(f'{name:>20}: {t:7.3f} s  ({base / t:.1f}x)')
+
+    print('parsing only, same tokens')
+    replay = TokenReplay(list(scan(data)))
+    base = None
+    for name, parser in (('yacc', yacc), ('descent', engines[2][1])):
+        t, _ = timed(parser.parser.parse, data, lexer=replay, repeat=3)
+        base = base or t
+        print(f'{name:>20}: {t:7.3f} s  ({base / t:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
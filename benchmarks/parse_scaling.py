@@ -0,0 +1,33 @@
+# Parse time against the number of statements in one function. With list
+# building amortized O(1) per element the time per statement stays flat from
+# 1k to 1M statements instead of growing with the size of the function.
+import argparse
+import contextlib
+import io
+import tempfile
+
+from common import timed, gen_program
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark parse time scaling')
+    arg_parser.add_argument('--max', type=int, default=1_000_000, help='Largest statement count')
+    args = arg_parser.parse_args()
+
+    from parser import minic_parser
+    parser = minic_parser()
+    with contextlib.redirect_stderr(io.StringIO()), tempfile.TemporaryDirectory() as tables:
+        parser.build(cache_dir=tables)
+
+    print(f'{"statements":>12} {"parse (s)":>10} {"us/stmt":>8}')
+    n = 1000
+    while n <= args.max:
+        source = gen_program(1, n)
+        t, root = timed(parser.parse, source)
+        assert len(root.funcs[1].body.stmt_lst) == n
+        print(f'{n:>12} {t:>10.3f} {t / n * 1e6:>8.2f}')
+        n *= 10
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# Peak memory of the front end (reading, preprocessing and lexing) on a large
+# generated source file, with the text read and joined in memory the way watc
+# used to, against the memory mapped, streaming pipeline. Each mode runs in its
+# own process so ru_maxrss only sees that mode.
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from common import gen_program
+from preprocessor import preprocessor, MappedFile
+from scanner import scan, scan_lines
+
+
+def count(tokens) -> int:
+    n = 0
+    for _ in tokens:
+        n += 1
+    return n
+
+
+def in_memory(path: str) -> int:
+    with open(path, 'r') as f:
+        lines = [l.replace('\n', '') for l in f.readlines()]
+    data = '\n'.join(list(preprocessor({os.path.basename(path): lines})))
+    return count(scan(data))
+
+
+def streaming(path: str) -> int:
+    with MappedFile(path) as lines:
+        return count(scan_lines(preprocessor({os.path.basename(path): lines})))
+
+
+MODES = {'imports only': lambda path: 0, 'in memory': in_memory, 'streaming': streaming}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark peak memory of the front end')
+    arg_parser.add_argument('--funcs', type=int, default=2000)
+    arg_parser.add_argument('--stmts', type=int, default=500)
+    arg_parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child:
+        mode, path = args.child
+        n = MODES[mode](path)
+        print(n, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'main.c')
+        with open(path, 'w') as f:
+            f.write(gen_program(args.funcs, args.stmts))
+        print(f'{os.path.getsize(path) / 1e6:.1f} MB source')
+        for mode in MODES:
+            out = subprocess.run([sys.executable, __file__, '--child', mode, path],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            print(f'{mode:>12}: {int(out[1]) / 1024:7.1f} MB peak RSS  ({out[0]} tokens)')
+
+
+if __name__ == '__main__':
+    main()
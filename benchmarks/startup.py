@@ -0,0 +1,65 @@
+# Cold start budget for building the lexer and parser.
+#
+#   cold: empty cache, PLY generates the LALR/lexer tables and saves them
+#   warm: tables loaded from the cache, what every compile after the first pays
+#
+# Budget: a warm build must stay under 40 ms
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import SRC_DIR, timed, gen_program
+
+WARM_BUDGET = 0.040
+
+
+def build(cache_dir):
+    from lexer import minic_lexer
+    from parser import minic_parser
+    with contextlib.redirect_stderr(io.StringIO()):
+        lexer = minic_lexer()
+        lexer.build_cached(cache_dir=cache_dir)
+        parser = minic_parser()
+        parser.build(lexer=lexer, cache_dir=cache_dir)
+    return parser
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark lexer/parser start up time')
+    arg_parser.add_argument('-n', '--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    cold = []
+    warm = []
+    for _ in range(args.repeat):
+        directory = tempfile.mkdtemp()
+        cold.append(timed(build, directory)[0])
+        warm.append(timed(build, directory)[0])
+        shutil.rmtree(directory)
+
+    print(f'cold build: {min(cold) * 1000:8.2f} ms')
+    print(f'warm build: {min(warm) * 1000:8.2f} ms (budget {WARM_BUDGET * 1000:.0f} ms)')
+
+    # Whole process, small program, warm cache
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'main.c')
+        with open(source, 'w') as f:
+            f.write(gen_program(1, 10))
+        cmd = [sys.executable, 'watc.py', source, '-v', 'wat', '-o', '/dev/null', '-c', directory]
+        run = lambda: subprocess.run(cmd, cwd=SRC_DIR, capture_output=True)
+        run()
+        t, _ = timed(run, repeat=args.repeat)
+        print(f'watc process (warm cache): {t * 1000:8.2f} ms')
+
+    if min(warm) > WARM_BUDGET:
+        print('Warm build is over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
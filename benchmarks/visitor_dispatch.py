@@ -0,0 +1,123 @@
+# Cost of dispatching on each node of a large generated program, with the
+# handler looked up by building its name and calling getattr on every node, the
+# way the passes used to, against the dispatch tables of minic_ast.Visitor.
+# First dispatch alone, to handlers that do nothing, then a whole walk visiting
+# the children, also with a pre and a post hook added. The type checker is
+# timed both ways too.
+import argparse
+import contextlib
+import io
+
+from common import timed, gen_program
+import minic_ast as ast
+from parse_engines import build
+from scanner import minic_scanner
+from typeChecker import TypeChecker
+
+
+def nothing(self, node):
+    return None
+
+
+def visit_children(self, node):
+    self.count += 1
+    for _, child in node.children():
+        yield child
+
+
+class Count(ast.Visitor):
+    prefix = 'count_'
+
+    def __init__(self):
+        self.count = 0
+
+
+class Nothing(ast.Visitor):
+    prefix = 'nothing_'
+
+
+class GetattrNothing(Nothing):
+    def dispatch(self, node):
+        method = 'nothing_' + node.__class__.__name__
+        return getattr(self, method)(node)
+
+
+for name, cls in vars(ast).items():
+    if isinstance(cls, type) and issubclass(cls, ast.Node) and cls is not ast.Node:
+        setattr(Count, 'count_' + name, visit_children)
+        setattr(Nothing, 'nothing_' + name, nothing)
+
+
+class GetattrCount(Count):
+    def dispatch(self, node):
+        method = 'count_' + node.__class__.__name__
+        return getattr(self, method)(node)
+
+
+class GetattrTypeChecker(TypeChecker):
+    def dispatch(self, node):
+        method = 'check_' + node.__class__.__name__
+        return getattr(self, method)(node)
+
+
+def dispatch_all(visitor, nodes):
+    dispatch = visitor.dispatch
+    for node in nodes:
+        dispatch(node)
+
+
+def hooked(visitor):
+    calls = []
+    visitor.add_hooks(pre=calls.append, post=lambda node, result: None)
+    return visitor
+
+
+def count(visitor, root) -> int:
+    ast.walk(visitor.dispatch, root)
+    return visitor.count
+
+
+def type_check(checker, root):
+    with contextlib.redirect_stdout(io.StringIO()):
+        checker.check(root)
+    return checker.type_errors
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark per node dispatch of the AST passes')
+    arg_parser.add_argument('--funcs', type=int, default=400)
+    arg_parser.add_argument('--stmts', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    data = gen_program(args.funcs, args.stmts)
+    root = build(minic_scanner, 'descent').parse(data)
+
+    nodes = []
+    stack = [root]
+    while stack:
+        nodes.append(stack.pop())
+        stack += [child for _, child in nodes[-1].children()]
+    n = len(nodes)
+    print(f'{n} nodes')
+
+    print('dispatch alone')
+    for name, visitor in (('getattr', GetattrNothing()), ('dispatch table', Nothing())):
+        t, _ = timed(dispatch_all, visitor, nodes, repeat=5)
+        print(f'  {name:>14}: {t:6.3f} s  ({t / n * 1e9:5.0f} ns/node)')
+
+    print('walk over the tree')
+    for name, make in (('getattr', GetattrCount), ('dispatch table', Count),
+                       ('with hooks', lambda: hooked(Count()))):
+        t, visited = timed(lambda: count(make(), root), repeat=3)
+        assert visited == n
+        print(f'  {name:>14}: {t:6.3f} s  ({t / n * 1e9:5.0f} ns/node)')
+
+    t_old, old_errors = timed(lambda: type_check(GetattrTypeChecker(data), root), repeat=3)
+    t_new, new_errors = timed(lambda: type_check(TypeChecker(data), root), repeat=3)
+    assert old_errors == new_errors
+    print(f'type checker, getattr: {t_old:6.3f} s')
+    print(f'type checker,   table: {t_new:6.3f} s  ({(1 - t_new / t_old) * 100:.0f}% less)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Assembling a generated module to wasm with wasm_binary, straight from its
+# instructions, against writing its WAT and running wat2wasm on it. Each module
+# is checked with WebAssembly.validate in Node when node is on the PATH, and
+# compared byte for byte with wat2wasm's output when wat2wasm can be run
+# (installed, or in client/node_modules after `npm install`).
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+
+from common import SRC_DIR, timed, gen_program
+from parse_engines import build
+from scanner import minic_scanner
+from wasm_binary import encode
+from wat import Wat
+
+VALIDATE_JS = 'process.exit(WebAssembly.validate(require("fs").readFileSync(process.argv[1])) ? 0 : 1)'
+
+
+def generate(root) -> Wat:
+    wat = Wat(False)
+    wat.generate(root)
+    return wat
+
+
+def wat2wasm_command() -> list:
+    if shutil.which('wat2wasm'):
+        return ['wat2wasm']
+    if shutil.which('npx') and os.path.isdir(os.path.join(SRC_DIR, 'client', 'node_modules', 'wat2wasm')):
+        return ['npx', '--no-install', 'wat2wasm']
+    return None
+
+
+def wat2wasm(command, wat, tmp) -> bytes:
+    wat_name, wasm_name = os.path.join(tmp, 'module.wat'), os.path.join(tmp, 'module.wasm')
+    with open(wat_name, 'w') as f:
+        wat.write_wat(f)
+    subprocess.run(command + [wat_name, '--output=' + wasm_name], check=True, capture_output=True,
+                   cwd=os.path.join(SRC_DIR, 'client'))
+    with open(wasm_name, 'rb') as f:
+        return f.read()
+
+
+def validate(wasm: bytes, tmp) -> bool:
+    filename = os.path.join(tmp, 'encoded.wasm')
+    with open(filename, 'wb') as f:
+        f.write(wasm)
+    return subprocess.run(['node', '-e', VALIDATE_JS, filename]).returncode == 0
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the wasm encoder against wat2wasm')
+    arg_parser.add_argument('--funcs', type=int, nargs='+', default=[10, 100, 1000])
+    arg_parser.add_argument('--stmts', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    parser = build(minic_scanner, 'descent')
+    command = wat2wasm_command()
+    has_node = shutil.which('node') is not None
+    if command is None:
+        print('wat2wasm not found, only the encoder is timed')
+    if not has_node:
+        print('node not found, the modules are not validated')
+    print(f'{"functions":>9} {"bytes":>9} {"encode":>10} {"wat2wasm":>10}  checks')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_funcs in args.funcs:
+            wat = generate(parser.parse(gen_program(n_funcs, args.stmts)))
+            t, wasm = timed(encode, wat.module, repeat=3)
+            checks = []
+            if has_node:
+                checks.append('valid' if validate(wasm, tmp) else 'INVALID')
+            t_wat2wasm = ''
+            if command is not None:
+                t_tool, expected = timed(wat2wasm, command, wat, tmp)
+                t_wat2wasm = f'{t_tool:8.3f} s'
+                checks.append('same bytes' if expected == wasm else 'BYTES DIFFER')
+            print(f'{n_funcs:>9} {len(wasm):>9} {t:8.3f} s {t_wat2wasm:>10}  {", ".join(checks)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# WAT generation time against the number of functions in the module. The
+# offset placeholders of a function are patched from the fixup table Wat keeps
+# as it adds them, rather than by searching every instruction generated so far
+# at the end of each function, which made generation quadratic in the functions.
+import argparse
+import io
+
+from common import timed, gen_program
+from parse_engines import build
+from scanner import minic_scanner
+from wat import Wat
+
+
+class RescanWat(Wat):
+    def patch_offsets(self):
+        # Every instruction generated so far is searched
+        stack = [instr for func in self.module.funcs for instr in func.body]
+        while stack:
+            instr = stack.pop()
+            stack += instr.operands
+            if '$TOTAL_OFFSET$' in instr.imms:
+                placeholder = '$TOTAL_OFFSET$'
+            elif '$INT_OFFSET$' in instr.imms:
+                self.curr_offset -= 4
+                placeholder = '$INT_OFFSET$'
+            elif '$CHAR_OFFSET$' in instr.imms:
+                self.curr_offset -= 3
+                placeholder = '$CHAR_OFFSET$'
+            else:
+                continue
+            instr.imms = tuple(self.curr_offset if imm == placeholder else imm for imm in instr.imms)
+        self.fixups = []
+
+
+def generate(wat_class, root):
+    wat = wat_class(False)
+    wat.generate(root)
+    return wat
+
+
+def text(wat) -> str:
+    out = io.StringIO()
+    wat.write_wat(out)
+    return out.getvalue()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark WAT generation against the number of functions')
+    arg_parser.add_argument('--funcs', type=int, nargs='+', default=[625, 1250, 2500, 5000, 10000])
+    arg_parser.add_argument('--stmts', type=int, default=6)
+    # The rescans take minutes past a few thousand functions
+    arg_parser.add_argument('--rescan-max', type=int, default=1250)
+    args = arg_parser.parse_args()
+
+    parser = build(minic_scanner, 'descent')
+    print(f'{"functions":>9} {"rescan":>14} {"fixup table":>14}')
+    for n_funcs in args.funcs:
+        root = parser.parse(gen_program(n_funcs, args.stmts))
+        t, wat = timed(generate, Wat, root, repeat=3)
+        rescan = ''
+        if n_funcs <= args.rescan_max:
+            t_rescan, rescan_wat = timed(generate, RescanWat, root)
+            assert text(rescan_wat) == text(wat)
+            rescan = f'{t_rescan:6.3f} s'
+        print(f'{n_funcs:>9} {rescan:>14} {t:6.3f} s ({t / n_funcs * 1e6:4.0f} us/function)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Generating and writing out the WAT of a large module, with the whole module
+# kept and then written, against each function written to the file as soon as
+# it is done. Besides the time, the peak memory allocated past the parsed tree
+# is reported.
+import argparse
+import os
+import tempfile
+import tracemalloc
+
+from common import timed, gen_program
+from parse_engines import build
+from scanner import minic_scanner
+from wat import Wat
+
+
+def kept(root, filename):
+    wat = Wat(False)
+    wat.generate(root)
+    with open(filename, 'w') as f:
+        wat.write_wat(f)
+
+
+def streamed(root, filename):
+    with open(filename, 'w') as f:
+        Wat(False, out=f).generate(root)
+
+
+def peak(fn, *args) -> int:
+    tracemalloc.start()
+    fn(*args)
+    _, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak_size
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the WAT emitter')
+    arg_parser.add_argument('--funcs', type=int, default=2000)
+    arg_parser.add_argument('--stmts', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    root = build(minic_scanner, 'descent').parse(gen_program(args.funcs, args.stmts))
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [os.path.join(tmp, f'{i}.wat') for i in range(2)]
+        runs = (('kept', kept, root, files[0]),
+                ('streamed', streamed, root, files[1]))
+        for name, fn, *fn_args in runs:
+            t, _ = timed(fn, *fn_args, repeat=3)
+            size = peak(fn, *fn_args)
+            print(f'{name:>8}: {t:6.3f} s  peak {size / 2 ** 20:6.1f} MiB')
+        texts = []
+        for filename in files:
+            with open(filename) as f:
+                texts.append(f.read())
+        assert texts[0] == texts[1]
+        print(f'{texts[0].count(chr(10))} lines of WAT')
+
+
+if __name__ == '__main__':
+    main()
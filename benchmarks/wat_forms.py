@@ -0,0 +1,79 @@
+# Size of the WAT written folded and indented against flat, and the time to
+# write it and to assemble it back into wasm: reading it with wat_reader and
+# encoding it, and with wat2wasm as well when it can be run. Both forms are
+# checked to assemble to the same bytes as the module they were written from.
+import argparse
+import io
+import os
+import subprocess
+import tempfile
+
+from common import SRC_DIR, timed, gen_program
+from parse_engines import build
+from scanner import minic_scanner
+from wasm_binary import encode
+from wasm_encoder import wat2wasm_command
+from wat import Wat
+from wat_ir import write_module
+from wat_reader import read_module
+
+
+def generate(root):
+    wat = Wat(False)
+    wat.generate(root)
+    return wat.module
+
+
+def text(module, flat: bool) -> str:
+    out = io.StringIO()
+    write_module(module, out, flat)
+    return out.getvalue()
+
+
+def assemble(wat_text: str) -> bytes:
+    return encode(read_module(io.StringIO(wat_text)))
+
+
+def wat2wasm(command, wat_text: str, tmp) -> bytes:
+    wat_name, wasm_name = os.path.join(tmp, 'module.wat'), os.path.join(tmp, 'module.wasm')
+    with open(wat_name, 'w') as f:
+        f.write(wat_text)
+    subprocess.run(command + [wat_name, '--output=' + wasm_name], check=True, capture_output=True,
+                   cwd=os.path.join(SRC_DIR, 'client'))
+    with open(wasm_name, 'rb') as f:
+        return f.read()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compare folded and flat WAT output')
+    arg_parser.add_argument('--funcs', type=int, nargs='+', default=[10, 100, 1000])
+    arg_parser.add_argument('--stmts', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    parser = build(minic_scanner, 'descent')
+    command = wat2wasm_command()
+    if command is None:
+        print('wat2wasm not found, only the in-process assembler is timed')
+    print(f'{"functions":>9} {"form":>6} {"size":>11} {"write":>9} {"assemble":>9} {"wat2wasm":>9}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_funcs in args.funcs:
+            module = generate(parser.parse(gen_program(n_funcs, args.stmts)))
+            wasm = encode(module)
+            sizes = []
+            for form, flat in (('folded', False), ('flat', True)):
+                t_write, wat_text = timed(text, module, flat, repeat=3)
+                t_assemble, assembled = timed(assemble, wat_text, repeat=3)
+                assert assembled == wasm
+                t_wat2wasm = ''
+                if command is not None:
+                    t_tool, assembled = timed(wat2wasm, command, wat_text, tmp)
+                    assert assembled == wasm
+                    t_wat2wasm = f'{t_tool:7.3f} s'
+                sizes.append(len(wat_text))
+                print(f'{n_funcs:>9} {form:>6} {len(wat_text) / 1024:7.1f} KiB {t_write:7.3f} s '
+                      f'{t_assemble:7.3f} s {t_wat2wasm:>9}')
+            print(f'{"":>9} {"":>6} flat is {sizes[1] / sizes[0]:.0%} of folded, the wasm is {len(wasm) / 1024:.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
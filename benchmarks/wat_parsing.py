@@ -0,0 +1,85 @@
+# Reading WAT text back into a module, for the folded text Wat writes and the
+# same code written flat, one instruction a line in stack order. Throughput is
+# reported for growing modules, staying flat as reading is linear in the text.
+# Each module read is checked against the generated one: the text must come
+# back unchanged and both forms must encode to the same wasm. Every memory
+# instruction is first taken through read, write and read again.
+import argparse
+import io
+
+from common import timed, gen_program
+from parse_engines import build
+from scanner import minic_scanner
+from wasm_binary import encode
+from wat import Wat
+from wat_ir import Module, Func, Instr, MEMORY_OPCODES, write_module
+from wat_reader import read_module
+
+
+def generate(root) -> Module:
+    wat = Wat(False)
+    wat.generate(root)
+    return wat.module
+
+
+def text(module: Module, flat: bool) -> str:
+    out = io.StringIO()
+    write_module(module, out, flat)
+    return out.getvalue()
+
+
+def read(text: str) -> Module:
+    return read_module(io.StringIO(text))
+
+
+def memory_module() -> Module:
+    """ A function using every memory instruction, with and without an offset """
+    module = Module()
+    module.memories.append((0, 1))
+    func = Func('memory', 0, [0])
+    for op in MEMORY_OPCODES:
+        for offset in (8, 0):
+            address = Instr('get_local', 0)
+            imms = (offset,) if offset else ()
+            if op.startswith('i32.store'):
+                func.body.append(Instr(op, *imms, operands=[address, Instr('i32.const', 1)]))
+            else:
+                func.body.append(Instr('drop', operands=[Instr(op, *imms, operands=[address])]))
+    module.funcs.append(func)
+    return module
+
+
+def check_memory_ops():
+    module = memory_module()
+    wasm = encode(module)
+    for flat in (False, True):
+        wat_text = text(module, flat)
+        read_back = read(wat_text)
+        assert text(read_back, flat) == wat_text
+        assert text(read(text(read_back, flat)), flat) == wat_text
+        assert encode(read_back) == wasm
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark reading WAT text')
+    arg_parser.add_argument('--funcs', type=int, nargs='+', default=[250, 1000, 2000])
+    arg_parser.add_argument('--stmts', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    check_memory_ops()
+    parser = build(minic_scanner, 'descent')
+    print(f'{"functions":>9} {"form":>6} {"size":>9} {"read":>9} {"throughput":>12}')
+    for n_funcs in args.funcs:
+        module = generate(parser.parse(gen_program(n_funcs, args.stmts)))
+        wasm = encode(module)
+        for form, flat in (('folded', False), ('flat', True)):
+            wat_text = text(module, flat)
+            t, read_back = timed(read, wat_text, repeat=3)
+            assert text(read_back, flat) == wat_text
+            assert encode(read_back) == wasm
+            size = len(wat_text) / 2 ** 20
+            print(f'{n_funcs:>9} {form:>6} {size:6.2f} MiB {t:7.3f} s {size / t:7.2f} MiB/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Validating a generated module in-process with wat_validator, against
+# encoding it and having an engine check it, which is how an invalid module
+# showed up before: writing it out and starting Node on it. Both verdicts are
+# compared when node is on the PATH, and the modules of programs Wat is known
+# to generate wrongly are checked to be rejected.
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+
+from common import timed, gen_program
+from parse_engines import build
+from scanner import minic_scanner
+from wasm_binary import encode
+from wat import Wat
+from wat_validator import validate
+
+VALIDATE_JS = 'process.exit(WebAssembly.validate(require("fs").readFileSync(process.argv[1])) ? 0 : 1)'
+
+# Programs whose module is invalid
+INVALID_PROGRAMS = {
+    # The value of a return past a break is left on the stack of the else block
+    'value after br': '''
+int main() {
+    int a = 7;
+    while (a > 0) {
+        if (a > 5) {
+            a = 2;
+        } else {
+            break;
+            return 5;
+        }
+    }
+    return 0;
+}
+''',
+}
+
+
+def generate(root):
+    wat = Wat(False)
+    wat.generate(root)
+    return wat.module
+
+
+def node_validate(module, filename) -> bool:
+    with open(filename, 'wb') as f:
+        f.write(encode(module))
+    return subprocess.run(['node', '-e', VALIDATE_JS, filename]).returncode == 0
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark the in-process wasm validator')
+    arg_parser.add_argument('--funcs', type=int, nargs='+', default=[1, 10, 100, 1000])
+    arg_parser.add_argument('--stmts', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    parser = build(minic_scanner, 'descent')
+    has_node = shutil.which('node') is not None
+    if not has_node:
+        print('node not found, only the validator is timed')
+    print(f'{"functions":>9} {"validate":>11} {"node":>11}  verdict')
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'module.wasm')
+        for n_funcs in args.funcs:
+            module = generate(parser.parse(gen_program(n_funcs, args.stmts)))
+            t, errors = timed(validate, module, repeat=5)
+            verdict = 'valid' if not errors else f'{len(errors)} invalid functions'
+            t_node = ''
+            if has_node:
+                t_engine, valid = timed(node_validate, module, filename)
+                t_node = f'{t_engine * 1e3:7.1f} ms'
+                assert valid == (not errors)
+            print(f'{n_funcs:>9} {t * 1e3:7.1f} ms {t_node:>11}  {verdict}')
+        for name, program in INVALID_PROGRAMS.items():
+            module = generate(parser.parse(program))
+            errors = validate(module)
+            assert errors, name
+            if has_node:
+                assert not node_validate(module, filename), name
+            print(f'{name}: rejected, {errors[0]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+
+# Files whose contents decide whether the generated lexer/parser tables are still valid
+GRAMMAR_FILES = ('lexer.py', 'parser.py')
+# Files whose contents decide what a program compiles to
+COMPILER_FILES = GRAMMAR_FILES + ('scanner.py', 'descent.py', 'minic_ast.py', 'wat.py', 'wat_symbols.py', 'wat_ir.py',
+                                   'wasm_binary.py')
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def cache_dir(path=None) -> str:
+    """
+    Directory holding everything watc caches between runs. Uses $WATC_CACHE_DIR
+    when set, otherwise ~/.cache/watc
+    """
+    if path is None:
+        path = os.environ.get('WATC_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'watc')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_hash(*paths) -> str:
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def grammar_version() -> str:
+    return file_hash(*[os.path.join(SRC_DIR, f) for f in GRAMMAR_FILES])[:16]
+
+
+def compiler_version() -> str:
+    return file_hash(*[os.path.join(SRC_DIR, f) for f in COMPILER_FILES])[:16]
+
+
+def source_hash(lines) -> str:
+    """ Hash of a preprocessed source given as an iterable of lines, without keeping them """
+    h = hashlib.sha256()
+    for line in lines:
+        h.update(line.encode())
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def atomic_write(path: str, data: bytes):
+    """ Write data to path so readers only ever see the old file or the whole new one """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def table_name(prefix: str) -> str:
+    return f'{prefix}_{grammar_version()}'
+
+
+def load_table(directory: str, name: str):
+    """
+    Load a previously generated PLY table module from the cache. Returns the
+    module itself if it exists and imports cleanly, otherwise the name PLY should
+    generate it under.
+    """
+    path = os.path.join(directory, name + '.py')
+    if not os.path.isfile(path):
+        return name
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception:
+        return name
+    return module
+
+
+class TableWriter(object):
+    """
+    Give PLY a private scratch directory to write its tables to, then move them
+    into the cache once complete so concurrent compiles never see half written files
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def __enter__(self):
+        self.tmp_dir = tempfile.mkdtemp(dir=self.directory, prefix='.tables-')
+        return self.tmp_dir
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                for f in os.listdir(self.tmp_dir):
+                    if f.endswith('.py'):
+                        os.replace(os.path.join(self.tmp_dir, f), os.path.join(self.directory, f))
+        finally:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class CompileCache(object):
+    """
+    Content addressed store of compiled programs, one file per output (.wat,
+    .wasm) named by the key of the compile. The modification time of a file is
+    its last use, and the least recently used files are evicted once the cache
+    outgrows max_bytes.
+    """
+    STATS = 'stats.json'
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 2**20):
+        self.directory = os.path.join(directory, 'compile')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(source: str, **flags) -> str:
+        """ Key of compiling the preprocessed source with source_hash `source` under flags """
+        h = hashlib.sha256()
+        h.update(compiler_version().encode())
+        h.update(repr(sorted(flags.items())).encode())
+        h.update(source.encode())
+        return h.hexdigest()
+
+    def path(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, f'{key}.{kind}')
+
+    def load(self, key: str, kind: str):
+        """ The cached output, or None """
+        path = self.path(key, kind)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.count('misses')
+            return None
+        self.count('hits')
+        return data
+
+    def store(self, key: str, kind: str, data: bytes):
+        atomic_write(self.path(key, kind), data)
+        self.evict()
+
+    def entries(self) -> list:
+        """ (last use, size, path) of every cached output """
+        entries = []
+        for e in os.scandir(self.directory):
+            if e.name.startswith('.') or e.name == self.STATS:
+                continue
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # Another compile may have evicted it already
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            total -= size
+
+    def read_stats(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, self.STATS)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def count(self, event: str):
+        # Shared by every compile using the cache, increments racing with each
+        # other can get lost so the counts are approximate under concurrency
+        stats = self.read_stats()
+        stats[event] = stats.get(event, 0) + 1
+        atomic_write(os.path.join(self.directory, self.STATS), json.dumps(stats).encode())
+
+    def stats(self) -> dict:
+        entries = self.entries()
+        stats = self.read_stats()
+        stats['entries'] = len(entries)
+        stats['bytes'] = sum(size for _, size, _ in entries)
+        return stats
+
+
+class WatText(object):
+    """ WAT loaded from the compile cache, written and printed the same way as a Wat """
+    def __init__(self, text: str):
+        self.text = text
+
+    def print_wat(self):
+        print(self.text, end='')
+
+    def write_wat(self, f):
+        f.write(self.text)
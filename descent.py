@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# Hand written recursive descent parser for miniC with Pratt parsing for the
+# expressions. It builds exactly the same minic_ast trees (line numbers included)
+# as the PLY grammar in parser.py, including the way PLY resolves that grammar's
+# conflicts:
+#   - operators bind according to minic_parser.precedence, || has no entry there
+#     so it binds loosest of all and groups to the right
+#   - assignments, declarations with a value and prefix ++/-- take everything to
+#     their right, postfix ++/-- applies to everything to its left up to the
+#     closest of those or ||
+#   - a leading * is always a single pointer_lst, never a dereference operator
+#   - only the nodes the grammar actions number get a line number, and those
+#     numbered from a nonterminal (BinOp, postfix UnaryOp, FuncDec, ...) get 0
+
+import minic_ast as ast
+from parser import minic_parser
+
+EQ_OPS = ('EQ', 'TIMESEQ', 'DIVIDEEQ', 'MODULOEQ', 'PLUSEQ', 'MINUSEQ')
+# Operators the grammar action checks for to tell `ID eq_op pointer_lst expr` apart
+# from `pointer_lst ID eq_op expr` (%= is missing in parser.py as well)
+ACTION_EQ_OPS = {"=", "*=", "-=", "+=", "/="}
+# Tokens other than ID an operand can start with
+OPERAND_KINDS = ('NUMBER', 'TRUE', 'FALSE', 'NULL', 'CHARACTER', 'TEXT', 'LPAREN', 'MINUS', 'BANG',
+                 'REFERENCE', 'PLUSPLUS', 'MINUSMINUS', 'ASTERISK', 'INT', 'CHAR')
+
+# Precedence level of every binary operator, || and postfix ++/-- have level 0
+LEVELS = {'OROP': 0, 'PLUSPLUS': 0, 'MINUSMINUS': 0}
+for level, (assoc, *names) in enumerate(minic_parser.precedence, 1):
+    for name in names:
+        LEVELS[name] = level
+LEVELS.pop('UNARY')
+
+
+class ParseError(Exception):
+    def __init__(self, tok):
+        self.tok = tok
+
+
+class DescentParser(object):
+    def __init__(self, lexer=None):
+        # Anything with the PLY lexer interface: minic_lexer().lexer or a Scanner
+        self.lexer = lexer
+
+    def parse(self, data, lexer=None):
+        lexer = lexer or self.lexer
+        lexer.input(data)
+        self.next_token = lexer.token
+        try:
+            with ast.paused_gc():
+                self.advance()
+                return self.program()
+        except ParseError as e:
+            print(f"Syntax error in input for {e.tok}")
+            return None
+
+    #
+    #	Tokens
+    #
+    def advance(self):
+        tok = self.tok = self.next_token()
+        self.kind = tok.type if tok is not None else None
+
+    def expect(self, kind):
+        tok = self.tok
+        if self.kind != kind:
+            raise ParseError(tok)
+        self.advance()
+        return tok
+
+    #
+    #	Main Program | Start of Program
+    #
+    def program(self):
+        funcs = [self.func_dec()]
+        while self.tok is not None:
+            funcs.append(self.func_dec())
+        return ast.Program(funcs)
+
+    def func_dec(self):
+        ret_type = self.type()
+        name = self.expect('ID').value
+        self.expect('LPAREN')
+        formals = None
+        if self.kind != 'RPAREN':
+            formals = [self.formal()]
+            while self.kind == 'COMMA':
+                self.advance()
+                formals.append(self.formal())
+        self.expect('RPAREN')
+        fDec = ast.FuncDec(ret_type, name, ast.ParamList(formals), self.scope())
+        fDec.setLineNumber(0)
+        return fDec
+
+    def formal(self):
+        type = self.type()
+        return ast.Formal(self.expect('ID').value, type)
+
+    def type(self):
+        if self.kind != 'INT' and self.kind != 'CHAR':
+            raise ParseError(self.tok)
+        name = self.tok.value
+        self.advance()
+        # The type takes a single *, any further one is the declaration's pointer_lst
+        if self.kind == 'ASTERISK':
+            self.advance()
+            return ast.Type(name, 1)
+        return ast.Type(name)
+
+    #
+    # 	Statements
+    #
+    def scope(self):
+        self.expect('LBRACE')
+        stmts = None
+        if self.kind != 'RBRACE':
+            stmts = []
+            while self.kind != 'RBRACE':
+                stmts.append(self.stmt())
+        self.advance()
+        return ast.StmtList(stmts)
+
+    def stmt(self):
+        match self.kind:
+            case 'IF':
+                self.advance()
+                cond = self.paren_expr()
+                true_body = self.scope()
+                if self.kind == 'ELSE':
+                    self.advance()
+                    return ast.IfStmt(cond, true_body, self.scope())
+                return ast.IfStmt(cond, true_body)
+            case 'WHILE':
+                self.advance()
+                cond = self.paren_expr()
+                return ast.WhileStmt(cond, self.scope())
+            case 'FOR':
+                self.advance()
+                self.expect('LPAREN')
+                expr1 = self.expr()
+                self.expect('SEMICOL')
+                expr2 = self.expr()
+                self.expect('SEMICOL')
+                expr3 = self.expr()
+                self.expect('RPAREN')
+                return ast.ForStmt(expr1, expr2, expr3, self.scope())
+            case 'RETURN':
+                self.advance()
+                if self.kind == 'SEMICOL':
+                    self.advance()
+                    return ast.RetStmt(None)
+                expr = self.expr()
+                self.expect('SEMICOL')
+                return ast.RetStmt(expr)
+            case 'CONTINUE':
+                self.advance()
+                self.expect('SEMICOL')
+                return ast.ContinueStmt()
+            case 'BREAK':
+                self.advance()
+                self.expect('SEMICOL')
+                return ast.BreakStmt()
+        expr = self.expr()
+        self.expect('SEMICOL')
+        return expr
+
+    def paren_expr(self):
+        self.expect('LPAREN')
+        expr = self.expr()
+        self.expect('RPAREN')
+        return expr
+
+    #
+    #		Expressions
+    #
+    def expr(self, level=0, right=True):
+        """
+        Pratt loop: parse an operand, then keep taking operators as long as they
+        would be shifted inside a rule of the given precedence level, i.e. they
+        bind tighter, or equally tight when the rule groups to the right
+        """
+        left = self.operand()
+        while True:
+            op_level = LEVELS.get(self.kind)
+            if op_level is None or op_level < level or (op_level == level and not right):
+                return left
+            tok = self.tok
+            self.advance()
+            if tok.type == 'PLUSPLUS' or tok.type == 'MINUSMINUS':
+                left = ast.UnaryOp(tok.value, left)
+            elif op_level == 0:
+                left = ast.BinOp(tok.value, left, self.expr(0, True))
+            else:
+                left = ast.BinOp(tok.value, left, self.expr(op_level, False))
+            left.setLineNumber(0)
+
+    def operand(self):
+        tok = self.tok
+        kind = self.kind
+        if kind == 'ID':
+            self.advance()
+            if self.kind == 'LPAREN':
+                return self.func_call(tok)
+            if self.kind in EQ_OPS:
+                return self.assignment(tok)
+            if self.kind == 'LBRACKET':
+                self.advance()
+                place = self.expect('NUMBER').value
+                self.expect('RBRACKET')
+                op = self.eq_op()
+                x = ast.AssignmentStmt(tok.value, op, self.expr(), place_of_assignment=place)
+                x.setLineNumber(tok.lineno)
+                return x
+            x = ast.Constant('id', tok.value)
+            x.setLineNumber(tok.lineno)
+            return x
+
+        # The token is left current when it cannot start an operand
+        if kind not in OPERAND_KINDS:
+            raise ParseError(tok)
+        self.advance()
+        match kind:
+            case 'NUMBER':
+                x = ast.Constant('int', tok.value)
+                x.setLineNumber(tok.lineno)
+                return x
+            case 'TRUE' | 'FALSE':
+                x = ast.Constant('bool', tok.value)
+                x.setLineNumber(tok.lineno)
+                return x
+            case 'NULL':
+                return ast.Constant('null', tok.value)
+            case 'CHARACTER' | 'TEXT':
+                return ast.Constant('words', tok.value)
+            case 'LPAREN':
+                expr = self.expr()
+                self.expect('RPAREN')
+                return expr
+            case 'MINUS' | 'BANG' | 'REFERENCE':
+                # Nothing binds tighter than UNARY, so the operand is a single operand
+                x = ast.UnaryOp(tok.value, self.operand())
+                x.setLineNumber(tok.lineno)
+                return x
+            case 'PLUSPLUS' | 'MINUSMINUS':
+                x = ast.UnaryOp(tok.value, self.expr())
+                x.setLineNumber(tok.lineno)
+                return x
+            case 'ASTERISK':
+                # pointer_lst ID eq_op expr
+                name = self.expect('ID').value
+                op = self.eq_op()
+                x = ast.AssignmentStmt(name, op, self.expr(), 1)
+                x.setLineNumber(0)
+                return x
+            case 'INT' | 'CHAR':
+                return self.declaration(tok)
+
+    def eq_op(self):
+        if self.kind not in EQ_OPS:
+            raise ParseError(self.tok)
+        op = self.tok.value
+        self.advance()
+        return op
+
+    def func_call(self, tok):
+        self.advance()
+        params = None
+        if self.kind != 'RPAREN':
+            params = [self.expr()]
+            while self.kind == 'COMMA':
+                self.advance()
+                params.append(self.expr())
+        self.expect('RPAREN')
+        fCall = ast.FuncCall(tok.value, params)
+        fCall.setLineNumber(tok.lineno)
+        return fCall
+
+    def assignment(self, tok):
+        op = self.eq_op()
+        if self.kind == 'ASTERISK':
+            # ID eq_op pointer_lst expr
+            self.advance()
+            if op in ACTION_EQ_OPS:
+                x = ast.AssignmentStmt(tok.value, op, self.expr(), 1, is_ptr=False)
+            else:
+                x = ast.AssignmentStmt(op, 1, self.expr(), tok.value)
+        else:
+            x = ast.AssignmentStmt(tok.value, op, self.expr())
+        x.setLineNumber(tok.lineno)
+        return x
+
+    def declaration(self, tok):
+        # The base type token has already been consumed
+        type = ast.Type(tok.value)
+        if self.kind == 'ASTERISK':
+            self.advance()
+            type = ast.Type(tok.value, 1)
+
+        if self.kind == 'ASTERISK':
+            # type pointer_lst ID [EQ expr]
+            self.advance()
+            name = self.expect('ID').value
+            if self.kind == 'EQ':
+                self.advance()
+                return ast.DeclStmt(name, type, self.expr(), 1)
+            return ast.DeclStmt(name, type, None, 1)
+
+        name = self.expect('ID').value
+        if self.kind == 'LBRACKET':
+            self.advance()
+            array_len = self.expect('NUMBER').value
+            self.expect('RBRACKET')
+            return ast.ArrayExpr(name, type, array_len)
+        if self.kind != 'EQ':
+            return ast.DeclStmt(name, type, None)
+        self.advance()
+        if self.kind == 'ASTERISK':
+            # type ID EQ pointer_lst expr
+            self.advance()
+            return ast.DeclStmt(name, type, self.expr(), 1, is_ptr=False)
+        return ast.DeclStmt(name, type, self.expr())
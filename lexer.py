@@ -2,6 +2,7 @@
 
 import argparse
 from ply import lex
+from cache import load_table, table_name, TableWriter
 
 # List of token names
 tokens = [
@@ -146,6 +147,20 @@ class minic_lexer():
         self.tokens = tokens
         self.lexer = lex.lex(module=self, **kwargs)
 
+    # Build the lexer. When a cache directory is given the lexer tables are loaded
+    # from it, and only generated (then saved) when lexer.py/parser.py changed
+    def build_cached(self, cache_dir=None, **kwargs):
+        if cache_dir is None:
+            self.build(**kwargs)
+            return
+
+        lextab = load_table(cache_dir, table_name('lextab'))
+        if not isinstance(lextab, str):
+            self.build(optimize=1, lextab=lextab, **kwargs)
+        else:
+            with TableWriter(cache_dir) as outputdir:
+                self.build(optimize=1, lextab=lextab, outputdir=outputdir, **kwargs)
+
     # Test the output. DO NOT MODIFY
     def test(self, data):
         self.lexer.input(data)
@@ -1,7 +1,173 @@
 # This ast class is based off the minijavast from tutorial
+import gc
+import hashlib
+import io
+import pickle
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from types import GeneratorType
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while a tree is built in one go. Every
+    node created stays alive and trees hold no cycles, so the collections the
+    allocations would trigger can never free anything.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class ASTUnpickler(pickle.Unpickler):
+    """ Unpickler that only builds AST nodes, so a tampered cache file cannot run code """
+    def find_class(self, module, name):
+        cls = globals().get(name) if module == __name__ else None
+        if not (isinstance(cls, type) and issubclass(cls, Node)):
+            raise pickle.UnpicklingError(f"{module}.{name} is not an AST node")
+        return cls
+
+
+def dumps(node) -> bytes:
+    """
+    Binary serialization of a tree, every attribute (line numbers included) kept.
+    Raises RecursionError for trees deeper than the recursion limit
+    """
+    return pickle.dumps(node, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data: bytes):
+    """ Tree serialized by dumps, the loader runs in C and needs no recursion """
+    with paused_gc():
+        return ASTUnpickler(io.BytesIO(data)).load()
+
+
+def node_fields(node) -> list:
+    """ (name, value) of every attribute set on node, its line number last """
+    fields = []
+    for cls in type(node).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if name != 'merkle' and hasattr(node, name):
+                fields.append((name, getattr(node, name)))
+    return fields
+
+
+# Attributes hashed for each node class, the position (coord) is left out
+hashed_fields = {}
+# Stands for an attribute that was never set
+UNSET = object()
+
+
+def merkle_step(node):
+    # Memoized hashes end the walk right there, nodes holding other nodes need
+    # their hashes first
+    try:
+        return node.merkle
+    except AttributeError:
+        pass
+    cls = type(node)
+    if cls not in hashed_fields:
+        hashed_fields[cls] = tuple(name for name in cls.__slots__ if name != 'coord')
+    values = [getattr(node, name, UNSET) for name in hashed_fields[cls]]
+    for value in values:
+        if isinstance(value, (Node, list)):
+            return merkle_parts(node, values)
+    return merkle_digest(node, [merkle_scalar(value) for value in values])
+
+
+def merkle_scalar(value) -> bytes:
+    # Length prefixed so different values cannot run into each other
+    if value is UNSET:
+        return b'-'
+    text = repr(value).encode()
+    return b'%d:' % len(text) + text
+
+
+def merkle_parts(node, values):
+    parts = []
+    for value in values:
+        if isinstance(value, list):
+            parts.append(b'[%d' % len(value))
+            for item in value:
+                parts.append(b'#' + (yield item) if isinstance(item, Node) else merkle_scalar(item))
+        elif isinstance(value, Node):
+            parts.append(b'#' + (yield value))
+        else:
+            parts.append(merkle_scalar(value))
+    return merkle_digest(node, parts)
+
+
+def merkle_digest(node, parts) -> bytes:
+    """ Hash of node from its kind and the encoded attributes, kept on the node """
+    digest = hashlib.blake2b(type(node).__name__.encode() + b'(' + b''.join(parts), digest_size=16).digest()
+    # Types are interned and refuse plain assignment
+    object.__setattr__(node, 'merkle', digest)
+    return digest
+
+
+def walk(dispatch, node):
+    """
+    Explicit stack traversal engine used by every pass over the AST, so the depth
+    of the tree never turns into Python recursion.
+
+    dispatch(node) runs the handler for a node. A plain handler just returns its
+    result. A handler written as a generator yields whatever it wants visited
+    next and is sent back the result, i.e. `left = yield node.left`. It may also
+    yield another generator (a helper taking extra arguments) which is run to
+    completion the same way. The generator's return value is its result.
+    """
+    result = dispatch(node)
+    if not isinstance(result, GeneratorType):
+        return result
+
+    stack = [result]
+    value = None
+    error = None
+    while stack:
+        try:
+            if error is not None:
+                item = stack[-1].throw(error)
+                error = None
+            else:
+                item = stack[-1].send(value)
+        except StopIteration as e:
+            stack.pop()
+            value = e.value
+            continue
+        except Exception as e:
+            stack.pop()
+            if not stack:
+                raise
+            error = e
+            continue
+
+        if isinstance(item, GeneratorType):
+            stack.append(item)
+            value = None
+            continue
+        try:
+            result = dispatch(item)
+        except Exception as e:
+            error = e
+            continue
+        if isinstance(result, GeneratorType):
+            stack.append(result)
+            value = None
+        else:
+            value = result
+    return value
+
 
 class Node(object):
+    # Nodes have slots rather than a __dict__ each, the big trees are mostly nodes.
+    # Every subclass lists the attributes it sets
+    __slots__ = ('line_number', 'merkle')
+
     def children(self):
         pass
     attr_names = ()
@@ -9,7 +175,20 @@ class Node(object):
     def setLineNumber(self, line_number):
         self.line_number = line_number
 
+    def structural_hash(self) -> bytes:
+        """
+        Merkle hash of the subtree: equal code hashes the same wherever it is, as
+        line numbers are left out, and comparing two subtrees is comparing two
+        hashes. The first call hashes the whole subtree in one pass and keeps the
+        hash of every node, which pickling keeps too. A tree must not be changed
+        once hashed
+        """
+        return walk(merkle_step, self)
+
     def generate_xml(self, parent=None):
+        return walk(lambda item: item[0].xml_element(item[1]), (self, parent))
+
+    def xml_element(self, parent):
         if parent is None:
             xml_tree = ET.Element(self.__class__.__name__)
         else:
@@ -22,15 +201,79 @@ class Node(object):
                 xml_tree.attrib[attr[0]] = str(attr[1])
 
         for (child_name, child) in self.children():
-            child_tree = child.generate_xml(xml_tree)
+            yield (child, xml_tree)
         return xml_tree
 
 
 
-class NodeVisitor(object):
+class DispatchTable(dict):
+    """ Node class -> handler of a pass class, each handler is looked up on first use """
+    def __init__(self, visitor_class):
+        self.visitor_class = visitor_class
+
+    def __missing__(self, node_class):
+        cls = self.visitor_class
+        handler = getattr(cls, cls.prefix + node_class.__name__, None) or cls.generic_visit
+        self[node_class] = handler
+        return handler
+
+
+class Visitor(object):
+    """
+    Base of the passes over the AST. A pass names its handlers prefix + node class
+    name, e.g. wat_BinOp, and dispatch(node) runs the one for node under walk().
+    Handlers are looked up once per node class and kept in the dispatch table of
+    the pass class, so they are resolved on the class and not per instance. Node
+    classes without a handler go to generic_visit.
+
+    Hooks called with every node before its handler, and once the handler and
+    the visits it asked for are done, are meant for instrumentation:
+    add_hooks(pre=lambda node: ..., post=lambda node, result: ...)
+    """
+    prefix = 'visit_'
+    pre_hooks = ()
+    post_hooks = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.handlers = DispatchTable(cls)
+
+    def dispatch(self, node):
+        return self.handlers[node.__class__](self, node)
+
+    def hooked_dispatch(self, node):
+        for hook in self.pre_hooks:
+            hook(node)
+        result = type(self).dispatch(self, node)
+        if isinstance(result, GeneratorType):
+            result = yield result
+        for hook in self.post_hooks:
+            hook(node, result)
+        return result
+
+    def add_hooks(self, pre=None, post=None):
+        if pre is not None:
+            self.pre_hooks = self.pre_hooks + (pre,)
+        if post is not None:
+            self.post_hooks = self.post_hooks + (post,)
+        # Passes without hooks never pay for them
+        self.dispatch = self.hooked_dispatch
+
+    def generic_visit(self, node, *args):
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {self.prefix + type(node).__name__!r}")
+
+
+Visitor.handlers = DispatchTable(Visitor)
+
+
+class NodeVisitor(Visitor):
+    # The walk goes over (node, offset) pairs, those are what the hooks get
     def visit(self, node, offset=0):
-        method = 'visit_' + node.__class__.__name__
-        return getattr(self, method, self.generic_visit)(node, offset)
+        return walk(self.dispatch, (node, offset))
+
+    def dispatch(self, item):
+        node, offset = item
+        return self.handlers[node.__class__](self, node, offset)
 
     def generic_visit(self, node, offset=0):
         lead = ' ' * offset
@@ -45,10 +288,12 @@ class NodeVisitor(object):
             print(output)
 
             for (child_name, child) in node.children():
-                self.visit(child, offset=offset + 2)
+                yield (child, offset + 2)
 
 
 class Formal(Node):
+    __slots__ = ('name', 'type', 'coord')
+
     def __init__(self, name, type, coord=None):
         self.name = name
         self.type = type
@@ -64,6 +309,8 @@ class Formal(Node):
 
 
 class Program(Node):
+    __slots__ = ('funcs',)
+
     def __init__(self, funcs, coord=None):
         #create print function
         p_ret = Type("int")
@@ -84,6 +331,8 @@ class Program(Node):
     attr_names = ()
 
 class ForStmt(Node):
+    __slots__ = ('expr1', 'expr2', 'expr3', 'body', 'coord')
+
     def __init__(self, expr1, expr2, expr3, body, coord=None):
         self.expr1 = expr1
         self.expr2 = expr2
@@ -106,6 +355,8 @@ class ForStmt(Node):
     attr_names = ()
 
 class WhileStmt(Node):
+    __slots__ = ('cond', 'body', 'coord')
+
     def __init__(self, cond, body, coord=None):
         self.cond = cond
         self.body = body
@@ -122,6 +373,8 @@ class WhileStmt(Node):
     attr_names = ()
 
 class IfStmt(Node):
+    __slots__ = ('cond', 'true_body', 'false_body')
+
     def __init__(self, cond, true_body, false_body=None, coord=None):
         self.cond = cond
         self.true_body = true_body
@@ -140,6 +393,8 @@ class IfStmt(Node):
     attr_names = ()
 
 class AssignmentStmt(Node):
+    __slots__ = ('op', 'name', 'expr', 'coord', 'number_of_dereferences', 'place_of_assignment', 'is_ptr')
+
     def __init__(self, name, op, expr, number_of_dereferences=0, is_ptr = False, coord=None, place_of_assignment=None):
         self.op = op
         self.name = name
@@ -158,6 +413,8 @@ class AssignmentStmt(Node):
     attr_names = ('op', 'name', 'number_of_dereferences', 'place_of_assignment')
 
 class RetStmt(Node):
+    __slots__ = ('expr', 'coord')
+
     def __init__(self, expr, coord=None):
         self.expr = expr
         self.coord = coord
@@ -171,6 +428,7 @@ class RetStmt(Node):
     attr_names = ()
 
 class BreakStmt(Node):
+    __slots__ = ()
 
     def children(self):
         nodelist = []
@@ -179,6 +437,7 @@ class BreakStmt(Node):
     attr_names = ()
 
 class ContinueStmt(Node):
+    __slots__ = ()
 
     def children(self):
         nodelist = []
@@ -187,6 +446,8 @@ class ContinueStmt(Node):
     attr_names = ()
 
 class ParamList(Node):
+    __slots__ = ('params', 'coord')
+
     def __init__(self, params, coord=None):
         self.params = params
         self.coord = coord
@@ -200,6 +461,8 @@ class ParamList(Node):
     attr_names = ()
 
 class FuncDec(Node):
+    __slots__ = ('name', 'ret_type', 'params', 'body', 'coord')
+
     def __init__(self, ret_type, name, params, body, coord=None):
         self.name = name
         self.ret_type = ret_type
@@ -220,6 +483,8 @@ class FuncDec(Node):
     attr_names = ('name', )
 
 class DeclStmt(Node):
+    __slots__ = ('name', 'type', 'expr', 'is_ptr', 'num_dereferences')
+
     def __init__(self, name, type, expr=None, number_of_dereferences=0, is_ptr=False, coord=None, place_of_assignment=None):
         self.name = name
         self.type = type
@@ -238,6 +503,8 @@ class DeclStmt(Node):
     attr_names = ('name', )
 
 class ArrayExpr(Node):
+    __slots__ = ('name', 'type', 'array_len', 'expr')
+
     def __init__(self, name, type, array_len=None, expr=None):
         self.name = name
         self.type = type
@@ -255,6 +522,8 @@ class ArrayExpr(Node):
     attr_names = ('name', 'array_len', )
 
 class StmtList(Node):
+    __slots__ = ('stmt_lst',)
+
     def __init__(self, stmt_lst, coord=None):
         self.stmt_lst = stmt_lst
 
@@ -267,6 +536,8 @@ class StmtList(Node):
     attr_names = ()
 
 class PointerLst(Node):
+    __slots__ = ('amount_of_pointers',)
+
     def __init__(self, amount_of_pointers, coord=None):
         self.amount_of_pointers = amount_of_pointers
 
@@ -276,6 +547,8 @@ class PointerLst(Node):
     attr_names = ()
 
 class FuncCall(Node):
+    __slots__ = ('name', 'params', 'coord')
+
     def __init__(self, name, params, coord=None):
         self.name = name
         self.params = params
@@ -294,6 +567,8 @@ class FuncCall(Node):
 
 # Checked done
 class UnaryOp(Node):
+    __slots__ = ('op', 'expr', 'coord')
+
     def __init__(self, op, expr, coord=None):
         self.op = op
         self.expr = expr
@@ -309,6 +584,8 @@ class UnaryOp(Node):
 
 # Checked done
 class BinOp(Node):
+    __slots__ = ('op', 'left', 'right', 'coord')
+
     def __init__(self, op, left, right, coord=None):
         self.op = op
         self.left = left
@@ -327,25 +604,35 @@ class BinOp(Node):
 
 # Checked done
 class Type(Node):
-    def __init__(self, name, number_of_pointers=0, coord=None):
-        self.name = name
-        self.coord = coord
-        self.number_of_pointers = number_of_pointers
+    """
+    Types are interned: Type(name, number_of_pointers) always gives back the same
+    instance for the same arguments, so every declaration shares it and comparing
+    two types is an identity check. Interned types cannot be changed
+    """
+    __slots__ = ('name', 'number_of_pointers')
+    interned = {}
+
+    def __new__(cls, name, number_of_pointers=0, coord=None):
+        # No coord is kept, a shared type has no position of its own
+        key = (name, number_of_pointers or 0)
+        self = cls.interned.get(key)
+        if self is None:
+            self = object.__new__(cls)
+            object.__setattr__(self, 'name', key[0])
+            object.__setattr__(self, 'number_of_pointers', key[1])
+            cls.interned[key] = self
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Type {self} is interned and cannot be changed")
+
+    def __reduce__(self):
+        # Unpickled types are looked up in the table like any other
+        return Type, (self.name, self.number_of_pointers)
 
     def get_new_type(self, add_pointers):
         return Type(self.name, self.number_of_pointers+add_pointers)
 
-    def __eq__(self, other):
-        if not self.number_of_pointers:
-            self.number_of_pointers = 0 
-
-        if not self.number_of_pointers:
-            self.number_of_pointers = 0 
-
-        if not isinstance(other, Type):
-            return False
-        return (self.name == other.name) and (self.number_of_pointers == other.number_of_pointers)
-
     def children(self):
         nodelist = []
         return tuple(nodelist)
@@ -357,6 +644,8 @@ class Type(Node):
 
 # Checked done
 class Constant(Node):
+    __slots__ = ('type', 'value', 'coord')
+
     def __init__(self, type, value, coord=None):
         self.type = type
         self.value = value
@@ -0,0 +1,101 @@
+# Parsing of large programs in a pool of worker processes. A program is nothing
+# but a list of functions, so the preprocessed source is cut after the closing
+# brace of every top level function and the pieces are parsed independently.
+# Each piece is lexed starting from the line it begins on, so the FuncDec lists
+# coming back only have to be concatenated.
+
+import contextlib
+import gc
+import io
+import multiprocessing
+import re
+
+import minic_ast as ast
+
+BRACE_REG = re.compile(r'[{}]')
+# Functions such as printInt every Program starts with
+N_BUILTINS = len(ast.Program([]).funcs)
+
+# Parser of the worker process, built once by init_worker
+worker_parser = None
+
+
+def split_functions(data: str) -> list[tuple[int, str]]:
+    """
+    Cut data after every brace closing a top level function. Returns the pieces
+    along with the line number each one starts on
+    """
+    chunks = []
+    depth = 0
+    start = 0
+    lineno = 1
+    for m in BRACE_REG.finditer(data):
+        if m.group() == '{':
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            chunks.append((lineno, data[start:m.end()]))
+            lineno += data.count('\n', start, m.end())
+            start = m.end()
+    # Whatever follows the last function is left for the parser to complain about
+    if start < len(data) and not data[start:].isspace():
+        if chunks:
+            chunks[-1] = (chunks[-1][0], chunks[-1][1] + data[start:])
+        else:
+            chunks.append((lineno, data[start:]))
+    return chunks
+
+
+def init_worker(lexer_backend: str, engine: str, cache_dir: str):
+    global worker_parser
+    # Workers only build trees and send them back, see ast.paused_gc
+    gc.disable()
+    # Imported here so importing this module does not pull in the whole front end
+    from lexer import minic_lexer
+    from parser import minic_parser
+    from scanner import minic_scanner
+    lexer = minic_scanner() if lexer_backend == 'scanner' else minic_lexer()
+    lexer.build_cached(cache_dir=cache_dir)
+    worker_parser = minic_parser()
+    worker_parser.build(lexer=lexer, cache_dir=cache_dir, engine=engine)
+
+
+def parse_chunks(chunks: list[tuple[int, str]]):
+    """
+    Parse the given pieces in the worker. Returns the FuncDecs found, or None on a
+    syntax error, along with whatever the lexer and parser printed
+    """
+    funcs = []
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        for lineno, data in chunks:
+            root = worker_parser.parse(data, lineno=lineno)
+            if root is None:
+                return None, out.getvalue()
+            funcs += root.funcs[N_BUILTINS:]
+    return funcs, out.getvalue()
+
+
+def parse_parallel(data: str, jobs: int, lexer_backend: str = 'ply', engine: str = 'yacc', cache_dir: str = None):
+    """
+    Parse data in jobs worker processes, giving the same ast.Program as parsing it
+    in one go. Returns None if any function has a syntax error
+    """
+    chunks = split_functions(data)
+    if not chunks:
+        chunks = [(1, data)]
+    # A few batches per worker keeps them all busy without paying for one message per function
+    n_batches = min(len(chunks), jobs * 4)
+    size = -(-len(chunks) // n_batches)
+    batches = [chunks[i:i + size] for i in range(0, len(chunks), size)]
+
+    # The trees are unpickled as the results come in
+    with multiprocessing.Pool(jobs, initializer=init_worker, initargs=(lexer_backend, engine, cache_dir)) as pool, \
+            ast.paused_gc():
+        funcs = []
+        for batch_funcs, output in pool.imap(parse_chunks, batches):
+            print(output, end='')
+            if batch_funcs is None:
+                return None
+            funcs += batch_funcs
+    return ast.Program(funcs)
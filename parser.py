@@ -1,9 +1,23 @@
 #!/usr/bin/env python3
 
+from functools import partial
+
 from ply import yacc
 from lexer import minic_lexer
 from lexer import tokens
 import minic_ast as ast
+from cache import load_table, table_name, TableWriter
+
+
+class TokenReplay(object):
+    """ Lexer handing out an already scanned token list, so it is parsed without lexing again """
+    def __init__(self, tokens):
+        self.lineno = 1
+        self.tokens = tokens
+        self.input(None)
+
+    def input(self, data):
+        self.token = partial(next, iter(self.tokens), None)
 
 
 class minic_parser():
@@ -27,15 +41,18 @@ class minic_parser():
         """
         p[0] = ast.Program(p[1])
 
+    # Lists are left recursive and appended to in place, so each element costs
+    # O(1) and the parser stack stays flat no matter how long the list is
     def p_func_lst(self, p):
         """
-        func_dec_lst : func_dec
-                     | func_dec func_dec_lst
+        func_dec_lst : func_dec_lst func_dec
+                     | func_dec
         """
         if (len(p) == 2):
-            p[0] = p[1]
+            p[0] = [p[1]]
         else:
-            p[0] = p[1] + p[2]
+            p[1].append(p[2])
+            p[0] = p[1]
 
     def p_func_dec(self, p):
         """
@@ -43,7 +60,7 @@ class minic_parser():
         """
         fDec = ast.FuncDec(p[1], p[2], p[3], p[4])
         fDec.setLineNumber(p.lineno(1))
-        p[0] = [fDec]
+        p[0] = fDec
 
     #
     #		Formals / Parameters
@@ -72,7 +89,8 @@ class minic_parser():
         if len(p) == 2:
             p[0] = [p[1]]
         else:
-            p[0] = p[1] + [p[3]]
+            p[1].append(p[3])
+            p[0] = p[1]
 
     def p_formal(self, p):
         """
@@ -105,7 +123,8 @@ class minic_parser():
         if len(p) == 2:
             p[0] = [p[1]]
         else:
-            p[0] = p[1] + [p[2]]
+            p[1].append(p[2])
+            p[0] = p[1]
 
     def p_statement(self, p):
         """
@@ -189,13 +208,14 @@ class minic_parser():
 
     def p_param_list(self, p):
         """
-        param_list : expr
-                    | expr COMMA param_list
+        param_list : param_list COMMA expr
+                   | expr
         """
         if len(p)==2:
-            p[0] = [p[1]] 
+            p[0] = [p[1]]
         else:
-            p[0] = [p[1]] + p[3]
+            p[1].append(p[3])
+            p[0] = p[1]
 
     def p_assignment_expr(self, p):
         """
@@ -377,14 +397,40 @@ class minic_parser():
         print(f"Syntax error in input for {p}")
 
 
-    def build(self, **kwargs):
+    # An already built minic_lexer can be shared with the parser instead of building
+    # a second one. With a cache directory the LALR tables are only generated when
+    # lexer.py/parser.py changed, otherwise they are loaded from the cache.
+    # engine='descent' swaps yacc for the hand written parser in descent.py, which
+    # builds the same trees and needs no tables at all
+    def build(self, lexer=None, cache_dir=None, engine='yacc', **kwargs):
         self.tokens = tokens
-        self.lexer = minic_lexer()
-        self.lexer.build()
-        self.parser = yacc.yacc(module=self, **kwargs)
+        if lexer is None:
+            lexer = minic_lexer()
+            lexer.build_cached(cache_dir=cache_dir)
+        self.lexer = lexer
+        if engine == 'descent':
+            # Imported here since descent.py reads the precedence table of this module
+            from descent import DescentParser
+            self.parser = DescentParser(lexer.lexer)
+            return
+        if cache_dir is None:
+            self.parser = yacc.yacc(module=self, **kwargs)
+            return
+
+        tabmodule = load_table(cache_dir, table_name('parsetab'))
+        if not isinstance(tabmodule, str):
+            self.parser = yacc.yacc(module=self, tabmodule=tabmodule, debug=False, write_tables=False, **kwargs)
+        else:
+            with TableWriter(cache_dir) as outputdir:
+                self.parser = yacc.yacc(module=self, tabmodule=tabmodule, outputdir=outputdir, debug=False, **kwargs)
+
+    # lineno is the line s starts on, for parsing a piece of a bigger source
+    def parse(self, s, lineno=1):
+        self.lexer.lexer.lineno = lineno
+        return self.parser.parse(s, lexer=self.lexer.lexer)
 
-    def parse(self, s):
-        return self.parser.parse(s)
+    def parse_tokens(self, tokens):
+        return self.parser.parse(None, lexer=TokenReplay(tokens))
 
     def prompt(self):
         while True:
@@ -394,16 +440,16 @@ class minic_parser():
                 break
             if not s:
                 continue
-            result = self.parser.parse(s)
+            result = self.parse(s)
             print(result)
 
     def test(self, data):
-        result = self.parser.parse(data)
+        result = self.parse(data)
         visitor = ast.NodeVisitor()
         visitor.visit(result)
 
     def generate_xml(self, data):
-        result = self.parser.parse(data)
+        result = self.parse(data)
         return result.generate_xml()
 
 
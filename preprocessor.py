@@ -1,89 +1,364 @@
+import hashlib
+import math
+import mmap
+import operator
 import re
 
 
-define_reg = re.compile("^\s*#define (\w+) (\w+)\s*$")
+define_reg = re.compile("^\s*#define (\w+)(?: (\w+))?\s*$")
 include_reg = re.compile('^\s*#include "(\w+\.c)"\s*$')
 comment_reg = re.compile("(.*)\/\/(.*)")
 mainfunc_reg = re.compile("int(\s+)main")
 hashtag_reg = re.compile("#")
+# Conditional directives, along with their condition minus any trailing comment
+conditional_reg = re.compile(r"^\s*#\s*(ifdef|ifndef|if|elif|else|endif)\b\s*(.*?)\s*(?://.*)?$")
+condition_token_reg = re.compile(r"\w+|&&|\|\||[=!<>]=|\S")
+# Binary operators of #if conditions: precedence and how they evaluate, as in C
+CONDITION_OPS = {
+    '||': (1, lambda a, b: int(bool(a or b))),
+    '&&': (2, lambda a, b: int(bool(a and b))),
+    '==': (3, operator.eq), '!=': (3, operator.ne),
+    '<': (4, operator.lt), '<=': (4, operator.le), '>': (4, operator.gt), '>=': (4, operator.ge),
+    '+': (5, operator.add), '-': (5, operator.sub),
+    '*': (6, operator.mul), '/': (6, lambda a, b: (abs(a) // abs(b)) * (-1 if (a < 0) != (b < 0) else 1)), '%': (6, lambda a, b: int(math.fmod(a, b))),
+}
+# Every word of a line, string and character literals are matched whole so the
+# words inside them are never expanded
+word_reg = re.compile(r'"[^"]*"|\'[^\']*\'|\w+')
 
-defined = {}
-
-def process_line(line: str) -> str:
-    for de in defined:
-        reg = defined[de][0]
-        res = reg.match(line)
-        if not res:
-           continue
-
-        groups = res.groups() 
-        line = groups[0] + defined[de][1] + groups[2] 
-    return line
-
-def process_file(cfiles: dict, name:str) -> list[str]:
-    r = []
-    state = 0
-    try:
-        for line in cfiles[name]:
-            if line.isspace() or line == "":
-                continue
-
-            include_res = include_reg.match(line)
-            define_res = define_reg.match(line)
-            comment_res = comment_reg.match(line)
-            hashtag_res = hashtag_reg.match(line)
-
-            if include_res:
-                if(state!=0):
-                    raise Exception("Include")
-
-                included_file = include_res.groups()[0]
-                r += process_file(cfiles, included_file) 
-
-            elif define_res:
-                if state == 2:
-                    raise Exception("Define")
-
-                if state == 0:
-                    state = 1
-
-                if define_res.groups()[0] in defined:
-                    raise Exception("Double define")
-
-                custom_reg = re.compile("(.*)(" + define_res.groups()[0] + ")(.*)")
-                defined[define_res.groups()[0]] = (custom_reg, define_res.groups()[1])
-            
-            elif hashtag_res:
-                raise Exception("Header tag in wrong format")
-
-            elif comment_res:
-                if comment_res.groups()[0].isspace() or comment_res.groups()[0] == "":
-                    continue
+# Expanded files shared by every compile in the process, see Preprocessor.include
+expanded_cache = {}
+EXPANDED_CACHE_SIZE = 256
+# Files expanding to more lines than this are streamed without being cached
+EXPANDED_CACHE_LINES = 10000
+
+
+class MappedFile(object):
+    """
+    Lines of a source file without their newlines, read through a memory map so
+    the file is never loaded as a whole. Can be iterated over any number of times
+    until it is closed, e.g. by using it as a context manager.
+    """
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            # An empty file cannot be mapped
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else b''
+
+    def __iter__(self):
+        data = self.data
+        start = 0
+        end = len(data)
+        while start < end:
+            newline = data.find(b'\n', start)
+            if newline == -1:
+                newline = end
+            line = data[start:newline]
+            if line.endswith(b'\r'):
+                line = line[:-1]
+            yield line.decode()
+            start = newline + 1
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Preprocessor(object):
+    """
+    Everything one compile's preprocessing needs: the macros defined so far and
+    the files already included. Nothing is kept in the module, apart from the
+    cache of expanded files, so the same process can preprocess again and again.
+    """
+    def __init__(self, cfiles: dict, defines: dict = None, report=print):
+        self.cfiles = cfiles
+        # Called with every error message
+        self.report = report
+        # Macro name -> replacement, starting with the ones given on the command line
+        self.defined = dict(defines or {})
+        # Files included so far, in order, each file is only included once
+        self.included = {}
+        # Chain of files currently being included, to detect cycles
+        self.stack = []
+        self.errors = 0
+        self.hashes = {}
+        self.includes = {}
+
+    def expand_word(self, m: re.Match) -> str:
+        word = m.group()
+        defined = self.defined
+        value = defined.get(word)
+        if value is None:
+            return word
+        # A replacement naming another macro is expanded again, but a macro never
+        # expands into itself
+        seen = {word}
+        while value in defined and value not in seen:
+            seen.add(value)
+            value = defined[value]
+        return value
 
-                if state != 2:
-                    state = 2
+    def evaluate(self, condition: str) -> int:
+        """
+        Value of an #if/#elif condition: integers, macros, defined(NAME), the C
+        arithmetic, comparison and logical operators and parentheses. Names that
+        are not macros count as 0, like in C
+        """
+        tokens = condition_token_reg.findall(condition) + ['']
+        pos = 0
 
-                r += [process_line(comment_res.groups()[0])]
+        def take():
+            nonlocal pos
+            pos += 1
+            return tokens[pos - 1]
+
+        # live is False in operands a && or || skips, they are parsed but never
+        # evaluated, e.g. the division by zero of 0 && 1/0
+        def operand(live):
+            tok = take()
+            if tok == '!':
+                return int(not operand(live))
+            if tok == '-':
+                return -operand(live)
+            if tok == '(':
+                value = binary(1, live)
+                if take() != ')':
+                    raise Exception(f"Missing ) in condition {condition}")
+                return value
+            if tok == 'defined':
+                parens = tokens[pos] == '('
+                if parens:
+                    take()
+                value = int(take() in self.defined)
+                if parens and take() != ')':
+                    raise Exception(f"Missing ) in condition {condition}")
+                return value
+            if tok.isdigit():
+                return int(tok)
+            if tok[:1].isalpha() or tok[:1] == '_':
+                value = word_reg.sub(self.expand_word, tok)
+                return int(value) if value.isdigit() else 0
+            raise Exception(f"Invalid condition {condition}")
+
+        def binary(level, live):
+            left = operand(live)
+            while tokens[pos] in CONDITION_OPS and CONDITION_OPS[tokens[pos]][0] >= level:
+                op_name = take()
+                op_level, op = CONDITION_OPS[op_name]
+                decided = (op_name == '&&' and not left) or (op_name == '||' and left)
+                right = binary(op_level + 1, live and not decided)
+                if live:
+                    left = int(bool(left)) if decided else int(op(left, right))
+            return left
+
+        value = binary(1, True)
+        if tokens[pos]:
+            raise Exception(f"Invalid condition {condition}")
+        return value
+
+    def conditional(self, conditions: list, directive: str, condition: str):
+        """
+        Apply a conditional directive to the stack of open #if blocks of a file. Each
+        block is [taking lines now, a branch was taken, enclosing block active, #else seen]
+        """
+        match directive:
+            case 'ifdef' | 'ifndef' | 'if':
+                enclosing = not conditions or conditions[-1][0]
+                take = False
+                if enclosing and directive == 'if':
+                    take = bool(self.evaluate(condition))
+                elif enclosing:
+                    take = (condition in self.defined) == (directive == 'ifdef')
+                conditions.append([take, take, enclosing, False])
+            case 'elif' | 'else':
+                if not conditions:
+                    raise Exception(f"#{directive} without #if")
+                block = conditions[-1]
+                if block[3]:
+                    raise Exception(f"#{directive} after #else")
+                block[0] = block[2] and not block[1] and (directive == 'else' or bool(self.evaluate(condition)))
+                block[1] = block[1] or block[0]
+                block[3] = directive == 'else'
+            case 'endif':
+                if not conditions:
+                    raise Exception("#endif without #if")
+                conditions.pop()
+
+    def process_line(self, line: str) -> str:
+        # One pass over the line with a dict lookup per word, however many macros there are
+        if not self.defined:
+            return line
+        return word_reg.sub(self.expand_word, line)
+
+    #
+    #	Include graph
+    #
+    def file_includes(self, name: str) -> list[str]:
+        """ Files name includes directly """
+        if name not in self.includes:
+            self.includes[name] = [m.groups()[0] for m in map(include_reg.match, self.cfiles[name]) if m]
+        return self.includes[name]
+
+    def file_hash(self, name: str) -> str:
+        if name not in self.hashes:
+            lines = self.cfiles[name]
+            if isinstance(lines, MappedFile):
+                self.hashes[name] = hashlib.sha1(lines.data).hexdigest()
             else:
-                if state != 2:
-                    state = 2
-                r += [process_line(line)]
-    except KeyError as e:
-        print(f'Error: Missing file {e} as one of the input files')
-    except Exception as e:
-        print(f'Error: {e}')
-    return r
+                self.hashes[name] = hashlib.sha1('\n'.join(lines).encode()).hexdigest()
+        return self.hashes[name]
+
+    def cache_key(self, name: str):
+        """
+        What the expansion of name depends on: the contents of the file and of
+        everything it includes, the macros defined before it and which of its
+        includes were already included elsewhere
+        """
+        closure = []
+        todo = [name]
+        while todo:
+            f = todo.pop()
+            if f not in closure and f in self.cfiles:
+                closure.append(f)
+                todo += self.file_includes(f)
+        return (tuple((f, self.file_hash(f)) for f in sorted(closure)),
+                frozenset(self.defined.items()),
+                frozenset(f for f in closure if f in self.included))
+
+    def include(self, name: str):
+        """
+        Generator over the lines name expands to. A file is only expanded once per
+        compile, and the result is kept in expanded_cache so later compiles seeing
+        the same inputs get it without expanding again
+        """
+        if name in self.stack:
+            raise Exception("Include cycle " + " -> ".join(self.stack[self.stack.index(name):] + [name]))
+        if name in self.included:
+            return
+        if name not in self.cfiles:
+            self.errors += 1
+            self.report(f'Error: Missing file {name!r} as one of the input files')
+            return
+
+        key = self.cache_key(name)
+        if key in expanded_cache:
+            lines, defines, files = expanded_cache[key]
+            self.defined.update(defines)
+            self.included.update(files)
+            yield from lines
+            return
+
+        n_defined = len(self.defined)
+        n_included = len(self.included)
+        errors = self.errors
+        self.included[name] = None
+        self.stack.append(name)
+        # The lines are kept for the cache as they go by, unless there are too many
+        lines = []
+        try:
+            for line in self.process_file(name):
+                if lines is not None:
+                    lines.append(line)
+                    if len(lines) > EXPANDED_CACHE_LINES:
+                        lines = None
+                yield line
+        finally:
+            self.stack.pop()
+
+        # Only expansions that went through without errors are worth reusing
+        if lines is not None and self.errors == errors:
+            if len(expanded_cache) >= EXPANDED_CACHE_SIZE:
+                del expanded_cache[next(iter(expanded_cache))]
+            expanded_cache[key] = (lines, list(self.defined.items())[n_defined:],
+                                   list(self.included.items())[n_included:])
+
+    def process_file(self, name: str):
+        state = 0
+        # Open #if blocks, lines are only taken while the innermost one is active
+        conditions = []
+        try:
+            for line in self.cfiles[name]:
+                if line.isspace() or line == "":
+                    continue
+
+                # Skipped lines only matter if they are conditional directives
+                if conditions and not conditions[-1][0] and '#' not in line:
+                    continue
+                conditional_res = conditional_reg.match(line)
+                if conditional_res:
+                    self.conditional(conditions, *conditional_res.groups())
+                    continue
+                if conditions and not conditions[-1][0]:
+                    continue
+
+                include_res = include_reg.match(line)
+                define_res = define_reg.match(line)
+                comment_res = comment_reg.match(line)
+                hashtag_res = hashtag_reg.match(line)
+
+                if include_res:
+                    if(state!=0):
+                        raise Exception("Include")
+
+                    included_file = include_res.groups()[0]
+                    yield from self.include(included_file)
+
+                elif define_res:
+                    if state == 2:
+                        raise Exception("Define")
+
+                    if state == 0:
+                        state = 1
+
+                    if define_res.groups()[0] in self.defined:
+                        raise Exception("Double define")
+
+                    self.defined[define_res.groups()[0]] = define_res.groups()[1] or ''
+
+                elif hashtag_res:
+                    raise Exception("Header tag in wrong format")
+
+                elif comment_res:
+                    if comment_res.groups()[0].isspace() or comment_res.groups()[0] == "":
+                        continue
+
+                    if state != 2:
+                        state = 2
+
+                    yield self.process_line(comment_res.groups()[0])
+                else:
+                    if state != 2:
+                        state = 2
+                    yield self.process_line(line)
+            if conditions:
+                raise Exception("Missing #endif")
+        except Exception as e:
+            self.errors += 1
+            self.report(f'Error: {e}')
 
+    def run(self):
+        """ Generator over the preprocessed lines, the input files are checked right away """
+        files_with_main = []
+        for f in self.cfiles:
+            for line in self.cfiles[f]:
+                if mainfunc_reg.match(line):
+                    files_with_main.append(f)
 
-def preprocessor(cfiles: dict) -> list[str]:
-    files_with_main = []
-    for f in cfiles:
-        for line in cfiles[f]:
-            if mainfunc_reg.match(line):
-                files_with_main.append(f)
+        if len(set(files_with_main)) != 1:
+            raise Exception("Wrong number of main files")
 
-    if len(set(files_with_main)) != 1:
-        raise Exception("Wrong number of main files")
+        return self.include(files_with_main[0])
 
-    return process_file(cfiles, files_with_main[0])
 
+def preprocessor(cfiles: dict, defines: dict = None, report=print):
+    """
+    Generator over the preprocessed lines of cfiles, a dict of file name -> lines
+    of the file (a list or a MappedFile). defines are macros defined up front,
+    e.g. with watc -D. Errors are printed, or handed to report instead
+    """
+    return Preprocessor(cfiles, defines, report).run()
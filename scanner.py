@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Hand written alternative to the PLY lexer. The input is scanned in a single
+# pass over one regex with a group per kind of token, without PLY's per token
+# function calls and LexToken objects.
+
+import argparse
+import re
+from functools import partial
+from itertools import islice
+from operator import itemgetter
+from lexer import minic_lexer, tokens, reserved
+
+# One alternative per kind of token, each match also eats the blanks before it:
+#   1 identifier or keyword, 2 operator/punctuation (two character ones first),
+#   3 number, 4 newlines, 5 text or character literal, 6 illegal character.
+# Blanks are never illegal, those ending the input match nothing and are skipped
+SCAN_REG = re.compile(r"""[ \t]*(?:
+    ([a-zA-Z_][a-zA-Z_0-9]*)
+   |([-+*/%=!<>]=|\+\+|--|&&|\|\||[-+*/%=!<>&,;(){}\[\]])
+   |([0-9]+)
+   |(\n+)
+   |("\w+"|'\w')
+   |([^ \t]))""", re.VERBOSE | re.DOTALL)
+
+# Operator text to token type, taken from the plain string rules of minic_lexer
+OPERATORS = {re.sub(r'\\(.)', r'\1', value): name[2:] for name, value in vars(minic_lexer).items()
+             if name.startswith('t_') and name not in ('t_ignore', 't_TEXT', 't_CHARACTER')
+             and isinstance(value, str)}
+
+
+class Token(tuple):
+    """
+    Stand in for PLY's LexToken, a plain tuple of (type, value, lineno, lexpos)
+    so creating one costs no Python call. Printed the same way as LexToken.
+    """
+    __slots__ = ()
+    type = property(itemgetter(0))
+    value = property(itemgetter(1))
+    lineno = property(itemgetter(2))
+    lexpos = property(itemgetter(3))
+    lexer = None
+
+    def __str__(self):
+        return 'LexToken(%s,%r,%d,%d)' % self
+
+    def __repr__(self):
+        return str(self)
+
+
+# Lines scanned at once by scan_lines
+CHUNK_LINES = 1024
+
+
+def scan(data: str, lineno: int = 1, lexpos: int = 0):
+    """
+    Generator over the tokens of data, yielding the types listed in lexer.tokens.
+    lexpos is the position of data in the whole input
+    """
+    new = tuple.__new__
+    keyword = reserved.get
+    operators = OPERATORS
+    for m in SCAN_REG.finditer(data):
+        i = m.lastindex
+        if i == 1:
+            value = m.group(1)
+            yield new(Token, (keyword(value, 'ID'), value, lineno, m.start(1) + lexpos))
+        elif i == 2:
+            value = m.group(2)
+            yield new(Token, (operators[value], value, lineno, m.start(2) + lexpos))
+        elif i == 3:
+            yield new(Token, ('NUMBER', int(m.group(3)), lineno, m.start(3) + lexpos))
+        elif i == 4:
+            lineno += m.end() - m.start(4)
+        elif i == 5:
+            value = m.group(5)
+            yield new(Token, ('TEXT' if value[0] == '"' else 'CHARACTER', value, lineno, m.start(5) + lexpos))
+        else:
+            print("Illegal character '%s'" % m.group(6))
+
+
+def scan_lines(lines, lineno: int = 1):
+    """
+    Same tokens as scan('\\n'.join(lines)), but lines can be any iterable of lines
+    without their newlines and only a chunk of them is held at a time
+    """
+    lines = iter(lines)
+    lexpos = 0
+    while True:
+        chunk = list(islice(lines, CHUNK_LINES))
+        if not chunk:
+            return
+        chunk.append('')
+        data = '\n'.join(chunk)
+        yield from scan(data, lineno, lexpos)
+        lineno += len(chunk) - 1
+        lexpos += len(data)
+
+
+class Scanner(object):
+    """
+    Lexer object with the input()/token()/lineno interface yacc expects, pulling
+    tokens from scan()
+    """
+    def __init__(self):
+        self.lineno = 1
+        self.lexdata = ''
+        self.token = lambda: None
+
+    def input(self, data):
+        # Either the whole source or an iterable of its lines, e.g. the preprocessor
+        if isinstance(data, str):
+            self.lexdata = data
+            self.token = partial(next, scan(data, self.lineno), None)
+        else:
+            self.lexdata = ''
+            self.token = partial(next, scan_lines(data, self.lineno), None)
+
+
+class minic_scanner():
+    # Same interface as minic_lexer, so either can be handed to minic_parser
+    def build(self, **kwargs):
+        self.tokens = tokens
+        self.lexer = Scanner()
+
+    # There are no tables to cache
+    def build_cached(self, cache_dir=None, **kwargs):
+        self.build(**kwargs)
+
+    def test(self, data):
+        self.lexer.lineno = 1
+        self.lexer.input(data)
+        while True:
+            tok = self.lexer.token()
+            if not tok:
+                break
+            print(tok)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Take in the miniC source code and perform lexical analysis.')
+    parser.add_argument('FILE', help="Input file with miniC source code")
+    args = parser.parse_args()
+    try:
+        f = open(args.FILE, 'r')
+        file_data = f.read()
+        f.close()
+        m = minic_scanner()
+        m.build()
+        m.test(file_data)
+    except FileNotFoundError:
+        print("File not found, please provide a valid file")
+        exit(1)
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
-from minic_ast import Type
+from minic_ast import Type, Constant, BinOp, UnaryOp, AssignmentStmt, Visitor, walk
+
+# The nodes expr_type types itself rather than through dispatch
+OPERATOR_NODES = (Constant, BinOp, UnaryOp, AssignmentStmt)
+
+class TypeChecker(Visitor):
+    prefix = 'check_'
 
-class TypeChecker(object):
     def __init__(self, processed_data):
         self.type_errors = []
         self.id_types = {}
         self.funcs = {}
+        self.text_types = {}
         self.program_text = processed_data.split("\n")
     
     def create_type_error(self, line_number, name):
@@ -20,10 +26,15 @@ class TypeChecker(object):
             print(e)
 
     def check(self, node):
-        method = 'check_' + node.__class__.__name__
-        return getattr(self, method)(node)
+        return walk(self.dispatch, node)
 
     def str_to_type(self, txt):
+        # Types are interned, the few type names of a program are parsed once each
+        if txt not in self.text_types:
+            self.text_types[txt] = self.parse_type(txt)
+        return self.text_types[txt]
+
+    def parse_type(self, txt):
         txt = txt.split()
         if len(txt)==1:
             return Type(txt[0])
@@ -49,13 +60,66 @@ class TypeChecker(object):
             for x in node.params.params:
                 self.id_types[x.name] = x.type 
 
-        self.check(node.body)
+        yield node.body
 
-    # nodes that must be checked
+    # nodes that must be checked, expressions are typed as a whole by expr_type
     def check_BinOp(self, node):
-        left_type = self.check(node.left)
-        right_type = self.check(node.right)
+        return self.expr_type(node)
+
+    def check_AssignmentStmt(self, node):
+        return self.expr_type(node)
 
+    def check_UnaryOp(self, node):
+        return self.expr_type(node)
+
+    def expr_type(self, node):
+        """
+        Type of an expression, checking it on the way. The subexpressions are
+        typed off an explicit stack in the order the handlers would visit them,
+        a handler per node and a generator per operator cost more than the check.
+        Hooks are called around each of them as dispatch would have
+        """
+        root = node
+        hooked = self.pre_hooks or self.post_hooks
+        types = []
+        # (node, None) still to visit, or (node, marker) once its operands are typed,
+        # the marker of an assignment holding the type assigned to
+        stack = [(node, None)]
+        while stack:
+            node, left_type = stack.pop()
+            cls = node.__class__
+            if left_type is None and hooked and node is not root and cls in OPERATOR_NODES:
+                for hook in self.pre_hooks:
+                    hook(node)
+            if cls is Constant:
+                types.append(self.check_Constant(node))
+            elif left_type is not None:
+                if cls is BinOp:
+                    right_type = types.pop()
+                    types.append(self.binop_type(node, types.pop(), right_type))
+                elif cls is UnaryOp:
+                    types.append(self.unary_type(node, types.pop()))
+                else:
+                    types.append(self.assignment_type(node, left_type[0], types.pop()))
+            elif cls is BinOp:
+                stack += ((node, True), (node.right, None), (node.left, None))
+                continue
+            elif cls is UnaryOp:
+                stack += ((node, True), (node.expr, None))
+                continue
+            elif cls is AssignmentStmt:
+                stack += ((node, (self.assigned_type(node),)), (node.expr, None))
+                continue
+            else:
+                # dispatch calls the hooks itself
+                types.append(walk(self.dispatch, node))
+                continue
+            if hooked and node is not root:
+                for hook in self.post_hooks:
+                    hook(node, types[-1])
+        return types[0]
+
+    def binop_type(self, node, left_type, right_type):
         if left_type == "TypeError" or right_type == "TypeError":
             return "TypeError"
 
@@ -65,15 +129,15 @@ class TypeChecker(object):
         # types are the same so its fine to just return left_type
         return left_type
 
-    def check_AssignmentStmt(self, node):
+    def assigned_type(self, node):
         left_type = None
         if node.name in self.id_types:
             left_type = self.id_types[node.name]
         if node.number_of_dereferences:
             left_type = left_type.get_new_type(-node.number_of_dereferences)
+        return left_type
 
-        right_type = self.check(node.expr)
-
+    def assignment_type(self, node, left_type, right_type):
         if left_type == "TypeError" or right_type == "TypeError":
             return "TypeError"
 
@@ -84,6 +148,12 @@ class TypeChecker(object):
         # types are the same so its fine to just return left_type
         return left_type
 
+    def unary_type(self, node, t):
+        if node.op == "*":
+            t = t.get_new_type(-1)
+        elif node.op == "&":
+            t = t.get_new_type(1)
+        return t
 
     def check_FuncCall(self, node):
         # check params match
@@ -104,37 +174,29 @@ class TypeChecker(object):
     # nodes whos sub nodes must be checked
     def check_Program(self, node):
         for func in node.funcs:
-            self.check(func)
+            yield func
 
     def check_ForStmt(self, node):
-        self.check(node.expr1)
-        self.check(node.expr2)
-        self.check(node.expr3)
-        self.check(node.body)
+        yield node.expr1
+        yield node.expr2
+        yield node.expr3
+        yield node.body
 
     def check_WhileStmt(self, node):
-        self.check(node.cond)
-        self.check(node.body)
+        yield node.cond
+        yield node.body
 
     def check_IfStmt(self, node):
-        self.check(node.cond)
-        self.check(node.true_body)
+        yield node.cond
+        yield node.true_body
         if node.false_body:
-            self.check(node.false_body)
+            yield node.false_body
 
 
     def check_StmtList(self, node):
         for stmt in node.stmt_lst:
-            self.check(stmt)
+            yield stmt
 
-    def check_UnaryOp(self, node):
-        t = self.check(node.expr)
-        if node.op == "*":
-            t = t.get_new_type(-1)
-        elif node.op == "&":
-            t = t.get_new_type(1)
-        return t
-   
     # ast nodes where it is not possible to have a type error and no sub nodes must be checked for type errors
     def check_Formal(self, node):
         pass
@@ -0,0 +1,212 @@
+"""
+Encodes a wat_ir.Module straight into the wasm binary format, the bytes
+wat2wasm would write for its text, without going through the text or Node.
+Only what the code generator produces is supported: i32 functions, one
+table, one memory, function imports and exports, and the block, loop,
+br/br_if, call, local, memory and i32 arithmetic instructions
+"""
+from wat_ir import Module, Func, Instr, MEMORY_OPCODES, stack_order
+
+MAGIC = b'\0asm'
+VERSION = b'\1\0\0\0'
+
+# Section ids
+TYPE, IMPORT, FUNCTION, TABLE, MEMORY, GLOBAL, EXPORT, START, ELEMENT, CODE = range(1, 11)
+
+VALUE_TYPES = {'i32': 0x7f}
+ELEMENT_TYPES = {'anyfunc': 0x70, 'funcref': 0x70}
+EXTERNAL_KINDS = {'func': 0x00, 'table': 0x01, 'memory': 0x02, 'global': 0x03}
+FUNC_TYPE = 0x60
+EMPTY_BLOCK_TYPE = 0x40
+END = 0x0b
+
+# Instructions with no immediates
+OPCODES = {
+    'drop': 0x1a,
+    'i32.eqz': 0x45, 'i32.eq': 0x46, 'i32.ne': 0x47, 'i32.lt_s': 0x48, 'i32.lt_u': 0x49,
+    'i32.gt_s': 0x4a, 'i32.gt_u': 0x4b, 'i32.le_s': 0x4c, 'i32.le_u': 0x4d, 'i32.ge_s': 0x4e,
+    'i32.ge_u': 0x4f,
+    'i32.add': 0x6a, 'i32.sub': 0x6b, 'i32.mul': 0x6c, 'i32.div_s': 0x6d, 'i32.div_u': 0x6e,
+    'i32.rem_s': 0x6f, 'i32.rem_u': 0x70, 'i32.and': 0x71, 'i32.or': 0x72, 'i32.xor': 0x73,
+    'return': 0x0f,
+}
+BLOCK_OPCODES = {'block': 0x02, 'loop': 0x03}
+BRANCH_OPCODES = {'br': 0x0c, 'br_if': 0x0d}
+LOCAL_OPCODES = {'get_local': 0x20, 'set_local': 0x21, 'tee_local': 0x22,
+                 'local.get': 0x20, 'local.set': 0x21, 'local.tee': 0x22}
+CALL = 0x10
+I32_CONST = 0x41
+# Every instruction that can be encoded, the ones Wat generates
+INSTRUCTIONS = frozenset(OPCODES) | frozenset(BLOCK_OPCODES) | frozenset(BRANCH_OPCODES) \
+    | frozenset(LOCAL_OPCODES) | frozenset(MEMORY_OPCODES) | {'call', 'i32.const'}
+
+
+class EncodeError(Exception):
+    """ The module cannot be encoded, the way wat2wasm would reject its text """
+
+
+def uleb128(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7f
+        n >>= 7
+        if not n:
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+def sleb128(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7f
+        # Python's shift is arithmetic, negative numbers end at -1
+        n >>= 7
+        if (n == 0 and not byte & 0x40) or (n == -1 and byte & 0x40):
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+def name(text: str) -> bytes:
+    data = text.encode()
+    return uleb128(len(data)) + data
+
+
+def vector(items: list) -> bytes:
+    return uleb128(len(items)) + b''.join(items)
+
+
+def section(section_id: int, payload: bytes) -> bytes:
+    return bytes((section_id,)) + uleb128(len(payload)) + payload
+
+
+def i32(value) -> int:
+    """ An i32.const immediate as the signed value it is encoded as """
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise EncodeError(f'invalid i32 constant {value!r}') from None
+    if not -2 ** 31 <= value < 2 ** 32:
+        raise EncodeError(f'constant out of range: {value}')
+    return value - 2 ** 32 if value >= 2 ** 31 else value
+
+
+def func_type(params: list, result: str = None) -> bytes:
+    results = [] if result is None else [result]
+    return bytes((FUNC_TYPE,)) + vector([bytes((VALUE_TYPES[t],)) for t in params]) \
+        + vector([bytes((VALUE_TYPES[t],)) for t in results])
+
+
+class Encoder(object):
+    """ Encodes one module, resolving the names of its functions, locals and labels to indices """
+    def __init__(self, module: Module):
+        self.module = module
+        # Function types in order of first use, as wat2wasm numbers them
+        self.types = {}
+        self.func_indices = {}
+        for index, (_, _, func_name, params) in enumerate(module.imports):
+            self.func_indices.setdefault(func_name, index)
+        for index, func in enumerate(module.funcs, len(module.imports)):
+            self.func_indices.setdefault(func.name, index)
+        self.memory_indices = {memory[0]: index for index, memory in enumerate(module.memories)}
+
+    def type_index(self, signature: bytes) -> int:
+        return self.types.setdefault(signature, len(self.types))
+
+    def encode(self) -> bytes:
+        module = self.module
+        imports = [name(module_name) + name(field) + bytes((EXTERNAL_KINDS['func'],))
+                   + uleb128(self.type_index(func_type(params)))
+                   for module_name, field, _, params in module.imports]
+        funcs = [uleb128(self.type_index(func_type(['i32'] * len(func.params), func.result)))
+                 for func in module.funcs]
+        tables = [bytes((ELEMENT_TYPES[element_type], 0x00)) + uleb128(size)
+                  for size, element_type in module.tables]
+        memories = [bytes((0x00,)) + uleb128(pages) for _, pages in module.memories]
+        exports = [name(export_name) + bytes((EXTERNAL_KINDS[kind],)) + uleb128(self.export_index(kind, ref))
+                   for export_name, kind, ref in module.exports]
+        codes = [self.code(func) for func in module.funcs]
+
+        out = [MAGIC, VERSION]
+        # Empty sections are left out, like wat2wasm does
+        for section_id, items in ((TYPE, list(self.types)), (IMPORT, imports), (FUNCTION, funcs),
+                                  (TABLE, tables), (MEMORY, memories), (EXPORT, exports), (CODE, codes)):
+            if items:
+                out.append(section(section_id, vector(items)))
+        return b''.join(out)
+
+    def export_index(self, kind: str, ref) -> int:
+        indices = self.func_indices if kind == 'func' else self.memory_indices
+        if ref not in indices:
+            raise EncodeError(f'undefined {kind} variable "${ref}"')
+        return indices[ref]
+
+    def code(self, func: Func) -> bytes:
+        local_indices = {}
+        for index, local_name in enumerate(func.params + [local_name for local_name, _ in func.locals]):
+            local_indices.setdefault(local_name, index)
+        # Runs of locals of the same type are declared together
+        groups = []
+        for _, local_type in func.locals:
+            if groups and groups[-1][1] == local_type:
+                groups[-1][0] += 1
+            else:
+                groups.append([1, local_type])
+        body = vector([uleb128(count) + bytes((VALUE_TYPES[local_type],)) for count, local_type in groups])
+        body += self.instructions(func.body, local_indices)
+        return uleb128(len(body)) + body
+
+    def instructions(self, body: list, local_indices: dict) -> bytes:
+        """ The body in stack order, each instruction after its operands """
+        code = bytearray()
+        labels = []
+        for instr, done in stack_order(body):
+            op = instr.op
+            if op in BLOCK_OPCODES:
+                if done:
+                    labels.pop()
+                    code.append(END)
+                else:
+                    code += bytes((BLOCK_OPCODES[op], EMPTY_BLOCK_TYPE))
+                    labels.append(instr.imms[0] if instr.imms else None)
+            elif done:
+                self.instruction(instr, code, labels, local_indices)
+        code.append(END)
+        return bytes(code)
+
+    def instruction(self, instr: Instr, code: bytearray, labels: list, local_indices: dict):
+        op = instr.op
+        if op in OPCODES:
+            code.append(OPCODES[op])
+        elif op == 'i32.const':
+            code.append(I32_CONST)
+            code += sleb128(i32(instr.imms[0]))
+        elif op in LOCAL_OPCODES:
+            if instr.imms[0] not in local_indices:
+                raise EncodeError(f'undefined local variable "${instr.imms[0]}"')
+            code.append(LOCAL_OPCODES[op])
+            code += uleb128(local_indices[instr.imms[0]])
+        elif op in MEMORY_OPCODES:
+            opcode, align = MEMORY_OPCODES[op]
+            offset = instr.imms[0] if instr.imms else 0
+            code.append(opcode)
+            code += uleb128(align) + uleb128(offset)
+        elif op == 'call':
+            if instr.imms[0] not in self.func_indices:
+                raise EncodeError(f'undefined function variable "${instr.imms[0]}"')
+            code.append(CALL)
+            code += uleb128(self.func_indices[instr.imms[0]])
+        elif op in BRANCH_OPCODES:
+            label = instr.imms[0]
+            if label not in labels:
+                raise EncodeError(f'undefined label variable "{label}"')
+            code.append(BRANCH_OPCODES[op])
+            # Depth counted from the innermost enclosing block
+            code += uleb128(labels[::-1].index(label))
+        else:
+            raise EncodeError(f'unexpected instruction "{op}"')
+
+
+def encode(module: Module) -> bytes:
+    return Encoder(module).encode()
@@ -1,10 +1,38 @@
+import sys
 from wat_symbols import SYNTAX, VAR_TEMPLATE, NEGATION
-from minic_ast import DeclStmt, ForStmt, Formal, Constant, FuncCall, IfStmt, StmtList, BinOp, WhileStmt
-import re
-
-class Wat(object):
-    def __init__(self, is_optimized=False):
-        self.wat_lst = []
+from wat_ir import Instr, Func, Module, true_instr, false_instr, head_text, func_text, write_module
+from minic_ast import DeclStmt, ForStmt, Formal, Constant, FuncCall, IfStmt, StmtList, BinOp, WhileStmt, Visitor, walk
+
+def new_variable() -> dict:
+    """ A variable record, with an operator list of its own rather than the template's """
+    variable = dict(VAR_TEMPLATE)
+    variable['op'] = []
+    return variable
+
+
+def first_line(node):
+    """ The first line number found in the subtree of node, None if there is none """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if getattr(node, 'line_number', None):
+            return node.line_number
+        stack += [child for _, child in reversed(node.children() or ())]
+    return None
+
+
+class Wat(Visitor):
+    prefix = 'wat_'
+
+    def __init__(self, is_optimized=False, out=None, flat=False):
+        # What is generated. With out, a file object, the module is written to it as
+        # it is built, each function as soon as it is done, rather than kept whole
+        self.module = Module()
+        self.out = out
+        # Whether the text is written flat rather than folded
+        self.flat = flat
+        # Operand lists of the instructions still open, the innermost last
+        self.open_lists = []
         self.reserved_funcs = ['main', 'printInt', 'print']
 
         # Function dependent
@@ -22,64 +50,87 @@ class Wat(object):
         self.curr_param = 0
         self.var_initializer = 12
         self.local_reg = 0
+        # Instructions of the current function holding offset placeholders
+        self.fixups = []
 
         # Setting to False, to be used for sprint4
         self.is_optimized = is_optimized
         self.in_loop = False
-
-        self.pretty_print = 0
+        # Conditions generated negated, the tree itself is never changed
+        self.negated = set()
+        # MiniC line of the node being generated, and the last one an instruction was tagged with
+        self.line = None
+        self.tagged_line = None
 
     # Main generator
     def generate(self, node):
-        method = 'wat_' + node.__class__.__name__
-        return getattr(self, method)(node)
-
-    def cleanup_spacing(self):
-        ENCLOSED = '^\(.*\)$'
-        FUNC_MATCHING = '^\(func .* \(;.*\)$'
-        spacing = 1
-        for wat in self.wat_lst[1:]:
-            if re.match(FUNC_MATCHING, wat['wat']):
-                wat['pretty_print'] = spacing
-                spacing += 1
-            elif not re.match(ENCLOSED, wat['wat']) and wat['wat'] != ')':
-                wat['pretty_print'] = spacing
-                spacing += 1
-            elif wat['wat'] == ')':
-                spacing -= 1
-                wat['pretty_print'] = spacing
-            else:
-                wat['pretty_print'] = spacing
+        return walk(self.dispatch, node)
+
+    def dispatch(self, node):
+        # Not every node has a line, the last one seen stands for the rest
+        line = getattr(node, 'line_number', None)
+        if line:
+            self.line = line
+        return self.handlers[node.__class__](self, node)
 
     # Printing WAT to terminal
     def print_wat(self):
-        self.cleanup_spacing()
-        for wat in self.wat_lst:
-            print(' ' * wat['pretty_print'] + wat['wat'])
+        write_module(self.module, sys.stdout, self.flat)
 
     # Generating WAT to .wat file
     def write_wat(self, f):
-        self.cleanup_spacing()
-        for wat in self.wat_lst:
-            f.write(' ' * wat['pretty_print'] + wat['wat'] + '\n')
-
-    def add_wat(self, wat, tab=None):
-        if tab is not None and isinstance(tab, int):
-            self.pretty_print += tab
-
-        self.wat_lst.append({
-            'wat': wat,
-            'pretty_print': self.pretty_print,
-        })
+        write_module(self.module, f, self.flat)
+
+    def add_wat(self, instr):
+        if self.line != self.tagged_line:
+            instr.line = self.tagged_line = self.line
+        self.open_lists[-1].append(instr)
+
+    def open_wat(self, instr):
+        """ Add an instruction whose operands are the instructions added up to close_wat """
+        if self.line != self.tagged_line:
+            instr.line = self.tagged_line = self.line
+        instr.operands = []
+        self.open_lists[-1].append(instr)
+        self.open_lists.append(instr.operands)
+
+    def close_wat(self):
+        self.open_lists.pop()
+
+    def flush(self):
+        """ Write out the functions done so far when streaming to a file """
+        if self.out is not None:
+            for func in self.module.funcs:
+                self.out.write(func_text(func, self.flat))
+            self.module.funcs = []
+
+    def placeholder(self, instr):
+        """ Note an instruction with an offset placeholder, patched once the function is done """
+        self.fixups.append(instr)
+        return instr
+
+    # Fill in the placeholders of the function just generated, in the order they were added
+    def patch_offsets(self):
+        for instr in self.fixups:
+            if '$TOTAL_OFFSET$' in instr.imms:
+                placeholder = '$TOTAL_OFFSET$'
+            elif '$INT_OFFSET$' in instr.imms:
+                self.curr_offset -= 4
+                placeholder = '$INT_OFFSET$'
+            elif '$CHAR_OFFSET$' in instr.imms:
+                self.curr_offset -= 3
+                placeholder = '$CHAR_OFFSET$'
+            else:
+                continue
+            instr.imms = tuple(self.curr_offset if imm == placeholder else imm for imm in instr.imms)
+        self.fixups = []
 
     def wat_Program(self, node):
         # Required module for any program
-        self.add_wat(SYNTAX['module'])
-        # Increment tab space
-        self.add_wat(SYNTAX['import_func'].format('print', 'print', '(param i32)'),1)
-        self.add_wat(SYNTAX['table'].format(0, 'anyfunc'))
-        self.add_wat(SYNTAX['memory'].format(0, 1))
-        self.add_wat(SYNTAX['export_memory'].format(0))
+        self.module.imports.append(('imports', 'print', 'print', ['i32']))
+        self.module.tables.append((0, 'anyfunc'))
+        self.module.memories.append((0, 1))
+        self.module.exports.append(('memory', 'memory', 0))
 
         # Export all functions in the program before proceeding
         for (_, child) in node.children():
@@ -88,12 +139,15 @@ class Wat(object):
                 func_name = f'_Z{len(func_name)}{func_name}i'
 
             if func_name == 'main' or func_name not in self.reserved_funcs:
-                self.add_wat(SYNTAX['export_func'].format(func_name, func_name))
+                self.module.exports.append((func_name, 'func', func_name))
 
+        if self.out is not None:
+            self.out.write(head_text(self.module, self.flat))
         for (_, child) in node.children():
-            self.generate(child)
+            yield child
 
-        self.add_wat(SYNTAX['closing'], -1)
+        if self.out is not None:
+            self.out.write(SYNTAX['closing'] + '\n')
 
     def add_var(self, var):
         self.variables.setdefault(var['name'], var)
@@ -111,22 +165,22 @@ class Wat(object):
         # Get all parameters for the function to be used in the function header
         for (_, child) in node.children():
             if isinstance(child, Formal):
-                temp_var = dict(VAR_TEMPLATE)
+                temp_var = new_variable()
                 temp_var['name'] = child.name
                 temp_var['type'] = child.type.name.lower()
                 temp_var['is_param'] = True
                 temp_var['can_be_opt'] = False
                 temp_var['param_reg'] = len(self.variables)
-                to_return.append(SYNTAX['param'].format(len(self.variables) - 1, 'i32'))
+                to_return.append(len(self.variables) - 1)
                 self.variables['TOTAL_OFFSET'] += 4
                 param_lst.append(child.name)
                 self.add_var(temp_var)
-        return ' '.join(to_return), param_lst
+        return to_return, param_lst
 
 
     # Store the total amount of variables there are using offsets
-    def create_offset(self):
-        self.add_wat(SYNTAX['local'].format(len(self.variables) - 1, 'i32'), 1)
+    def create_offset(self, func):
+        func.locals.append((len(self.variables) - 1, 'i32'))
         self.local_reg = len(self.variables) - 1
 
     # Generate all the required variables offset including nested level
@@ -138,15 +192,18 @@ class Wat(object):
                 self.variables['TOTAL_OFFSET'] += 4
             return
 
-        for (_, child) in node.children():
+        # Nested scopes still to count, kept on a list rather than recursing
+        scopes = [node]
+        while scopes:
+            for (_, child) in scopes.pop().children():
 
-            if isinstance(child, DeclStmt) or isinstance(child, Formal):
-                self.var_initializer -= 4
-                if self.var_initializer < 0:
-                    self.variables['TOTAL_OFFSET'] += 4
-            elif isinstance(child, StmtList) or isinstance(child, ForStmt) or \
-                isinstance(child, WhileStmt) or isinstance(child, IfStmt):
-                self.create_var_offset(child)
+                if isinstance(child, DeclStmt) or isinstance(child, Formal):
+                    self.var_initializer -= 4
+                    if self.var_initializer < 0:
+                        self.variables['TOTAL_OFFSET'] += 4
+                elif isinstance(child, StmtList) or isinstance(child, ForStmt) or \
+                    isinstance(child, WhileStmt) or isinstance(child, IfStmt):
+                    scopes.append(child)
 
         return
 
@@ -171,51 +228,47 @@ class Wat(object):
             case 'char' | 'int':
                 ret_type = 'i32'
 
-        self.add_wat(SYNTAX['func_dec'].format(func_name, self.num_func, params, ret_type))
+        func = Func(func_name, self.num_func, params, ret_type)
+        self.module.funcs.append(func)
+        self.open_lists.append(func.body)
+        self.tagged_line = None
         self.num_func += 1
         # Only required if we're storing variables (Maybe for optimizing?)
-        self.create_offset()
+        self.create_offset(func)
         # Generate the required params
         counter = len(param_lst) - 1
         for param in param_lst:
             var = self.variables[param]
             if var['type'] == 'int':
-                self.add_wat(SYNTAX['i32_store'].format('', f'offset={var["offset"]}'))
+                self.open_wat(Instr('i32.store', var["offset"]))
             else:
-                self.add_wat(SYNTAX['i32_store'].format('8', f'offset={var["offset"]}'))
-            self.add_wat(SYNTAX['get_local'].format(len(param_lst)))
-            self.add_wat(SYNTAX['get_local'].format(counter))
-            self.add_wat(SYNTAX['closing'], -1)
+                self.open_wat(Instr('i32.store8', var["offset"]))
+            self.add_wat(Instr('get_local', len(param_lst)))
+            self.add_wat(Instr('get_local', counter))
+            self.close_wat()
             counter -= 1
 
         # Generate body
-        self.generate(node.body)
+        yield node.body
 
-        self.add_wat(SYNTAX['closing'], -1)
+        self.close_wat()
         self.curr_func = None
 
-        for i in range(len(self.wat_lst)):
-            if '$TOTAL_OFFSET$' in self.wat_lst[i]['wat']:
-                self.wat_lst[i]['wat'] = self.wat_lst[i]['wat'].replace('$TOTAL_OFFSET$', str(self.curr_offset))
-            elif '$INT_OFFSET$' in self.wat_lst[i]['wat']:
-                self.curr_offset -= 4
-                self.wat_lst[i]['wat'] = self.wat_lst[i]['wat'].replace('$INT_OFFSET$', str(self.curr_offset))
-            elif '$CHAR_OFFSET$' in self.wat_lst[i]['wat']:
-                self.curr_offset -= 3
-                self.wat_lst[i]['wat'] = self.wat_lst[i]['wat'].replace('$CHAR_OFFSET$', str(self.curr_offset))
+        self.patch_offsets()
         self.curr_offset = 0
+        self.flush()
 
     def wat_Type(self, node):
         return
 
     def wat_StmtList(self, node):
         for stmt in node.stmt_lst:
-            self.generate(stmt)
+            yield stmt
 
 
     def wat_DeclStmt(self, node):
         # Used for offset registry
-        self.curr_variable = dict(VAR_TEMPLATE)
+        self.curr_variable = new_variable()
         self.curr_variable['name'] = node.name
         self.curr_variable['type'] = node.type.name.lower()
         if node.type.number_of_pointers > 0:
@@ -238,30 +291,23 @@ class Wat(object):
         match node.type.name.lower():
             case 'int':
                 # Kinda hardcoding offset rn, not sure how else to do it
-                offset = ''
-                if self.curr_variable['offset'] != 0:
-                    offset = f'offset={self.curr_variable["offset"]}'
-                self.add_wat(SYNTAX['i32_store'].format('', offset))
+                self.open_wat(Instr('i32.store', self.curr_variable['offset']))
 
             case 'char':
-                offset = ''
-                if self.curr_variable['offset'] != 0:
-                    offset = f'offset={self.curr_variable["offset"]}'
-                self.add_wat(SYNTAX['i32_store'].format('8', offset))
+                self.open_wat(Instr('i32.store8', self.curr_variable['offset']))
 
 
-        self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-        self.pretty_print -= 1
-        self.generate(node.expr)
+        self.add_wat(Instr('get_local', self.local_reg))
+        yield node.expr
         # webassembly only store the ord value
         self.curr_variable['val'] = self.curr_variable['temp_val']
         if self.is_optimized and self.curr_variable['can_be_opt'] and not self.in_loop:
             val = self.curr_variable['val'] if self.curr_variable['val'] else 0
-            self.add_wat(SYNTAX['i32_const'].format(val))
+            self.add_wat(Instr('i32.const', val))
         elif self.curr_variable['val'] is None and not self.curr_variable['is_param']:
-            self.add_wat(SYNTAX['i32_const'].format(0))
+            self.add_wat(Instr('i32.const', 0))
 
-        self.add_wat(SYNTAX['closing'], -1)
+        self.close_wat()
 
         self.curr_variable['op'] = []
         self.curr_variable = None
@@ -279,28 +325,25 @@ class Wat(object):
                 const = Constant('id', node.name)
                 bin_op = BinOp(node.op[0], const, node.expr)
 
-                self.add_wat(SYNTAX['i32_store'].format(store_type, f'offset={self.curr_variable["offset"]}'))
-                self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                self.pretty_print -= 1
-                self.generate(bin_op)
+                self.open_wat(Instr('i32.store' + store_type, self.curr_variable["offset"]))
+                self.add_wat(Instr('get_local', self.local_reg))
+                yield bin_op
                 if self.is_optimized and self.curr_variable['can_be_opt'] and not self.in_loop:
                     if not isinstance(node.expr, FuncCall):
-                        self.add_wat(SYNTAX['i32_const'].format(self.curr_variable['val']))
-                self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(Instr('i32.const', self.curr_variable['val']))
+                self.close_wat()
             else:
                 self.curr_variable['op'].append(node.op)
-                self.add_wat(SYNTAX['i32_store'].format(store_type, f'offset={self.curr_variable["offset"]}'))
-                self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                self.generate(node.expr)
-                # Might need might not
-                # self.pretty_print -= 1
+                self.open_wat(Instr('i32.store' + store_type, self.curr_variable["offset"]))
+                self.add_wat(Instr('get_local', self.local_reg))
+                yield node.expr
                 self.curr_variable['val'] = self.curr_variable['temp_val']
 
                 if self.is_optimized and self.curr_variable['can_be_opt'] and not self.in_loop:
 
                     if not isinstance(node.expr, FuncCall):
-                        self.add_wat(SYNTAX['i32_const'].format(self.curr_variable['val']))
-                self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(Instr('i32.const', self.curr_variable['val']))
+                self.close_wat()
                 if (self.curr_variable['op'] and self.curr_variable['op'][-1] == '='):
                     self.curr_variable['op'].pop()
                 self.curr_variable = None
@@ -308,74 +351,74 @@ class Wat(object):
     def wat_BinOp(self, node):
         unoptimized_var = ['==', '!=', '<=', '=<', '>=', '=>', '<', '>']
         is_optimized = self.is_optimized
-        if node.op in unoptimized_var:
+        op = NEGATION[node.op] if node in self.negated else node.op
+        if op in unoptimized_var:
             self.is_optimized = False
         if not self.is_optimized or not self.curr_variable['can_be_opt']:
             if self.curr_variable:
-                self.curr_variable['op'].append(node.op)
+                self.curr_variable['op'].append(op)
 
-            match node.op:
+            match op:
                 case '==':
-                    self.add_wat(SYNTAX['i32_eq'], 1)
+                    self.open_wat(Instr('i32.eq'))
                 case '!=':
-                    self.add_wat(SYNTAX['i32_ne'], 1)
+                    self.open_wat(Instr('i32.ne'))
                 case '<=' | '=<':
-                    self.add_wat(SYNTAX['i32_le_s'], 1)
+                    self.open_wat(Instr('i32.le_s'))
                 case '>=' | '=>':
-                    self.add_wat(SYNTAX['i32_ge_s'], 1)
+                    self.open_wat(Instr('i32.ge_s'))
                 case '<':
-                    self.add_wat(SYNTAX['i32_lt_s'], 1)
+                    self.open_wat(Instr('i32.lt_s'))
                 case '>':
-                    self.add_wat(SYNTAX['i32_gt_s'], 1)
+                    self.open_wat(Instr('i32.gt_s'))
                 case '+':
-                    self.add_wat(SYNTAX['i32_add'], 1)
+                    self.open_wat(Instr('i32.add'))
                 case '-':
-                    self.add_wat(SYNTAX['i32_sub'], 1)
+                    self.open_wat(Instr('i32.sub'))
                 case '/':
-                    self.add_wat(SYNTAX['i32_div'], 1)
+                    self.open_wat(Instr('i32.div_s'))
                 case '*':
-                    self.add_wat(SYNTAX['i32_mul'], 1)
+                    self.open_wat(Instr('i32.mul'))
                 case '%':
-                    self.add_wat(SYNTAX['i32_rem'], 1)
+                    self.open_wat(Instr('i32.rem_s'))
 
             # If its assigning to final value, use this to track
             if self.curr_variable:
                 if isinstance(node.left, Constant) and isinstance(node.right, Constant):
                     self.curr_variable['op'].append('=')
-                    self.generate(node.left)
-                    self.generate(node.right)
+                    yield node.left
+                    yield node.right
                 elif isinstance(node.left, Constant):
-                    self.generate(node.right)
-                    self.generate(node.left)
+                    yield node.right
+                    yield node.left
                 else:
-                    self.generate(node.left)
-                    self.generate(node.right)
+                    yield node.left
+                    yield node.right
             # for comparison
             else:
-                self.generate(node.left)
-                self.pretty_print -= 1
-                self.generate(node.right)
+                yield node.left
+                yield node.right
             # Wont break anymore
 
-            self.add_wat(SYNTAX['closing'], -1)
+            self.close_wat()
         else:
-            self.curr_variable['op'].append(node.op)
+            self.curr_variable['op'].append(op)
             left = None
             right = None
             if isinstance(node.left, Constant) and isinstance(node.right, Constant):
                 self.curr_variable['op'].append('=')
 
-                left = self.generate(node.left)
-                right = self.generate(node.right)
+                left = yield node.left
+                right = yield node.right
             elif isinstance(node.left, Constant):
-                right = self.generate(node.right)
-                left = self.generate(node.left)
+                right = yield node.right
+                left = yield node.left
             elif isinstance(node.right, Constant):
-                left = self.generate(node.left)
-                right = self.generate(node.right)
+                left = yield node.left
+                right = yield node.right
             else:
-                left = self.generate(node.left)
-                right = self.generate(node.right)
+                left = yield node.left
+                right = yield node.right
                 if self.curr_variable and left and right and self.curr_variable['type'] == 'int' and\
                     len(self.curr_variable['op']) >= 2:
                     val = left
@@ -395,28 +438,27 @@ class Wat(object):
             self.curr_variable['op'].append(node.op)
         match node.op:
             case '++':
-                self.add_wat(SYNTAX['i32_store'].format('', f'offset={self.curr_variable["offset"]}'))
-                self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
+                self.open_wat(Instr('i32.store', self.curr_variable["offset"]))
+                self.add_wat(Instr('get_local', self.local_reg))
 
                 bin_op = BinOp('+', node.expr, Constant('int', 1))
 
-                self.wat_BinOp(bin_op)
+                yield self.wat_BinOp(bin_op)
                 if self.is_optimized and self.curr_variable['can_be_opt']:
-                    self.add_wat(SYNTAX['i32_const'].format(self.curr_variable['val']), 1)
+                    self.add_wat(Instr('i32.const', self.curr_variable['val']))
 
-                self.add_wat(SYNTAX['closing'], -1)
+                self.close_wat()
             case '--':
-                self.add_wat(SYNTAX['i32_store'].format('', f'offset={self.curr_variable["offset"]}'))
-                self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
+                self.open_wat(Instr('i32.store', self.curr_variable["offset"]))
+                self.add_wat(Instr('get_local', self.local_reg))
                 bin_op = BinOp('-', node.expr, Constant('int', 1))
-                self.wat_BinOp(bin_op)
+                yield self.wat_BinOp(bin_op)
                 if self.is_optimized and self.curr_variable['can_be_opt']:
-                    self.add_wat(SYNTAX['i32_const'].format(self.curr_variable['val']), 1)
-                self.add_wat(SYNTAX['closing'], -1)
+                    self.add_wat(Instr('i32.const', self.curr_variable['val']))
+                self.close_wat()
             case '-':
-                self.pretty_print -= 1
                 bin_op = BinOp('-', Constant('int', 0), node.expr)
-                self.generate(bin_op)
+                yield bin_op
             case '!':
                 # WebAssembly doesn't have logiclal booleans, only integer booleans
                 if isinstance(node.expr, Constant):
@@ -449,7 +491,7 @@ class Wat(object):
                         else:
                             const = Constant('int', 0)
                             self.wat_Constant(const)
-                    # self.add_wat(SYNTAX['closing'], -1)
+                    # self.close_wat()
 
                 else:
                     # Handle case when negating a non constant expression
@@ -457,36 +499,35 @@ class Wat(object):
                     pass
             case '&':
                 if self.curr_variable:
-                    self.add_wat(SYNTAX['i32_add'], 1)
-                    self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                    self.add_wat(SYNTAX['i32_const'].format(self.variables[node.expr.value]['offset']))
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('i32.add'))
+                    self.add_wat(Instr('get_local', self.local_reg))
+                    self.add_wat(Instr('i32.const', self.variables[node.expr.value]['offset']))
+                    self.close_wat()
         if self.curr_variable:
             self.curr_variable['val'] = self.curr_variable['temp_val']
             self.curr_variable['op'] = []
 
     def wat_printInt(self, node):
         func_name = node.name
-        self.add_wat(SYNTAX['drop'])
-        self.add_wat(SYNTAX['tee_local'].format(0), 1)
-        self.add_wat(SYNTAX['call_with_arg'].format(func_name), 1)
+        self.open_wat(Instr('drop'))
+        self.open_wat(Instr('tee_local', 0))
+        self.open_wat(Instr('call', func_name))
         if node.params:
-            self.pretty_print += 1
             for params in node.params:
                 if(params.type=="id"):
                     localreg = self.variables[params.value]['param_reg']
                     if localreg == None:
                         self.curr_variable = self.variables[params.value]
-                        self.add_wat(SYNTAX['i32_load'].format('', f'offset={self.curr_variable["offset"]}'))
-                        self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                        self.add_wat(SYNTAX['closing'], -1)
+                        self.open_wat(Instr('i32.load', self.curr_variable["offset"]))
+                        self.add_wat(Instr('get_local', self.local_reg))
+                        self.close_wat()
                     else:
-                        self.add_wat(SYNTAX['get_local'].format(localreg))
+                        self.add_wat(Instr('get_local', localreg))
                 else:
-                    self.add_wat(SYNTAX['i32_const'].format(params.value))
-            self.add_wat(SYNTAX['closing'], -1)
-        self.add_wat(SYNTAX['closing'], -1)
-        self.add_wat(SYNTAX['closing'], -1)
+                    self.add_wat(Instr('i32.const', params.value))
+            self.close_wat()
+        self.close_wat()
+        self.close_wat()
 
     # This will only apply
     def wat_FuncCall(self, node):
@@ -497,37 +538,36 @@ class Wat(object):
         if func_name not in self.reserved_funcs:
             func_name = f'_Z{len(func_name)}{func_name}i'
         if not self.curr_variable:
-            self.add_wat(SYNTAX['drop'])
+            self.open_wat(Instr('drop'))
         else:
             if func_name != "print":
-                self.add_wat(SYNTAX['tee_local'].format(0), 1)
+                self.open_wat(Instr('tee_local', 0))
 
         if (node.params):
-            self.add_wat(SYNTAX['call_with_arg'].format(func_name), 1)
+            self.open_wat(Instr('call', func_name))
         else:
-            self.add_wat(SYNTAX['call'].format(func_name), 1)
+            self.add_wat(Instr('call', func_name))
 
         # Populate parameters
         if func_name == 'print':
-            self.add_wat(SYNTAX['i32_const'].format(0))
-            self.add_wat(SYNTAX['get_local'].format(0))
-            self.add_wat(SYNTAX['closing'], -1)
+            self.add_wat(Instr('i32.const', 0))
+            self.add_wat(Instr('get_local', 0))
+            self.close_wat()
         elif node.params:
-            self.pretty_print += 1
             for params in node.params:
                 if(params.type=="id"):
                     localreg = self.variables[params.value]['param_reg']
                     if localreg == None:
                         self.curr_variable = self.variables[params.value]
-                        self.add_wat(SYNTAX['i32_load'].format('', f'offset={self.curr_variable["offset"]}'))
-                        self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                        self.add_wat(SYNTAX['closing'], -1)
+                        self.open_wat(Instr('i32.load', self.curr_variable["offset"]))
+                        self.add_wat(Instr('get_local', self.local_reg))
+                        self.close_wat()
                     else:
-                        self.add_wat(SYNTAX['get_local'].format(localreg))
+                        self.add_wat(Instr('get_local', localreg))
                 else:
-                    self.add_wat(SYNTAX['i32_const'].format(params.value))
-            self.add_wat(SYNTAX['closing'], -1)
-        self.add_wat(SYNTAX['closing'], -1)
+                    self.add_wat(Instr('i32.const', params.value))
+            self.close_wat()
+        self.close_wat()
 
 
     def wat_NoneType(self, node):
@@ -609,63 +649,67 @@ class Wat(object):
             # Variable loading
             if node.type.lower() == 'id':
                 self.curr_variable = self.variables[node.value]
-                self.add_wat(SYNTAX['i32_load'].format('', f'offset={self.curr_variable["offset"]}'), 1)
+                self.open_wat(Instr('i32.load', self.curr_variable["offset"]))
                 if self.curr_variable['param_reg'] is not None:
-                    self.add_wat(SYNTAX['get_local'].format(self.curr_variable['param_reg']), 1)
+                    self.add_wat(Instr('get_local', self.curr_variable['param_reg']))
                 else:
-                    self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                self.add_wat(SYNTAX['closing'], -1)
+                    self.add_wat(Instr('get_local', self.local_reg))
+                self.close_wat()
             # Int type
             elif node.type.lower() == 'int':
-                self.add_wat(SYNTAX['i32_const'].format(node.value, ''), 1)
+                self.add_wat(Instr('i32.const', node.value))
             elif node.type.lower() == 'char':
-                self.add_wat(SYNTAX['i32_const'].format(self.variables[node.value]['val']), 1)
+                self.add_wat(Instr('i32.const', self.variables[node.value]['val']))
             elif node.type.lower() == 'words':
-                self.add_wat(SYNTAX['i32_const'].format(ord(node.value.replace('\'', '').replace('\"', ''))), 1)
-                self.pretty_print -= 1
+                self.add_wat(Instr('i32.const', ord(node.value.replace('\'', '').replace('\"', ''))))
 
         return self.curr_variable['temp_val'] if self.curr_variable else None
 
     def wat_RetStmt(self, node):
+        # The statement itself has no line, what it generates is tagged with
+        # that of its expression. It may generate nothing, the validator then
+        # reports the missing result against this line
+        self.line = first_line(node.expr) or self.line
+        self.module.funcs[-1].return_line = self.line
         if isinstance(node.expr, Constant):
             if node.expr.type.lower() == 'int':
-                self.add_wat(SYNTAX['i32_const'].format(node.expr.value))
+                self.add_wat(Instr('i32.const', node.expr.value))
             elif node.expr.type.lower() == 'words':
-                self.add_wat(SYNTAX['i32_const'].format(ord(eval(node.expr.value))))
+                self.add_wat(Instr('i32.const', ord(eval(node.expr.value))))
             elif node.expr.type.lower() == 'id':
 
                 if not self.curr_variable:
                     self.curr_variable = self.variables[node.expr.value]
                     if self.curr_variable['is_pointer']:
-                        self.add_wat(SYNTAX['i32_load'].format('', ''))
-                        self.add_wat(SYNTAX['i32_load'].format('', f'offset={self.curr_variable["offset"]}'), 1)
-                        self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                        self.add_wat(SYNTAX['closing'], -1)
-                        self.add_wat(SYNTAX['closing'], -1)
+                        self.open_wat(Instr('i32.load', 0))
+                        self.open_wat(Instr('i32.load', self.curr_variable["offset"]))
+                        self.add_wat(Instr('get_local', self.local_reg))
+                        self.close_wat()
+                        self.close_wat()
 
                     else:
-                        self.add_wat(SYNTAX['i32_load'].format('', f'offset={self.curr_variable["offset"]}'))
-                        self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
-                        self.add_wat(SYNTAX['closing'], -1)
+                        self.open_wat(Instr('i32.load', self.curr_variable["offset"]))
+                        self.add_wat(Instr('get_local', self.local_reg))
+                        self.close_wat()
                 elif node.expr.value in self.variables:
                     cur_var = self.variables[node.expr.value]
                     if not cur_var['can_be_opt'] or cur_var['is_param']:
                         if cur_var['type'] == 'int':
-                            self.add_wat(SYNTAX['i32_load'].format('', f'offset={cur_var["offset"]}'))
+                            self.open_wat(Instr('i32.load', cur_var["offset"]))
                         else:
-                            self.add_wat(SYNTAX['i32_load'].format('8', f'offset={cur_var["offset"]}'))
+                            self.open_wat(Instr('i32.load8_u', cur_var["offset"]))
 
                         if cur_var['is_param']:
-                            self.add_wat(SYNTAX['get_local'].format(cur_var['param_reg']), 1)
+                            self.add_wat(Instr('get_local', cur_var['param_reg']))
                         else:
-                            self.add_wat(SYNTAX['get_local'].format(self.local_reg), 1)
+                            self.add_wat(Instr('get_local', self.local_reg))
 
-                        self.add_wat(SYNTAX['closing'], -1)
+                        self.close_wat()
 
                     else:
-                        self.add_wat(SYNTAX['i32_const'].format(self.variables[node.expr.value]['val']))
+                        self.add_wat(Instr('i32.const', self.variables[node.expr.value]['val']))
                 else:
-                    self.add_wat(SYNTAX['i32_const'].format(0))
+                    self.add_wat(Instr('i32.const', 0))
         else:
             # Should we support other than constant for return?
             pass
@@ -712,10 +756,10 @@ class Wat(object):
             if isinstance(node.cond, Constant):
                 if node.cond.type == 'bool':
                     if node.cond.value.lower() == "true":
-                        self.generate(node.true_body)
+                        yield node.true_body
                         return
                     else:
-                        self.generate(node.false_body)
+                        yield node.false_body
                         return
             elif isinstance(node.cond, BinOp):
                 if node.cond.op == '&&':
@@ -724,36 +768,36 @@ class Wat(object):
                         if node.cond.left.value.lower() == "true":
                             trues += 1
                         else:
-                            self.generate(node.false_body)
+                            yield node.false_body
                             return
                     if isinstance(node.cond.right, Constant) and node.cond.right.type == "bool":
                         if node.cond.right.value.lower() == "true":
                             trues += 1
                         else:
-                            self.generate(node.false_body)
+                            yield node.false_body
                             return
                     # if both are bools, and true
                     if trues == 2:
-                        self.generate(node.true_body)
+                        yield node.true_body
                         return
                     # otherwise, must check other condition
                 elif node.cond.op == '||':
                     falses = 0
                     if isinstance(node.cond.left, Constant) and node.cond.left.type == "bool":
                         if node.cond.left.value.lower() == "true":
-                            self.generate(node.true_body)
+                            yield node.true_body
                             return
                         else:
                             falses += 1
                     if isinstance(node.cond.right, Constant) and node.cond.right.type == "bool":
                         if node.cond.right.value.lower() == "true":
-                            self.generate(node.true_body)
+                            yield node.true_body
                             return
                         else:
                             falses += 1
                     # if both are bools, and false
                     if falses == 2:
-                        self.generate(node.false_body)
+                        yield node.false_body
                         return
 
 
@@ -762,107 +806,107 @@ class Wat(object):
         # true_body_lab = self.gen_label()
         false_body_lab = self.gen_label()
 
-        self.add_wat(SYNTAX['block'].format(block_lab))
+        self.open_wat(Instr('block', block_lab))
         self.track_label(True, block_lab)
-        self.add_wat(SYNTAX['block'].format(false_body_lab))
+        self.open_wat(Instr('block', false_body_lab))
         self.track_label(True, false_body_lab)
 
         if isinstance(node.cond, BinOp):
             if node.cond.op == '&&':
                 if isinstance(node.cond.left, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
-                    node.cond.left.op = NEGATION[node.cond.left.op] # negate to generate else condition
-                    self.generate(node.cond.left)
-                    node.cond.left.op = NEGATION[node.cond.left.op] # restore original operator.
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', false_body_lab))
+                    self.negated.add(node.cond.left) # negate to generate else condition
+                    yield node.cond.left
+                    self.negated.discard(node.cond.left)
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
+                    self.open_wat(Instr('br_if', false_body_lab))
                     if self.is_optimized or node.cond.left.value.lower() == "true":
-                        self.add_wat(SYNTAX['FALSE']) # at this stage, we know that one bool is true
+                        self.add_wat(false_instr()) # at this stage, we know that one bool is true
                                                       # so we don't wanna break here 
                     else:
-                        self.add_wat(SYNTAX['TRUE'])
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(true_instr())
+                    self.close_wat()
 
                 if isinstance(node.cond.right, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # negate to generate else condition
-                    self.generate(node.cond.right)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # restore original operator.
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', false_body_lab))
+                    self.negated.add(node.cond.right) # negate to generate else condition
+                    yield node.cond.right
+                    self.negated.discard(node.cond.right)
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
+                    self.open_wat(Instr('br_if', false_body_lab))
                     if self.is_optimized or node.cond.right.value.lower() == "false":
-                        self.add_wat(SYNTAX['FALSE']) # at this stage, we know that one bool is true
+                        self.add_wat(false_instr()) # at this stage, we know that one bool is true
                                                       # so we don't wanna break here is true
                     else:
-                        self.add_wat(SYNTAX['TRUE'])
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(true_instr())
+                    self.close_wat()
 
                 # it can never be the case that both left and right are bools at this stage
 
             elif node.cond.op == '||':
                 true_body_lab = self.gen_label()
-                self.add_wat(SYNTAX['block'].format(true_body_lab))
+                self.open_wat(Instr('block', true_body_lab))
                 self.track_label(True, true_body_lab)
 
                 if isinstance(node.cond.left, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(true_body_lab), 1)
-                    self.generate(node.cond.left)
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', true_body_lab))
+                    yield node.cond.left
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(true_body_lab), 1)
+                    self.open_wat(Instr('br_if', true_body_lab))
                     if self.is_optimized or node.cond.left.value.lower() == "false":
-                        self.add_wat(SYNTAX['FALSE']) 
+                        self.add_wat(false_instr()) 
                     else:
-                        self.add_wat(SYNTAX['TRUE'])
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(true_instr())
+                    self.close_wat()
 
 
                 if isinstance(node.cond.right, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # negate to generate else condition
-                    self.generate(node.cond.right)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # restore original operator.
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', false_body_lab))
+                    self.negated.add(node.cond.right) # negate to generate else condition
+                    yield node.cond.right
+                    self.negated.discard(node.cond.right)
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
+                    self.open_wat(Instr('br_if', false_body_lab))
                     if self.is_optimized or node.cond.right.value.lower() == "false":
-                        self.add_wat(SYNTAX['TRUE']) # at this stage, we know that one bool is false
+                        self.add_wat(true_instr()) # at this stage, we know that one bool is false
                     else:
-                        self.add_wat(SYNTAX['FALSE'])
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(false_instr())
+                    self.close_wat()
 
 
-                self.add_wat(SYNTAX['closing'], -1)
+                self.close_wat()
                 self.untrack_label(True)
 
             else:
-                self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
-                node.cond.op = NEGATION[node.cond.op] # negate to generate else condition
-                self.generate(node.cond)
-                node.cond.op = NEGATION[node.cond.op] # restore original operator.
-                self.add_wat(SYNTAX['closing'], -1)
+                self.open_wat(Instr('br_if', false_body_lab))
+                self.negated.add(node.cond) # negate to generate else condition
+                yield node.cond
+                self.negated.discard(node.cond)
+                self.close_wat()
         else:
             # Boolean Constant Only (only reaches here if unoptimized)
-            self.add_wat(SYNTAX['br_if'].format(false_body_lab), 1)
+            self.open_wat(Instr('br_if', false_body_lab))
             if self.is_optimized or node.cond.value.lower() == "false":
-                self.add_wat(SYNTAX['TRUE']) 
+                self.add_wat(true_instr()) 
             else:
-                self.add_wat(SYNTAX['FALSE'])
-            self.add_wat(SYNTAX['closing'], -1)
+                self.add_wat(false_instr())
+            self.close_wat()
 
 
-        # self.add_wat(SYNTAX['closing'], -1)
-        self.generate(node.true_body)
-        self.add_wat(SYNTAX['br'].format(block_lab))
+        # self.close_wat()
+        yield node.true_body
+        self.add_wat(Instr('br', block_lab))
         self.untrack_label(True)
 
-        self.add_wat(SYNTAX['closing'], -1)
+        self.close_wat()
         if(node.false_body):
-            self.generate(node.false_body)
+            yield node.false_body
 
-        self.add_wat(SYNTAX['closing'], -1)
+        self.close_wat()
         self.untrack_label(True)
 
 
@@ -872,32 +916,32 @@ class Wat(object):
         self.in_loop = True
         block_lab = self.gen_label()
         loop_lab = self.gen_label()
-        self.generate(node.expr1)
-        self.add_wat(SYNTAX['block'].format(block_lab))
+        yield node.expr1
+        self.open_wat(Instr('block', block_lab))
         self.track_label(True, block_lab, is_loop_block=True)
-        self.add_wat(SYNTAX['loop'].format(loop_lab), 1)
+        self.open_wat(Instr('loop', loop_lab))
         self.track_label(False, loop_lab)
 
         if isinstance(node.expr2, Constant):
             if node.expr2.value == 'FALSE':
                 # break automatically if cond is FALSE
-                self.add_wat(SYNTAX['br'].format(block_lab))
+                self.add_wat(Instr('br', block_lab))
             # cond is TRUE, no break needed
         elif isinstance(node.expr2, BinOp):
             # while loop break condition
-            self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
-            node.expr2.op = NEGATION[node.expr2.op] # negate to generate
-            self.generate(node.expr2)
-            node.expr2.op = NEGATION[node.expr2.op] # restore original operator
-            self.add_wat(SYNTAX['closing'], -1)
+            self.open_wat(Instr('br_if', block_lab))
+            self.negated.add(node.expr2) # negate to generate
+            yield node.expr2
+            self.negated.discard(node.expr2)
+            self.close_wat()
 
-        self.generate(node.body)
+        yield node.body
 
-        self.generate(node.expr3)
-        self.add_wat(SYNTAX['br'].format(loop_lab))
-        self.add_wat(SYNTAX['closing'], -1)
+        yield node.expr3
+        self.add_wat(Instr('br', loop_lab))
+        self.close_wat()
         self.untrack_label(False)
-        self.add_wat(SYNTAX['closing'], -1)
+        self.close_wat()
         self.untrack_label(True, is_loop_block=True)
         self.in_loop = False
         self.is_optimized = is_optimized
@@ -933,100 +977,100 @@ class Wat(object):
         self.in_loop = True
         block_lab = self.gen_label()
         loop_lab = self.gen_label()
-        self.add_wat(SYNTAX['block'].format(block_lab))
+        self.open_wat(Instr('block', block_lab))
         self.track_label(True, block_lab, is_loop_block=True)
-        self.add_wat(SYNTAX['loop'].format(loop_lab), 1)
+        self.open_wat(Instr('loop', loop_lab))
         self.track_label(False, loop_lab)
 
 
         if isinstance(node.cond, BinOp):
             if node.cond.op == '&&':
                 if isinstance(node.cond.left, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
-                    node.cond.left.op = NEGATION[node.cond.left.op] # negate to generate
-                    self.generate(node.cond.left)
-                    node.cond.left.op = NEGATION[node.cond.left.op] # restore original operator
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', block_lab))
+                    self.negated.add(node.cond.left) # negate to generate
+                    yield node.cond.left
+                    self.negated.discard(node.cond.left)
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
+                    self.open_wat(Instr('br_if', block_lab))
                     if is_optimized or node.cond.left.value.lower() == "true":
-                        self.add_wat(SYNTAX['FALSE']) # at this stage, we know that one bool is true 
+                        self.add_wat(false_instr()) # at this stage, we know that one bool is true 
                                                        # so we don't wanna break here
                     else:
-                        self.add_wat(SYNTAX['TRUE'])
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(true_instr())
+                    self.close_wat()
 
                 if isinstance(node.cond.right, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # negate to generate
-                    self.generate(node.cond.right)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # restore original operator
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', block_lab))
+                    self.negated.add(node.cond.right) # negate to generate
+                    yield node.cond.right
+                    self.negated.discard(node.cond.right)
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
+                    self.open_wat(Instr('br_if', block_lab))
                     if is_optimized or node.cond.right.value.lower() == "true":
-                        self.add_wat(SYNTAX['FALSE']) # at this stage, we know that one bool is true
+                        self.add_wat(false_instr()) # at this stage, we know that one bool is true
                                                        # so we don't wanna break here is true
                     else:
-                        self.add_wat(SYNTAX['TRUE'])
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(true_instr())
+                    self.close_wat()
 
 
             elif node.cond.op == '||':
                 true_body_lab = self.gen_label()
-                self.add_wat(SYNTAX['block'].format(true_body_lab))
+                self.open_wat(Instr('block', true_body_lab))
                 self.track_label(True, true_body_lab)
                 
                 if isinstance(node.cond.left, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(true_body_lab), 1)
-                    self.generate(node.cond.left)
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', true_body_lab))
+                    yield node.cond.left
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(true_body_lab), 1)
+                    self.open_wat(Instr('br_if', true_body_lab))
                     if node.cond.left.value.lower() == "true":
-                        self.add_wat(SYNTAX['TRUE'])
+                        self.add_wat(true_instr())
                     else:
-                        self.add_wat(SYNTAX['FALSE'])
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(false_instr())
+                    self.close_wat()
 
 
                 if isinstance(node.cond.right, BinOp):
-                    self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # negate to generate
-                    self.generate(node.cond.right)
-                    node.cond.right.op = NEGATION[node.cond.right.op] # restore original operator
-                    self.add_wat(SYNTAX['closing'], -1)
+                    self.open_wat(Instr('br_if', block_lab))
+                    self.negated.add(node.cond.right) # negate to generate
+                    yield node.cond.right
+                    self.negated.discard(node.cond.right)
+                    self.close_wat()
                 else:
-                    self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
+                    self.open_wat(Instr('br_if', block_lab))
                     if node.cond.right.value.lower() == "true":
-                        self.add_wat(SYNTAX['FALSE']) 
+                        self.add_wat(false_instr()) 
                     else:
-                        self.add_wat(SYNTAX['TRUE']) 
-                    self.add_wat(SYNTAX['closing'], -1)
+                        self.add_wat(true_instr()) 
+                    self.close_wat()
 
-                self.add_wat(SYNTAX['closing'], -1)
+                self.close_wat()
                 self.untrack_label(True)
             else:
-                self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
-                node.cond.op = NEGATION[node.cond.op] # negate to generate
-                self.generate(node.cond)
-                node.cond.op = NEGATION[node.cond.op] # restore original operator
-                self.add_wat(SYNTAX['closing'], -1)
+                self.open_wat(Instr('br_if', block_lab))
+                self.negated.add(node.cond) # negate to generate
+                yield node.cond
+                self.negated.discard(node.cond)
+                self.close_wat()
         else:
             # Boolean Constant Only
-            self.add_wat(SYNTAX['br_if'].format(block_lab), 1)
+            self.open_wat(Instr('br_if', block_lab))
             if node.cond.value.lower() == "true":
-                self.add_wat(SYNTAX['FALSE']) 
+                self.add_wat(false_instr()) 
             else:
-                self.add_wat(SYNTAX['TRUE']) 
-            self.add_wat(SYNTAX['closing'], -1)
+                self.add_wat(true_instr()) 
+            self.close_wat()
 
 
-        self.generate(node.body)
+        yield node.body
         self.wat_ContinueStmt(node)
-        self.add_wat(SYNTAX['closing'], -1)
+        self.close_wat()
         self.untrack_label(False)
-        self.add_wat(SYNTAX['closing'], -1)
+        self.close_wat()
         self.untrack_label(True, is_loop_block=True)
         self.in_loop = False
         self.is_optimized = is_optimized
@@ -1036,13 +1080,13 @@ class Wat(object):
         # br_if to loop label
         loop_lab = self.get_label(False) # get loop label to conitnue
         if loop_lab:
-            self.add_wat(SYNTAX['br'].format(loop_lab))
+            self.add_wat(Instr('br', loop_lab))
 
     def wat_BreakStmt(self, node):
         # br_if to block label
         block_lab = self.get_label(True, is_loop_block=True)
         if block_lab:
-            self.add_wat(SYNTAX['br'].format(block_lab))
+            self.add_wat(Instr('br', block_lab))
 
     def wat_Array(self, node):
         pass
@@ -0,0 +1,204 @@
+"""
+WAT held as typed objects rather than text. A Module holds its imports, table,
+memory, exports and Funcs, and a function body is a list of Instrs with their
+operands folded inside them. Wat builds it, and the functions at the bottom of
+this file are the one place it is turned into WAT text, either folded and
+indented or flat, one instruction a line after its operands
+"""
+from wat_symbols import SYNTAX
+
+# The memory instructions, whose immediate is an offset, with their opcode and
+# natural alignment as a power of two. The reader, the validator and
+# wasm_binary all take them from here
+MEMORY_OPCODES = {
+    'i32.load': (0x28, 2), 'i32.load8_s': (0x2c, 0), 'i32.load8_u': (0x2d, 0),
+    'i32.store': (0x36, 2), 'i32.store8': (0x3a, 0),
+}
+# Instructions whose immediate names a local or a function
+INDEX_OPS = frozenset(('get_local', 'set_local', 'tee_local', 'local.get', 'local.set', 'local.tee', 'call'))
+# Instructions holding a sequence of instructions rather than operands
+BLOCK_OPS = frozenset(('block', 'loop'))
+
+
+class Instr(object):
+    """ One instruction, e.g. Instr('i32.store', 8, operands=[address, value]) """
+    # line, the MiniC line the instruction was generated for, is only set on
+    # the first instruction of each line
+    __slots__ = ('op', 'imms', 'operands', 'line')
+
+    def __init__(self, op: str, *imms, operands=()):
+        self.op = op
+        # Memory offsets, local indices, function names, labels and constants
+        self.imms = imms
+        # Instructions computing the values it pops, in order
+        self.operands = operands
+
+    def __repr__(self):
+        return f'Instr({self.op!r}, {", ".join(map(repr, self.imms))})'
+
+
+class Func(object):
+    __slots__ = ('name', 'index', 'params', 'result', 'locals', 'body', 'return_line')
+
+    def __init__(self, name: str, index: int, params: list, result: str = None):
+        self.name = name
+        self.index = index
+        # Indices of the locals the parameters are, all i32
+        self.params = params
+        # Type of the result, None for none
+        self.result = result
+        self.locals = []
+        self.body = []
+        # MiniC line of the last return statement, when known
+        self.return_line = None
+
+
+class Module(object):
+    __slots__ = ('imports', 'tables', 'memories', 'exports', 'funcs')
+
+    def __init__(self):
+        # (module, name, function, parameter types)
+        self.imports = []
+        # (size, element type)
+        self.tables = []
+        # (index, pages)
+        self.memories = []
+        # (name, kind, index or name), kind being 'func' or 'memory'
+        self.exports = []
+        self.funcs = []
+
+
+def true_instr() -> Instr:
+    return Instr('i32.eq', operands=[Instr('i32.const', 0), Instr('i32.const', 0)])
+
+
+def false_instr() -> Instr:
+    return Instr('i32.eq', operands=[Instr('i32.const', 0), Instr('i32.const', 1)])
+
+
+def stack_order(body: list):
+    """
+    The instructions of body in the order they run, as (instr, done) pairs.
+    Each instruction comes with done True once its operands, or the
+    instructions of a block or loop, have come. One with operands, and every
+    block and loop, also comes with done False before them. Kept on a list
+    rather than recursing, expressions can nest deeply
+    """
+    stack = [(instr, False) for instr in reversed(body)]
+    while stack:
+        instr, done = stack.pop()
+        if done or not instr.operands and instr.op not in BLOCK_OPS:
+            yield instr, True
+            continue
+        yield instr, False
+        stack.append((instr, True))
+        stack += [(operand, False) for operand in reversed(instr.operands)]
+
+
+#
+#	Text
+#
+def instr_head(instr: Instr) -> str:
+    """ The instruction up to its operands, without the closing paren """
+    op = instr.op
+    if op in MEMORY_OPCODES:
+        imms = [f'offset={imm}' for imm in instr.imms if imm]
+    elif op in INDEX_OPS:
+        imms = [f'${imm}' for imm in instr.imms]
+    else:
+        imms = [str(imm) for imm in instr.imms]
+    return ' '.join(['(' + op] + imms)
+
+
+def body_lines(body: list, depth: int) -> list:
+    """ Lines of a list of instructions, the operands of each a space deeper """
+    lines = []
+    indent = ' ' * depth
+    # The same few instructions come up over and over
+    heads = {}
+    # The instructions still to print at each enclosing level, kept on a list
+    # rather than recursing as expressions can nest deeply
+    stack = []
+    instrs = iter(body)
+    while True:
+        for instr in instrs:
+            key = (instr.op, instr.imms)
+            head = heads.get(key)
+            if head is None:
+                head = heads[key] = instr_head(instr)
+            if instr.operands:
+                lines.append(indent + head)
+                stack.append((instrs, indent))
+                instrs = iter(instr.operands)
+                indent += ' '
+                break
+            lines.append(indent + head + ')')
+        else:
+            if not stack:
+                return lines
+            instrs, indent = stack.pop()
+            lines.append(indent + SYNTAX['closing'])
+
+
+def flat_body_lines(body: list) -> list:
+    """ Lines of a list of instructions in stack order, each after its operands and unindented """
+    lines = []
+    heads = {}
+    for instr, done in stack_order(body):
+        if instr.op in BLOCK_OPS:
+            # A block or loop comes before its instructions, closed by end
+            if done:
+                lines.append(SYNTAX['end'])
+                continue
+        elif not done:
+            continue
+        key = (instr.op, instr.imms)
+        head = heads.get(key)
+        if head is None:
+            head = heads[key] = instr_head(instr)[1:]
+        lines.append(head)
+    return lines
+
+
+def head_text(module: Module, flat: bool = False) -> str:
+    """ The module up to its functions """
+    indent = '' if flat else ' '
+    lines = [SYNTAX['module']]
+    for imported in module.imports:
+        params = ' '.join(SYNTAX['param_type'].format(t) for t in imported[3])
+        lines.append(indent + SYNTAX['import_func'].format(*imported[:3], params))
+    for table in module.tables:
+        lines.append(indent + SYNTAX['table'].format(*table))
+    for memory in module.memories:
+        lines.append(indent + SYNTAX['memory'].format(*memory))
+    for name, kind, ref in module.exports:
+        lines.append(indent + SYNTAX['export'].format(name, kind, ref))
+    return '\n'.join(lines) + '\n'
+
+
+def func_text(func: Func, flat: bool = False) -> str:
+    if flat:
+        header = [SYNTAX['flat_func_dec'].format(func.name)]
+    else:
+        header = [SYNTAX['func_dec'].format(func.name, func.index)]
+    header += [SYNTAX['param'].format(index, 'i32') for index in func.params]
+    if func.result is not None:
+        header.append(SYNTAX['result'].format(func.result))
+    if flat:
+        lines = [' '.join(header)]
+        lines += [SYNTAX['local'].format(index, local_type) for index, local_type in func.locals]
+        lines += flat_body_lines(func.body)
+        lines.append(SYNTAX['closing'])
+    else:
+        lines = [' ' + ' '.join(header)]
+        lines += ['  ' + SYNTAX['local'].format(index, local_type) for index, local_type in func.locals]
+        lines += body_lines(func.body, 2)
+        lines.append(' ' + SYNTAX['closing'])
+    return '\n'.join(lines) + '\n'
+
+
+def write_module(module: Module, f, flat: bool = False):
+    f.write(head_text(module, flat))
+    for func in module.funcs:
+        f.write(func_text(func, flat))
+    f.write(SYNTAX['closing'] + '\n')
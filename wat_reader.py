@@ -0,0 +1,447 @@
+"""
+Reads WAT text into a wat_ir.Module, the same objects Wat builds, so modules
+written by hand can go through everything the generated ones do. Only the
+subset of WAT that Wat generates is read: i32 values, block and loop without
+result types, and the instructions wasm_binary encodes, anything else such as
+if/then/else being a WatSyntaxError. Both folded instructions, as Wat writes
+them, and flat ones are read. A flat instruction
+is kept as an Instr without operands in the order it appears, which stands
+for the same code. The text is read a line at a time and the nesting is kept
+on lists rather than the call stack, so reading is linear in the text
+"""
+import re
+
+from wasm_binary import INSTRUCTIONS
+from wat_ir import Instr, Func, Module, MEMORY_OPCODES
+
+# A token, an unterminated string or stray character being one too so it is
+# reported. Block comments are rare and handled separately
+TOKEN = re.compile(r'\(;|;;.*|[()]|"(?:[^"\\\n]|\\.)*"|[^\s()";]+|\S')
+COMMENT = re.compile(r'\(;|;\)')
+
+BLOCK_OPS = frozenset(('block', 'loop'))
+BRANCH_OPS = frozenset(('br', 'br_if'))
+LOCAL_OPS = frozenset(('get_local', 'set_local', 'tee_local', 'local.get', 'local.set', 'local.tee'))
+# Natural alignment in bytes, the only one the module can hold
+MEMORY_ALIGN = {op: 1 << align for op, (_, align) in MEMORY_OPCODES.items()}
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', "'": "'", '\\': '\\'}
+
+
+class WatSyntaxError(Exception):
+    """ The text is not WAT the module can hold """
+
+
+def name_value(token: str):
+    """ A $name as the module holds it, $0 being local or memory 0 """
+    name = token[1:]
+    return int(name) if name.isdigit() else name
+
+
+def int_value(token: str) -> int:
+    try:
+        return int(token, 0)
+    except ValueError:
+        # Base 0 refuses leading zeros
+        return int(token.replace('_', ''), 10)
+
+
+class WatReader(object):
+    """ Reads one module from lines of text, e.g. an open .wat file """
+    def __init__(self, lines):
+        self.line_no = 0
+        self.tokens = self.tokenize(lines)
+        # The current token and, once peeked at, the one after it
+        self.token = next(self.tokens, None)
+        self.peeked = None
+        self.module = Module()
+        # Calls and exports naming a function by its index, which may come
+        # before the function. Resolved once the module is read
+        self.fixups = []
+        self.export_fixups = []
+        # Names of the locals of the current function, params first
+        self.local_names = []
+        self.num_label = 0
+        self.fields = {
+            'import': self.read_import,
+            'table': self.read_table,
+            'memory': self.read_memory,
+            'export': self.read_export,
+            'func': self.read_func,
+        }
+
+    def error(self, message: str):
+        return WatSyntaxError(f'line {self.line_no}: {message}')
+
+    #
+    #	Tokens
+    #
+    def tokenize(self, lines):
+        # Depth of the block comments the line starts in
+        depth = 0
+        for self.line_no, line in enumerate(lines, 1):
+            if depth or '(;' in line:
+                tokens, depth = self.split_comments(line, depth)
+            else:
+                tokens = TOKEN.findall(line)
+            for token in tokens:
+                if token[0] == ';':
+                    if token[:2] == ';;':
+                        break
+                    raise self.error(f'unexpected "{token}"')
+                yield token
+        if depth:
+            raise self.error('unterminated block comment')
+
+    def split_comments(self, line: str, depth: int):
+        tokens = []
+        pos = 0
+        while pos < len(line):
+            if depth:
+                match = COMMENT.search(line, pos)
+                if match is None:
+                    break
+                depth += 1 if match.group() == '(;' else -1
+                pos = match.end()
+                continue
+            for match in TOKEN.finditer(line, pos):
+                if match.group() == '(;':
+                    depth = 1
+                    pos = match.end()
+                    break
+                tokens.append(match.group())
+            else:
+                break
+        return tokens, depth
+
+    def advance(self):
+        if self.peeked is None:
+            self.token = next(self.tokens, None)
+        else:
+            self.token, self.peeked = self.peeked, None
+
+    def peek(self) -> str:
+        """ The token after the current one """
+        if self.peeked is None:
+            self.peeked = next(self.tokens, None)
+        return self.peeked
+
+    def next(self) -> str:
+        token = self.token
+        if token is None:
+            raise self.error('unexpected end of text')
+        self.advance()
+        return token
+
+    def expect(self, expected: str):
+        token = self.next()
+        if token != expected:
+            raise self.error(f'expected "{expected}", got "{token}"')
+
+    def string(self) -> str:
+        token = self.next()
+        if len(token) < 2 or token[0] != '"' or token[-1] != '"':
+            raise self.error(f'expected a string, got "{token}"')
+        text = token[1:-1]
+        if '\\' not in text:
+            return text
+        out = []
+        pos = 0
+        while pos < len(text):
+            char = text[pos]
+            if char == '\\':
+                escape = text[pos + 1]
+                if escape in ESCAPES:
+                    out.append(ESCAPES[escape])
+                    pos += 2
+                    continue
+                out.append(chr(int(text[pos + 1:pos + 3], 16)))
+                pos += 3
+                continue
+            out.append(char)
+            pos += 1
+        return ''.join(out)
+
+    def number(self) -> int:
+        token = self.next()
+        try:
+            return int_value(token)
+        except ValueError:
+            raise self.error(f'expected a number, got "{token}"') from None
+
+    def optional_name(self):
+        if self.token is not None and self.token[0] == '$':
+            return name_value(self.next())
+        return None
+
+    def value_type(self) -> str:
+        token = self.next()
+        if token != 'i32':
+            raise self.error(f'unsupported type "{token}", only i32 values are')
+        return token
+
+    #
+    #	Module fields
+    #
+    def read(self) -> Module:
+        self.expect('(')
+        self.expect('module')
+        self.optional_name()
+        while self.token == '(':
+            self.advance()
+            field = self.next()
+            if field not in self.fields:
+                raise self.error(f'unsupported module field "{field}"')
+            self.fields[field]()
+            self.expect(')')
+        self.expect(')')
+        if self.token is not None:
+            raise self.error(f'unexpected "{self.token}" after the module')
+        self.resolve()
+        return self.module
+
+    def read_import(self):
+        module_name = self.string()
+        field = self.string()
+        self.expect('(')
+        self.expect('func')
+        func_name = self.func_name(len(self.module.imports))
+        params = []
+        while self.token == '(':
+            self.advance()
+            if self.token != 'param':
+                raise self.error(f'unsupported import "({self.token}", only parameters are')
+            self.advance()
+            self.optional_name()
+            while self.token != ')':
+                params.append(self.value_type())
+            self.advance()
+        self.expect(')')
+        self.module.imports.append((module_name, field, func_name, params))
+
+    def read_table(self):
+        self.optional_name()
+        size = self.number()
+        if self.token != 'anyfunc' and self.token != 'funcref':
+            raise self.error(f'unsupported table "{self.token}", only a size and element type are')
+        self.module.tables.append((size, self.next()))
+
+    def read_memory(self):
+        memory_name = self.optional_name()
+        if memory_name is None:
+            memory_name = len(self.module.memories)
+        self.inline_exports('memory', memory_name)
+        self.module.memories.append((memory_name, self.number()))
+
+    def read_export(self):
+        export_name = self.string()
+        self.expect('(')
+        kind = self.next()
+        if kind not in ('func', 'memory'):
+            raise self.error(f'unsupported export kind "{kind}"')
+        if self.token is not None and self.token[0] == '$':
+            ref = self.next()[1:] if kind == 'func' else name_value(self.next())
+        else:
+            ref = self.number()
+            if kind == 'func':
+                self.export_fixups.append((len(self.module.exports), self.line_no))
+            elif ref < len(self.module.memories):
+                ref = self.module.memories[ref][0]
+        self.expect(')')
+        self.module.exports.append((export_name, kind, ref))
+
+    def inline_exports(self, kind: str, ref):
+        while self.token == '(' and self.peek() == 'export':
+            self.advance()
+            self.advance()
+            self.module.exports.append((self.string(), kind, ref))
+            self.expect(')')
+
+    def func_name(self, index: int) -> str:
+        """ Functions are named as called, an unnamed one after its index """
+        if self.token is not None and self.token[0] == '$':
+            return self.next()[1:]
+        return str(index)
+
+    def read_func(self):
+        func_name = self.func_name(len(self.module.imports) + len(self.module.funcs))
+        self.inline_exports('func', func_name)
+        func = Func(func_name, len(self.module.funcs), [])
+        self.local_names = []
+        # Params, result and locals, in that order, then the body
+        while self.token == '(' and self.peek() in ('param', 'result', 'local'):
+            self.advance()
+            field = self.next()
+            if field == 'local':
+                func.locals += self.read_locals()
+            elif func.locals or func.result is not None:
+                raise self.error(f'"({field}" after the result or locals')
+            elif field == 'param':
+                func.params += [local_name for local_name, _ in self.read_locals()]
+            else:
+                func.result = self.value_type()
+            self.expect(')')
+        self.read_body(func.body)
+        self.module.funcs.append(func)
+
+    def read_locals(self) -> list:
+        """ The locals of one (param or (local, named after their index when not named """
+        local_name = self.optional_name()
+        if local_name is not None:
+            locals_ = [(local_name, self.value_type())]
+        else:
+            locals_ = []
+            while self.token != ')':
+                locals_.append((len(self.local_names) + len(locals_), self.value_type()))
+        for local_name, _ in locals_:
+            if local_name in self.local_names:
+                raise self.error(f'redefinition of local "${local_name}"')
+            self.local_names.append(local_name)
+        return locals_
+
+    #
+    #	Instructions
+    #
+    def read_body(self, body: list):
+        """ Instructions up to the closing paren of the function, left for the caller """
+        instrs = body
+        # Lists the instructions were added to before each open instruction,
+        # with the open instruction and the token closing it
+        frames = []
+        # Enclosing block and loop instructions, innermost last
+        labels = []
+        while True:
+            token = self.token
+            if token == '(':
+                self.advance()
+                instr = self.instr(self.next(), labels)
+                instr.operands = []
+                instrs.append(instr)
+                frames.append((instrs, instr, ')'))
+                instrs = instr.operands
+                if instr.op in BLOCK_OPS:
+                    labels.append(instr)
+            elif token == ')':
+                if not frames:
+                    return
+                if frames[-1][2] != ')':
+                    raise self.error(f'missing "end" of {frames[-1][1].op}')
+                self.advance()
+                instrs, instr, _ = frames.pop()
+                if instr.op in BLOCK_OPS:
+                    labels.pop()
+            elif token == 'end':
+                if not frames or frames[-1][2] != 'end':
+                    raise self.error('"end" without a block or loop')
+                self.advance()
+                instrs, instr, _ = frames.pop()
+                labels.pop()
+                # The label may be repeated after end
+                if self.token is not None and self.token[0] == '$':
+                    if instr.imms != (self.token,):
+                        raise self.error(f'mismatching label "{self.token}"')
+                    self.advance()
+            elif token is None:
+                raise self.error('unexpected end of text')
+            else:
+                self.advance()
+                instr = self.instr(token, labels)
+                instrs.append(instr)
+                if instr.op in BLOCK_OPS:
+                    instr.operands = []
+                    frames.append((instrs, instr, 'end'))
+                    instrs = instr.operands
+                    labels.append(instr)
+
+    def instr(self, op: str, labels: list) -> Instr:
+        """ An instruction and its immediates, the tokens following op """
+        if op[0] in '$"()' or op[0].isdigit() or op[0] in '+-':
+            raise self.error(f'expected an instruction, got "{op}"')
+        if op in ('result', 'param', 'type'):
+            raise self.error(f'unsupported block type "({op}", only blocks without a result are read')
+        if op not in INSTRUCTIONS:
+            raise self.error(f'unsupported instruction "{op}", only those Wat generates are read')
+        if op == 'i32.const':
+            return Instr(op, self.number())
+        if op in LOCAL_OPS:
+            return Instr(op, self.local())
+        if op in MEMORY_ALIGN:
+            return self.memory_instr(op)
+        if op == 'call':
+            token = self.next()
+            if token[0] == '$':
+                return Instr(op, token[1:])
+            instr = Instr(op, self.index(token))
+            self.fixups.append((instr, self.line_no))
+            return instr
+        if op in BRANCH_OPS:
+            return Instr(op, self.label(self.next(), labels))
+        if op in BLOCK_OPS:
+            if self.token is not None and self.token[0] == '$':
+                return Instr(op, self.next())
+            return Instr(op)
+        return Instr(op)
+
+    def index(self, token: str) -> int:
+        if not token.isdigit():
+            raise self.error(f'expected a name or index, got "{token}"')
+        return int(token)
+
+    def local(self):
+        token = self.next()
+        if token[0] == '$':
+            local_name = name_value(token)
+            if local_name not in self.local_names:
+                raise self.error(f'undefined local variable "{token}"')
+            return local_name
+        index = self.index(token)
+        if index >= len(self.local_names):
+            raise self.error(f'local variable out of range: {index}')
+        return self.local_names[index]
+
+    def label(self, token: str, labels: list) -> str:
+        if token[0] == '$':
+            if not any(instr.imms == (token,) for instr in labels):
+                raise self.error(f'undefined label variable "{token}"')
+            return token
+        depth = self.index(token)
+        if depth >= len(labels):
+            raise self.error(f'label depth out of range: {depth}')
+        target = labels[-1 - depth]
+        # The module names its labels, an unnamed block is named when branched to by depth
+        if not target.imms:
+            target.imms = (f'$depth${self.num_label}',)
+            self.num_label += 1
+        return target.imms[0]
+
+    def memory_instr(self, op: str) -> Instr:
+        offset = 0
+        while self.token is not None and self.token.startswith(('offset=', 'align=')):
+            key, _, value = self.next().partition('=')
+            try:
+                value = int_value(value)
+            except ValueError:
+                raise self.error(f'expected a number, got "{value}"') from None
+            if key == 'offset':
+                offset = value
+            elif key != 'align' or value != MEMORY_ALIGN[op]:
+                raise self.error(f'unsupported "{key}={value}" on {op}, only natural alignment is')
+        return Instr(op, offset) if offset else Instr(op)
+
+    def resolve(self):
+        """ Name the functions called or exported by index """
+        names = [func_name for _, _, func_name, _ in self.module.imports] + [func.name for func in self.module.funcs]
+        for instr, line_no in self.fixups:
+            if instr.imms[0] >= len(names):
+                raise WatSyntaxError(f'line {line_no}: function out of range: {instr.imms[0]}')
+            instr.imms = (names[instr.imms[0]],)
+        exports = self.module.exports
+        for position, line_no in self.export_fixups:
+            export_name, kind, ref = exports[position]
+            if ref >= len(names):
+                raise WatSyntaxError(f'line {line_no}: function out of range: {ref}')
+            exports[position] = (export_name, kind, names[ref])
+
+
+def read_module(lines) -> Module:
+    """ The module in lines of WAT text, an open file or e.g. text.splitlines() """
+    return WatReader(lines).read()
@@ -0,0 +1,167 @@
+"""
+Checks a wat_ir.Module the way a wasm engine does before running it, without
+leaving the process: the operand stack of every function, instruction by
+instruction, the nesting of its blocks and loops, and the locals, functions
+and labels it names. Every value is an i32, so the stack is checked by its
+height. Wat tags the first instruction generated for a MiniC line with it, so
+an error is reported against the line it was generated for
+"""
+from wat_ir import Module, Func, MEMORY_OPCODES, stack_order
+
+# Values popped and pushed by the instructions taking a fixed number of them
+ARITY = {
+    'drop': (1, 0),
+    'i32.const': (0, 1),
+    'i32.eqz': (1, 1),
+    'get_local': (0, 1), 'set_local': (1, 0), 'tee_local': (1, 1),
+    'local.get': (0, 1), 'local.set': (1, 0), 'local.tee': (1, 1),
+    'i32.load': (1, 1), 'i32.load8_s': (1, 1), 'i32.load8_u': (1, 1),
+    'i32.store': (2, 0), 'i32.store8': (2, 0),
+    'br': (0, 0), 'br_if': (1, 0),
+}
+for _op in ('eq', 'ne', 'lt_s', 'lt_u', 'gt_s', 'gt_u', 'le_s', 'le_u', 'ge_s', 'ge_u', 'add', 'sub', 'mul',
+            'div_s', 'div_u', 'rem_s', 'rem_u', 'and', 'or', 'xor'):
+    ARITY['i32.' + _op] = (2, 1)
+del _op
+
+BLOCK_OPS = frozenset(('block', 'loop'))
+LOCAL_OPS = frozenset(('get_local', 'set_local', 'tee_local', 'local.get', 'local.set', 'local.tee'))
+
+
+class ValidationError(Exception):
+    """ An invalid function, with the MiniC line of the instruction at fault when known """
+    def __init__(self, message: str, func: str, line: int = None):
+        super().__init__(message)
+        self.func = func
+        self.line = line
+
+
+class Control(object):
+    """ A block, loop or the function body, as the stack is checked """
+    __slots__ = ('label', 'height', 'unreachable', 'push_line')
+
+    def __init__(self, label, height: int):
+        self.label = label
+        # Height of the operand stack when it was entered
+        self.height = height
+        # Past a br or return, where anything may be popped
+        self.unreachable = False
+        # Line of the last instruction leaving a value in it, for one left over
+        self.push_line = None
+
+
+class Validator(object):
+    def __init__(self, module: Module):
+        self.module = module
+        # Parameters and whether a result, by function name
+        self.signatures = {func_name: (len(params), False) for _, _, func_name, params in module.imports}
+        for func in module.funcs:
+            self.signatures.setdefault(func.name, (len(func.params), func.result is not None))
+
+    def validate(self) -> list:
+        """ The first error of each invalid function, none when the module is valid """
+        errors = []
+        for func in self.module.funcs:
+            try:
+                self.validate_func(func)
+            except ValidationError as e:
+                errors.append(e)
+        return errors
+
+    def validate_func(self, func: Func):
+        local_names = set(func.params)
+        local_names.update(local_name for local_name, _ in func.locals)
+        results = 0 if func.result is None else 1
+        controls = [Control(None, 0)]
+        height = 0
+        line = None
+        # Line of the last top level instruction, for a function ending with too few values
+        top_line = None
+        # Lines the instructions whose operands are being checked started on
+        entry_lines = []
+        for instr, done in stack_order(func.body):
+            op = instr.op
+            if not done:
+                line = getattr(instr, 'line', line)
+                entry_lines.append(line)
+                if op in BLOCK_OPS:
+                    controls.append(Control(instr.imms[0] if instr.imms else None, height))
+                continue
+            if op in BLOCK_OPS or instr.operands:
+                exit_line = entry_lines.pop()
+            else:
+                line = exit_line = getattr(instr, 'line', line)
+
+            if op in BLOCK_OPS:
+                control = controls.pop()
+                # Past a br anything may be popped, but a value left over is still one too many
+                if height > control.height or not control.unreachable and height != control.height:
+                    raise ValidationError(f'{op} {instr.imms[0] if instr.imms else ""} leaves '
+                                          f'{height - control.height} values on the stack, expected 0',
+                                          func.name, control.push_line or exit_line)
+                height = control.height
+            else:
+                new_height = self.check(func, instr, exit_line, controls, height, local_names, results)
+                if new_height > height:
+                    controls[-1].push_line = exit_line
+                if len(controls) == 1:
+                    top_line = exit_line
+                height = new_height
+
+        if height > results or not controls[0].unreachable and height != results:
+            # Too many values is down to the last one left, too few to the
+            # return statement that should have left it
+            if height > results:
+                line = controls[0].push_line
+            else:
+                line = func.return_line or top_line
+            raise ValidationError(f'function ends with {height} values on the stack, expected {results}',
+                                  func.name, line)
+
+    def check(self, func: Func, instr, line: int, controls: list, height: int, local_names: set, results: int) -> int:
+        """ The height of the stack once instr has run, its operands being on it """
+        op = instr.op
+        if op in ARITY:
+            pops, pushes = ARITY[op]
+        elif op == 'call':
+            if not instr.imms or instr.imms[0] not in self.signatures:
+                raise ValidationError(f'call to undefined function "${instr.imms[0] if instr.imms else ""}"',
+                                      func.name, line)
+            pops, has_result = self.signatures[instr.imms[0]]
+            pushes = 1 if has_result else 0
+        elif op == 'return':
+            pops, pushes = results, 0
+        else:
+            raise ValidationError(f'unknown instruction "{op}"', func.name, line)
+
+        if op in LOCAL_OPS and (not instr.imms or instr.imms[0] not in local_names):
+            raise ValidationError(f'undefined local variable "${instr.imms[0] if instr.imms else ""}"',
+                                  func.name, line)
+        if op in MEMORY_OPCODES and not self.module.memories:
+            raise ValidationError(f'{op} without a memory', func.name, line)
+        if op == 'i32.const' and (len(instr.imms) != 1 or not isinstance(instr.imms[0], int)
+                                  and not str(instr.imms[0]).lstrip('-').isdigit()):
+            raise ValidationError(f'invalid i32.const {" ".join(map(str, instr.imms))}', func.name, line)
+        if op == 'br' or op == 'br_if':
+            label = instr.imms[0] if instr.imms else None
+            if label is None or not any(control.label == label for control in controls[1:]):
+                raise ValidationError(f'{op} to undefined label "{label}"', func.name, line)
+
+        control = controls[-1]
+        available = height - control.height
+        if available < pops:
+            if not control.unreachable:
+                raise ValidationError(f'{op} expects {pops} values on the stack, found {available}',
+                                      func.name, line)
+            height = control.height
+        else:
+            height -= pops
+        height += pushes
+        if op == 'br' or op == 'return':
+            control.unreachable = True
+            height = control.height
+        return height
+
+
+def validate(module: Module) -> list:
+    return Validator(module).validate()
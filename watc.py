@@ -1,98 +1,359 @@
 import argparse
+import contextlib
+import io
 import os
+import re
 import sys
 import subprocess
-from lexer import minic_lexer as lexer
-from parser import minic_parser as parser
-from preprocessor import preprocessor
+from functools import cached_property
+from lexer import minic_lexer
+from scanner import minic_scanner
+from parser import minic_parser
+from preprocessor import preprocessor, MappedFile
 from IRGen import IRGen
 import xml.etree.ElementTree as ET
 from wat import Wat
+from wasm_binary import encode
+from wat_validator import validate
 from typeChecker import TypeChecker
+import minic_ast
+from cache import cache_dir, source_hash, CompileCache, WatText
+from parallel import parse_parallel
+
+# Outputs -e/--emit can ask for, any number of them per compile
+EMIT_KINDS = ('preprocessed', 'tokens', 'ast', 'types', 'wat', 'wasm', 'run')
+
+
+class StageError(Exception):
+    """ A stage of the compile failed, what went wrong has already been printed """
+
+
+@contextlib.contextmanager
+def stage(doing: str):
+    # A failure is reported the same way whichever output needed the stage
+    try:
+        yield
+    except StageError:
+        raise
+    except Exception as e:
+        print("One of the file provided has an invalid syntax when being " + doing)
+        print("Error: " + str(e))
+        print("Now aborting...")
+        raise StageError() from e
+
 
 class watc():
-    lexer: lexer
-    parser: parser
-    preprocessor: preprocessor
-    processed_data: str
-
-    def __init__(self, files: list[str], verify: str = None, output: str = None, run_type: str = None, run: bool = True, type_check: bool = False, type_check_only=False, optimize: bool = False):
-        # Process any of include or define before we pass it into our lexer
-        file_data = {}
+    """
+    Every artifact of a compile, from the preprocessed text to the result of
+    running the wasm, is an attribute computed the first time it is asked for.
+    Each stage thus runs at most once, whatever set of outputs is requested
+    """
+    def __init__(self, files: list[str], verify: str = None, output: str = None, run_type: str = None, run: bool = True, type_check: bool = False, type_check_only=False, optimize: bool = False, cache: str = None, lexer_backend: str = 'ply', parser_engine: str = 'yacc', jobs: int = 1, defines: dict = None, compile_cache: bool = False, emit: list = None, flat: bool = False):
         self.typeCheck = True if type_check == 'True' else False
         self.run = True if run == 'True' else False
         self.type_check_only = True if type_check_only == 'True' else False
         self.optimize = True if optimize == 'True' else False
-        # Preprocessor loading
+        self.flat = flat == 'True'
+        self.cache = cache
+        self.lexer_backend = lexer_backend
+        self.parser_engine = parser_engine
+        self.jobs = jobs
+        self.defines = defines
+        self.use_compile_cache = compile_cache == 'True'
+        emit = emit or []
+        # Preprocessor loading, the files are memory mapped rather than read in
+        self.file_data = {}
         for file_path in files:
-            file = open(file_path, "r")
-            lines = file.readlines()
-            file.close()
-            lines = [l.replace("\n", "") for l in lines]
-            file_data.setdefault(file_path.split('/')[-1], lines)
-
-        # Building everything from preprocessor, lexer to parser regardless of type
-        # Preprocessor check
+            self.file_data.setdefault(file_path.split('/')[-1], MappedFile(file_path))
+
+        wanted = {run_type, verify} | {kind for kind, _ in emit}
+        # Tokens asked for are handed to the parser rather than lexed a second time
+        self.reuse_tokens = bool(wanted & {'lexer', 'tokens'})
+        # The preprocessed lines stream straight into the scanner, unless something
+        # needs the whole text: the PLY lexer, the worker processes, the type checker,
+        # the tokens and the preprocessed output
+        self.stream = lexer_backend == 'scanner' and jobs == 1 and not (self.typeCheck or self.type_check_only) \
+            and not self.reuse_tokens and not wanted & {'preprocessor', 'preprocessed', 'types'}
+        self.wasm_file = dict(emit).get('wasm') or (output if verify == 'wasm' else None)
+        # A WAT written once and kept nowhere else streams out a function at a time
+        # rather than being held whole. The wasm is encoded from the whole module
+        self.stream_wat = not self.use_compile_cache and not wanted & {'wasm', 'run'} \
+            and (run_type in ('all', 'wat')) + (verify == 'wat') + sum(kind == 'wat' for kind, _ in emit) == 1
+
         try:
-            self.processed_data = '\n'.join(preprocessor(file_data))
-        except Exception as e:
-            print("One of the file provided has an invalid syntax when being preoprocessed")
-            print("Error: " + str(e))
-            print("Now aborting...")
+            # Preprocessor check, done first whatever the outputs
+            self.processed_lines
+            if self.typeCheck or self.type_check_only:
+                self.type_checker.print_errors()
+                if self.type_check_only:
+                    if not self.type_checker.has_errors():
+                        print("No type errors")
+                    return
+            self.write_outputs(run_type, verify, output)
+            for kind, filename in emit:
+                self.emit(kind, filename)
+        except StageError:
             return
-        # Lexer building
+        finally:
+            # Every output is written, the files are not preprocessed again
+            for mapped in self.file_data.values():
+                mapped.close()
+
+    #
+    #	Stages
+    #
+    @cached_property
+    def processed_lines(self):
+        """ Generator over the preprocessed lines, the input files are checked right away """
+        with stage("preoprocessed"):
+            return preprocessor(self.file_data, self.defines)
+
+    @cached_property
+    def processed_data(self) -> str:
+        lines = self.processed_lines
+        with stage("preoprocessed"):
+            return '\n'.join(lines)
+
+    @cached_property
+    def compile_cache(self):
+        """
+        Cache of earlier compiles keyed by a hash of the preprocessed text. It holds
+        the AST, which saves lexing and parsing, and the WAT/wasm. None when off
+        """
+        if not self.use_compile_cache:
+            return None
         try:
-            self.lexer = lexer()
-            self.lexer.build()
-        except Exception as e:
-            print("One of the file provided has an invalid syntax when being lexed")
-            print("Error: " + str(e))
-            print("Now aborting...")
-            return
-        # Parser building
+            compile_cache = CompileCache(cache_dir(self.cache))
+            if self.stream:
+                # Hashed in a pass of its own, the lines are then streamed into the
+                # scanner from a second, silent run of the preprocessor
+                source = source_hash(self.processed_lines)
+            else:
+                source = source_hash(self.processed_data.split('\n'))
+        except OSError as e:
+            print("Compile cache unavailable: " + str(e))
+            return None
+        self.cache_key = CompileCache.key(source, optimize=self.optimize, flat=self.flat)
+        self.ast_key = CompileCache.key(source)
+        return compile_cache
+
+    @cached_property
+    def cache_dir(self):
+        """
+        Directory the PLY tables are cached in. None when neither the lexer nor
+        the parser has tables, or when it cannot be created, the tables then
+        being built in memory
+        """
+        if self.lexer_backend == 'scanner' and self.parser_engine == 'descent':
+            return None
         try:
-            self.parser = parser()
-            self.parser.build()
-            root = self.parser.parse(self.processed_data)
-        except Exception as e:
-            print("One of the file provided has an invalid syntax when being parsed")
-            print("Error: " + str(e))
-            print("Now aborting...")
-            return
+            return cache_dir(self.cache)
+        except OSError:
+            return None
+
+    @cached_property
+    def lexer(self):
+        # Tables are loaded from the cache unless the grammar changed
+        with stage("lexed"):
+            lexer = minic_scanner() if self.lexer_backend == 'scanner' else minic_lexer()
+            try:
+                lexer.build_cached(cache_dir=self.cache_dir)
+            except OSError:
+                # A cache directory that cannot be written to only costs the cached tables
+                self.cache_dir = None
+                lexer.build()
+            return lexer
+
+    @cached_property
+    def parser(self):
+        lexer = self.lexer
+        with stage("parsed"):
+            parser = minic_parser()
+            try:
+                parser.build(lexer=lexer, cache_dir=self.cache_dir, engine=self.parser_engine)
+            except OSError:
+                self.cache_dir = None
+                parser.build(lexer=lexer, engine=self.parser_engine)
+            return parser
+
+    @cached_property
+    def tokens(self) -> list:
+        data = self.processed_data
+        lexer = self.lexer.lexer
+        lexer.lineno = 1
+        # What the lexer reports is kept to tell whether the tree parsed from the tokens is clean
+        with stage("lexed"), contextlib.redirect_stdout(io.StringIO()) as self.lexer_output:
+            lexer.input(data)
+            tokens = list(iter(lexer.token, None))
+        print(self.lexer_output.getvalue(), end='')
+        return tokens
+
+    @cached_property
+    def root(self):
+        # Only trees parsed without any complaint from the lexer or parser go in the
+        # compile cache, as a hit would not repeat them
+        self.clean = True
+        if self.compile_cache:
+            tree = self.compile_cache.load(self.ast_key, 'ast')
+            if tree is not None:
+                # A damaged entry is just a miss
+                with contextlib.suppress(Exception):
+                    return minic_ast.loads(tree)
+
+        parser = self.parser
+        if self.reuse_tokens:
+            data = self.tokens
+        elif self.stream:
+            data = self.processed_lines
+            if self.compile_cache:
+                # The hash already went through the lines and printed whatever errors there were
+                data = preprocessor(self.file_data, self.defines, report=lambda message: None)
+        else:
+            data = self.processed_data
+        with stage("parsed"):
+            parse_output = io.StringIO()
+            try:
+                with contextlib.redirect_stdout(parse_output if self.compile_cache else sys.stdout):
+                    if self.reuse_tokens:
+                        root = parser.parse_tokens(data)
+                    elif self.jobs > 1:
+                        root = parse_parallel(data, self.jobs, self.lexer_backend, self.parser_engine, self.cache_dir)
+                    else:
+                        root = parser.parse(data)
+            finally:
+                print(parse_output.getvalue(), end='')
+        self.clean = root is not None and not parse_output.getvalue() \
+            and not (self.reuse_tokens and self.lexer_output.getvalue())
+        if self.compile_cache and self.clean:
+            # Trees too deep to pickle are simply not cached
+            with contextlib.suppress(OSError, RecursionError):
+                self.compile_cache.store(self.ast_key, 'ast', minic_ast.dumps(root))
+        return root
+
+    @cached_property
+    def type_checker(self):
+        type_checker = TypeChecker(self.processed_data)
+        type_checker.check(self.root)
+        return type_checker
+
+    @cached_property
+    def xml(self):
+        return self.root.generate_xml()
+
+    @cached_property
+    def generated_wat(self):
+        """ The Wat generated from the tree, whose module the wasm is encoded from """
+        root = self.root
         # We got rid of IRGen for this sprint as found it more difficult
         # self.irgen = IRGen()
         # self.irgen.generate(root)
+        with stage("converted to wat"):
+            wat = Wat(self.optimize, flat=self.flat)
+            wat.generate(root)
+        return wat
 
-        # Typechecking
-        if self.typeCheck or self.type_check_only:
-            self.typeChecker = TypeChecker(self.processed_data)
-            self.typeChecker.check(root)
-            self.typeChecker.print_errors()
-            if self.type_check_only:
-                if not self.typeChecker.has_errors():
-                    print("No type errors")
-                return
+    @cached_property
+    def wat(self):
+        if self.compile_cache:
+            wat = self.compile_cache.load(self.cache_key, 'wat')
+            if wat is not None:
+                return WatText(wat.decode())
+        wat = self.generated_wat
+        if self.compile_cache and self.clean:
+            text = io.StringIO()
+            wat.write_wat(text)
+            # A full disk or the like only costs the cache entry
+            with contextlib.suppress(OSError):
+                self.compile_cache.store(self.cache_key, 'wat', text.getvalue().encode())
+        return wat
 
-        # Generating final output
-        try:
-            self.wat = Wat(self.optimize)
-            self.wat.generate(root)
-        except Exception as e:
-            print("One of the file provided has an invalid syntax when being converted to wat")
-            print("Error: " + str(e))
-            print("Now aborting...")
+    @cached_property
+    def wasm(self) -> str:
+        """ Name of the assembled binary in client/, next to the .wat it comes from """
+        if self.wasm_file is None:
+            wat_name = "out.wat"
+            wasm_name = "out.wasm"
+        else:
+            wasm_name = self.wasm_file
+            wat_name = self.wasm_file[:-4] + "wat"
+
+        self.write_wat(os.path.join('client', wat_name))
+        wasm = self.compile_cache.load(self.cache_key, 'wasm') if self.compile_cache else None
+        if wasm is not None:
+            print("Using the .wasm from the compile cache: ", wasm_name)
+            with open(os.path.join('client', wasm_name), 'wb') as f:
+                f.write(wasm)
+        else:
+            module = self.generated_wat.module
+            self.validate_module(module)
+            print("Assembling .wat to .wasm: ", wasm_name)
+            with stage("assembled to wasm"):
+                wasm = encode(module)
+            with open(os.path.join('client', wasm_name), 'wb') as f:
+                f.write(wasm)
+            if self.compile_cache and self.clean:
+                with contextlib.suppress(OSError):
+                    self.compile_cache.store(self.cache_key, 'wasm', wasm)
+        return wasm_name
+
+    @cached_property
+    def run_result(self) -> int:
+        """ Exit status of running the wasm under node """
+        wasm_name = self.wasm
+        node_cmd = f'node index.js --input="{wasm_name}"'
+        print("Loading and executing .wasm: ", node_cmd)
+        return subprocess.run(node_cmd, shell=True, cwd='client').returncode
+
+    #
+    #	Outputs
+    #
+    def validate_module(self, module):
+        """ Abort on a module the engine would reject, pointing at the MiniC lines at fault """
+        errors = validate(module)
+        if not errors:
             return
+        if self.stream:
+            # The streamed lines are gone, only read again for the message
+            lines = list(preprocessor(self.file_data, self.defines, report=lambda message: None))
+        else:
+            lines = self.processed_data.split('\n')
+        for e in errors:
+            print(f"Invalid wasm generated for function {e.func}" + (f", line {e.line}" if e.line else "") + ": " + str(e))
+            if e.line and e.line <= len(lines):
+                print("    " + lines[e.line - 1].strip())
+        print("Now aborting...")
+        raise StageError()
 
+    def write_wat(self, filename: str):
+        """
+        Write the WAT to filename. When nothing else needs it, it is generated
+        straight into the file, which is removed again if generating fails
+        """
+        if not self.stream_wat or 'wat' in self.__dict__:
+            wat = self.wat
+            with open(filename, 'w') as f:
+                wat.write_wat(f)
+            return
+        root = self.root
+        try:
+            with open(filename, 'w') as f, stage("converted to wat"):
+                Wat(self.optimize, out=f, flat=self.flat).generate(root)
+        except StageError:
+            os.remove(filename)
+            raise
+
+    def write_outputs(self, run_type: str, verify: str, output: str):
         match run_type:
             case 'all' | 'wat':
                 filename = output
                 if not output:
                     filename = 'out.wat'
-                f = open(filename, 'w')
-                self.wat.write_wat(f)
+                self.write_wat(filename)
 
+            case 'lexer':
+                self.tokens
             case 'parser':
-                res = self.parser.generate_xml(self.processed_data)
+                res = self.xml
                 filename = output
                 if not output or output == 'default.wat':
                     filename = 'parser.xml'
@@ -103,19 +364,21 @@ class watc():
                 filename = output
                 if not filename:
                     filename = 'preprocessed.c'
+                data = self.processed_data
                 with open(filename, 'w') as f:
-                    f.write(self.processed_data)
+                    f.write(data)
             case 'irgen':
                 print('This feature has been deprecated')
                 return
         # If output is specified
         match verify:
             case 'lexer':
-                self.lexer.test(self.processed_data)
+                for tok in self.tokens:
+                    print(tok)
             case 'parser':
-                self.parser.test(self.processed_data)
+                minic_ast.NodeVisitor().visit(self.root)
             case 'xml':
-                res = self.parser.generate_xml(self.processed_data)
+                res = self.xml
                 if output:
                     with open(output, 'w') as f:
                         tree = ET.ElementTree(res)
@@ -127,34 +390,40 @@ class watc():
                 return
             case 'wat':
                 if output:
-                    with open(output, 'w') as f:
-                        self.wat.write_wat(f)
+                    self.write_wat(output)
                 else:
                     self.wat.print_wat()
             case 'wasm':
-                if output is None:
-                    wat_name = "out.wat"
-                    wasm_name = "out.wasm"
-                else:
-                    wasm_name = output
-                    wat_name = output[:-4] + "wat"
-
-                cmd = 'cp out.wat client/'
-                cur_dir = os.getcwd()
-                os.chdir(f'{cur_dir}/client/')
-                with open(wat_name, 'w') as f:
-                    self.wat.write_wat(f)
-
-                #cmd = '../wabt/bin/wat2wasm ' + wat_name + ' --output=' + wasm_name
-                cmd = 'npx wat2wasm ' + wat_name + f' --output="{wasm_name}"'
-                print("Running wat2wasm and assembling .wat to .wasm: ", cmd)
-                os.system(cmd)
-
+                self.wasm
                 if self.run:
-                    node_cmd = f'node index.js --input="{wasm_name}"'
-                    print("Loading and executing .wasm: ", node_cmd)
-                    os.system(node_cmd)
-                os.chdir(cur_dir)
+                    self.run_result
+
+    def emit(self, kind: str, filename: str):
+        """ Write one -e/--emit output, to filename or else to stdout """
+        match kind:
+            case 'preprocessed':
+                text = self.processed_data + '\n'
+            case 'tokens':
+                text = ''.join(f'{tok}\n' for tok in self.tokens)
+            case 'ast':
+                text = ET.tostring(self.xml, encoding='unicode') + '\n'
+            case 'types':
+                text = ''.join(e + '\n' for e in self.type_checker.type_errors) or "No type errors\n"
+            case 'wat':
+                out = io.StringIO()
+                self.wat.write_wat(out)
+                text = out.getvalue()
+            case 'wasm':
+                self.wasm
+                return
+            case 'run':
+                self.run_result
+                return
+        if filename:
+            with open(filename, 'w') as f:
+                f.write(text)
+        else:
+            print(text, end='')
 
 
 if __name__ == "__main__":
@@ -171,6 +440,18 @@ if __name__ == "__main__":
             arg_parser.error("File {} doesn't exist".format(fname))
         return fname
 
+    def define_checker(text):
+        name, eq, value = text.partition('=')
+        if not re.fullmatch(r'\w+', name) or not re.fullmatch(r'\w*', value):
+            arg_parser.error("Invalid macro definition {}".format(text))
+        return name, value if eq else '1'
+
+    def emit_checker(text):
+        kind, _, filename = text.partition('=')
+        if kind not in EMIT_KINDS:
+            arg_parser.error("Invalid output {}, choose from {}".format(kind, ', '.join(EMIT_KINDS)))
+        return kind, filename or None
+
     arg_parser.add_argument('FILE', help="Input files with miniC source code (only c extension is accepted)",
                             type=lambda s: file_checker(("c"), s), nargs='+')
     arg_parser.add_argument(
@@ -185,8 +466,8 @@ if __name__ == "__main__":
             'parser: Execute Preprocessor, lexer and parser to generate a AST in XML format\n' +
             'ir: Generate an easily readable 3ac code (DEPRECATED)\n' +
             'wat: Generate a wat file\n' +
-            'wasm: Generate a wasm file',
-        default="all",
+            'wasm: Generate a wasm file\n' +
+            'Defaults to all, unless -e is given',
         choices=("all", "lexer", "parser", "preprocessor", "ir", "wat", "wasm"))
 
     arg_parser.add_argument(
@@ -225,9 +506,90 @@ if __name__ == "__main__":
         default='False'
     )
 
+    arg_parser.add_argument(
+        '-fl',
+        '--flat',
+        help='Write the WAT flat, one instruction a line after its operands, rather than folded and indented',
+        choices=('True', 'False'),
+        default='False'
+    )
+
+    arg_parser.add_argument(
+        '-c',
+        '--cache-dir',
+        help='Directory for cached lexer/parser tables (default: $WATC_CACHE_DIR or ~/.cache/watc)',
+    )
+
+    arg_parser.add_argument(
+        '-l',
+        '--lexer',
+        help='Lexer backend:\nply: PLY generated lexer\nscanner: hand written single pass scanner',
+        choices=('ply', 'scanner'),
+        default='ply'
+    )
+
+    arg_parser.add_argument(
+        '-p',
+        '--parser',
+        help='Parser engine:\nyacc: PLY generated LALR parser\ndescent: hand written recursive descent parser',
+        choices=('yacc', 'descent'),
+        default='yacc'
+    )
+
+    arg_parser.add_argument(
+        '-j',
+        '--jobs',
+        help='Parse the functions of the program in this many worker processes',
+        type=int,
+        default=1
+    )
+
+    arg_parser.add_argument(
+        '-D',
+        dest='defines',
+        metavar='NAME[=VALUE]',
+        help='Define a macro before preprocessing, VALUE defaults to 1',
+        type=define_checker,
+        action='append',
+        default=[]
+    )
+
+    arg_parser.add_argument(
+        '-e',
+        '--emit',
+        metavar='KIND[=FILE]',
+        help='Also write this output, to FILE or else to stdout. Can be repeated, every stage\n' +
+            'still runs once. KIND is one of: ' + ', '.join(EMIT_KINDS) + '\n' +
+            'wasm and run assemble into client/, FILE being the .wasm name',
+        type=emit_checker,
+        action='append',
+        default=[]
+    )
+
+    arg_parser.add_argument(
+        '-cc',
+        '--compile-cache',
+        help='Reuse the WAT/wasm of an identical earlier compile from the cache directory',
+        choices=('True', 'False'),
+        default='False'
+    )
+    arg_parser.add_argument(
+        '-cs',
+        '--cache-stats',
+        help='Print the compile cache hit/miss statistics',
+        choices=('True', 'False'),
+        default='False'
+    )
+
     args = arg_parser.parse_args()
     if len(sys.argv) < 2:
         arg_parser.print_help()
         sys.exit(1)
 
-    m = watc(args.FILE, verify=args.verify, run_type=args.type, run=args.run_prog, output=args.output, type_check=args.type_check, type_check_only=args.type_check_only, optimize=args.optimize)
+    # Without -t, out.wat is only written when no -e output was asked for
+    run_type = args.type or (None if args.emit else 'all')
+    m = watc(args.FILE, verify=args.verify, run_type=run_type, run=args.run_prog, output=args.output, type_check=args.type_check, type_check_only=args.type_check_only, optimize=args.optimize, cache=args.cache_dir, lexer_backend=args.lexer, parser_engine=args.parser, jobs=args.jobs, defines=dict(args.defines), compile_cache=args.compile_cache, emit=args.emit, flat=args.flat)
+    if args.cache_stats == 'True':
+        stats = CompileCache(cache_dir(args.cache_dir)).stats()
+        print(f"Compile cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries, {stats['bytes'] / 1024:.1f} kB")